@@ -1,6 +1,14 @@
 # Register your models here.
 from django.contrib import admin
-from .models import HealthCheckReport, HealthCheckMonitoring, ZendeskUser, SiteConfiguration
+from .models import (
+    HealthCheckReport,
+    HealthCheckMonitoring,
+    InstallationCheckStats,
+    MonitoringNotification,
+    ZendeskUser,
+    SiteConfiguration,
+    StripeWebhookEvent,
+)
 
 
 @admin.register(HealthCheckReport)
@@ -8,7 +16,7 @@ class HealthCheckReportAdmin(admin.ModelAdmin):
     list_display = ("installation_id", "subdomain", "is_unlocked", "created_at")
     list_filter = ("is_unlocked", "created_at", "updated_at")
     search_fields = ("installation_id", "subdomain", "instance_guid", "admin_email")
-    readonly_fields = ("created_at", "updated_at")
+    readonly_fields = ("created_at", "updated_at", "archive_path", "archived_at")
     fieldsets = (
         (
             "Instance Information",
@@ -24,7 +32,7 @@ class HealthCheckReportAdmin(admin.ModelAdmin):
         ),
         ("Plan Information", {"fields": ("stripe_subscription_id", "version")}),
         ("Report Status", {"fields": ("is_unlocked", "stripe_payment_id")}),
-        ("Report Data", {"fields": ("raw_response",)}),
+        ("Report Data", {"fields": ("raw_response", "archive_path", "archived_at")}),
         ("Timestamps", {"fields": ("created_at", "updated_at")}),
     )
 
@@ -39,7 +47,7 @@ class HealthCheckMonitoringAdmin(admin.ModelAdmin):
         "last_check",
         "next_check",
     )
-    list_filter = ("is_active", "frequency", "created_at")
+    list_filter = ("is_active", "frequency", "notification_mode", "created_at")
     search_fields = (
         "installation_id",
         "subdomain",
@@ -54,9 +62,17 @@ class HealthCheckMonitoringAdmin(admin.ModelAdmin):
         ),
         (
             "Monitoring Settings",
-            {"fields": ("is_active", "frequency", "notification_emails")},
+            {
+                "fields": (
+                    "is_active",
+                    "frequency",
+                    "notification_emails",
+                    "notification_mode",
+                )
+            },
         ),
         ("Schedule Information", {"fields": ("last_check", "next_check")}),
+        ("Notifications", {"fields": ("notified_counts", "last_notified_at")}),
         ("Timestamps", {"fields": ("created_at", "updated_at")}),
     )
 
@@ -72,6 +88,23 @@ class ZendeskUserAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(StripeWebhookEvent)
+class StripeWebhookEventAdmin(admin.ModelAdmin):
+    list_display = (
+        "event_id",
+        "event_type",
+        "object_id",
+        "status",
+        "attempts",
+        "event_created",
+        "processed_at",
+        "next_attempt_at",
+    )
+    list_filter = ("status", "event_type")
+    search_fields = ("event_id", "object_id")
+    readonly_fields = ("received_at", "claimed_at", "processed_at")
+
+
 @admin.register(SiteConfiguration)
 class SiteConfigurationAdmin(admin.ModelAdmin):
     list_display = ['is_chat_enabled']
@@ -83,3 +116,32 @@ class SiteConfigurationAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         # Prevent deletion of the configuration
         return False
+
+
+@admin.register(MonitoringNotification)
+class MonitoringNotificationAdmin(admin.ModelAdmin):
+    list_display = (
+        "installation_id",
+        "report_id",
+        "subject",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "created_at",
+        "sent_at",
+    )
+    list_filter = ("status",)
+    search_fields = ("installation_id", "subject")
+    readonly_fields = ("created_at", "sent_at", "last_error")
+
+
+@admin.register(InstallationCheckStats)
+class InstallationCheckStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        "installation_id",
+        "consecutive_timeouts",
+        "peak_memory_kib",
+        "updated_at",
+    )
+    search_fields = ("installation_id",)
+    readonly_fields = ("updated_at",)
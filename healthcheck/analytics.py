@@ -0,0 +1,191 @@
+"""
+Analytics dispatch kept off the request path.
+
+``identify``/``group``/``track`` push events onto a bounded in-process
+buffer that a background thread drains in batches. When the buffer is full
+events are dropped and counted instead of blocking the caller. Buffered
+events are flushed as the process exits, including Celery worker children
+that are recycled (``worker_process_shutdown``), where atexit never runs.
+
+``ANALYTICS_SINK`` selects where batches go: ``segment`` (default),
+``file`` (JSON lines appended to ``ANALYTICS_FILE_PATH``, for local testing)
+or ``null``.
+
+``identify_if_changed``/``group_if_changed`` skip calls whose traits hash
+matches the last one sent for that user (and group), so page loads don't
+resend identical payloads.
+"""
+
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.core.cache import cache
+import segment.analytics as segment
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsDispatcher:
+    def __init__(self, max_size=1000, batch_size=50, flush_interval=1.0):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = {
+            "enqueued": 0,
+            "dropped": 0,
+            "sent": 0,
+            "failed": 0,
+            "suppressed": 0,
+        }
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Counted from request threads and the delivery thread
+        self._stats_lock = threading.Lock()
+
+    def count(self, stat, number=1):
+        """Add to a counter, returning its new value"""
+        with self._stats_lock:
+            self.stats[stat] += number
+            return self.stats[stat]
+
+    def _ensure_worker(self):
+        """Start the delivery thread, once per process (workers fork after import)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_size)
+            threading.Thread(
+                target=self._run, name="analytics-dispatch", daemon=True
+            ).start()
+            self._pid = os.getpid()
+
+    def enqueue(self, method, *args):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((method, args))
+            self.count("enqueued")
+            return True
+        except queue.Full:
+            dropped = self.count("dropped")
+            if dropped % 100 == 1:
+                logger.warning(
+                    f"Analytics buffer full, dropped {dropped} events so far"
+                )
+            return False
+
+    def flush(self):
+        """Block until every buffered event has been handed to the sink"""
+        if self._pid == os.getpid():
+            self._queue.join()
+        # Without a client nothing was sent; don't start one just to flush it
+        if settings.ANALYTICS_SINK == "segment" and segment.default_client:
+            segment.flush()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._deliver(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _deliver(self, batch):
+        sink = settings.ANALYTICS_SINK
+        try:
+            if sink == "segment":
+                for method, args in batch:
+                    getattr(segment, method)(*args)
+            elif sink == "file":
+                with open(settings.ANALYTICS_FILE_PATH, "a") as f:
+                    for method, args in batch:
+                        f.write(json.dumps({"type": method, "args": args}, default=str))
+                        f.write("\n")
+            self.count("sent", len(batch))
+        except Exception as e:
+            self.count("failed", len(batch))
+            logger.error(f"Error delivering {len(batch)} analytics events: {str(e)}")
+
+
+dispatcher = AnalyticsDispatcher(
+    max_size=settings.ANALYTICS_BUFFER_SIZE,
+    batch_size=settings.ANALYTICS_BATCH_SIZE,
+)
+atexit.register(dispatcher.flush)
+
+
+@worker_process_shutdown.connect
+def flush_on_worker_exit(**kwargs):
+    # Pool children leave through os._exit, skipping atexit
+    dispatcher.flush()
+
+
+def identify(user_id, traits):
+    dispatcher.enqueue("identify", user_id, traits)
+
+
+def group(user_id, group_id, traits):
+    dispatcher.enqueue("group", user_id, group_id, traits)
+
+
+def track(user_id, event, properties):
+    dispatcher.enqueue("track", user_id, event, properties)
+
+
+def identify_if_changed(user_id, traits):
+    _enqueue_if_changed("identify", user_id, user_id, traits)
+
+
+def group_if_changed(user_id, group_id, traits):
+    _enqueue_if_changed("group", f"{user_id}:{group_id}", user_id, group_id, traits)
+
+
+def _enqueue_if_changed(method, identifier, *args):
+    """
+    Enqueue a call unless its traits (the last argument) hash to the last
+    ones sent. The new hash is only recorded once the call is enqueued, so
+    a dropped call is sent again next time.
+    """
+    from .cache_utils import HealthCheckCache
+
+    traits_hash = hashlib.sha1(
+        json.dumps(args[-1], sort_keys=True, default=str).encode()
+    ).hexdigest()
+    cache_key = HealthCheckCache.get_cache_key(
+        "analytics_traits", f"{method}:{identifier}"
+    )
+
+    if cache.get(cache_key) == traits_hash:
+        dispatcher.count("suppressed")
+        return
+
+    if dispatcher.enqueue(method, *args):
+        cache.set(cache_key, traits_hash, HealthCheckCache.TIMEOUTS["analytics_traits"])
+
+
+def flush():
+    dispatcher.flush()
+
+
+def get_stats():
+    """Counters for events enqueued, dropped, sent, failed and suppressed as unchanged"""
+    with dispatcher._stats_lock:
+        return dict(dispatcher.stats)
@@ -13,6 +13,9 @@ class HealthcheckConfig(AppConfig):
     def ready(self):
         # Configure Segment analytics
         analytics.write_key = settings.SEGMENT_WRITE_KEY
+        # Without a write key uploads can only fail and be retried, which
+        # stalls the flush at process exit
+        analytics.send = bool(settings.SEGMENT_WRITE_KEY)
 
         # Import signal handlers
         try:
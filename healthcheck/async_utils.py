@@ -0,0 +1,30 @@
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from functools import wraps
+import asyncio
+
+
+def run_in_thread(func):
+    """
+    Wrap a sync cache/DB helper so it can be awaited from an async view
+    without serializing on the request's thread, letting several of them
+    run concurrently under asyncio.gather.
+
+    Each call runs on a pooled executor thread with its own DB connection,
+    so the connection is released after the call the same way Django does
+    at the end of a request (respecting CONN_MAX_AGE).
+    """
+
+    @wraps(func)
+    def call_and_release(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(call_and_release, thread_sensitive=False)
+
+
+async def gather_sync(*calls):
+    """Run (func, *args) sync calls concurrently and return their results in order"""
+    return await asyncio.gather(*(run_in_thread(func)(*args) for func, *args in calls))
@@ -2,9 +2,14 @@ from django.core.cache import cache
 from django.conf import settings
 from .models import ZendeskUser, HealthCheckReport, HealthCheckMonitoring
 from .utils import (
-    format_response_data,
+    format_report_payload,
+    format_report_overlay,
+    get_access_level,
     render_report_components,
+    apply_report_overlay,
+    TIME_SINCE_PLACEHOLDER,
     get_default_subscription_status,
+    get_subscription_details,
 )
 import logging
 
@@ -27,14 +32,21 @@ class HealthCheckCache:
         "latest_report": 300,  # 5 minutes
         "historical_reports": 300,  # 5 minutes
         "billing_info": 300,  # 5 minutes
-        "report_results": 300,  # 5 minutes
+        "billing_details": 300,  # 5 minutes, invalidated by Stripe webhooks
+        # Reports don't change once saved, but these two are capped at a day
+        # rather than kept for the report's lifetime: the cached output comes
+        # from formatting code that changes between deploys, partitions
+        # dropped by retention bypass the save/archive invalidation, and
+        # old reports that are rarely opened shouldn't hold cache memory.
+        "report_results": 86400,  # 1 day, invalidated on save and archive
         "report_csv": 3600,  # 1 hour
         "price_info": 3600,  # 1 hour
         "report_details": 300,  # 5 minutes
         "monitoring": 300,  # 5 minutes
-        "formatted_report": 300,  # 5 minutes
+        "formatted_report": 86400,  # 1 day, capped like report_results
         "report_unlock_status": 60,  # 1 minute for unlock status
         "zaf_data": 300,  # 5 minutes
+        "analytics_traits": 86400,  # 1 day, resend unchanged traits daily
     }
 
     @classmethod
@@ -74,30 +86,45 @@ class HealthCheckCache:
 
     @classmethod
     def get_report_results(cls, report_id, subscription_active=False):
-        """Cache and retrieve formatted report results"""
-        cache_key = cls.get_cache_key(
-            "report_results", f"{report_id}:{subscription_active}"
-        )
+        """
+        Cache and retrieve rendered report results.
+        The HTML is cached per report and access level with a placeholder for
+        the time since the report, which is filled in on every call.
+        """
+        is_unlocked = subscription_active or cls.get_report_unlock_status(report_id)
+        if is_unlocked is None:
+            return None
+        access_level = get_access_level(subscription_active, is_unlocked)
+
+        cache_key = cls.get_cache_key("report_results", f"{report_id}:{access_level}")
 
         cached_results = cache.get(cache_key)
-        if cached_results:
-            return cached_results
+        if not cached_results:
+            try:
+                report = HealthCheckReport.objects.get(id=report_id)
+            except HealthCheckReport.DoesNotExist:
+                return None
 
-        try:
-            report = HealthCheckReport.objects.get(id=report_id)
-            formatted_data = format_response_data(
+            formatted_data = format_report_payload(
                 report.raw_response,
                 subscription_active=subscription_active,
                 report_id=report.id,
                 last_check=report.created_at,
                 is_unlocked=report.is_unlocked,
             )
-            results_html = render_report_components(formatted_data)
+            formatted_data["time_since_check"] = TIME_SINCE_PLACEHOLDER
+            cached_results = {
+                "html": render_report_components(formatted_data),
+                "last_check": report.created_at,
+            }
+            # A failed render returns the error template, which has no
+            # placeholder; don't keep that around for the report's lifetime.
+            if TIME_SINCE_PLACEHOLDER in cached_results["html"]:
+                cache.set(cache_key, cached_results, cls.TIMEOUTS["report_results"])
 
-            cache.set(cache_key, results_html, cls.TIMEOUTS["report_results"])
-            return results_html
-        except HealthCheckReport.DoesNotExist:
-            return None
+        return apply_report_overlay(
+            cached_results["html"], cached_results["last_check"]
+        )
 
     @classmethod
     def get_report_csv_data(cls, report_id):
@@ -205,11 +232,9 @@ class HealthCheckCache:
         if cached_reports:
             return cached_reports
 
-        reports = HealthCheckReport.objects.filter(
-            installation_id=installation_id
-        ).order_by("-created_at")[:limit]
+        reports = HealthCheckReport.get_history_for_installation(installation_id, limit)
 
-        cache.set(cache_key, list(reports), cls.TIMEOUTS["historical_reports"])
+        cache.set(cache_key, reports, cls.TIMEOUTS["historical_reports"])
         return reports
 
     @classmethod
@@ -228,6 +253,20 @@ class HealthCheckCache:
         cache.set(cache_key, billing_info, cls.TIMEOUTS["billing_info"])
         return billing_info
 
+    @classmethod
+    def get_billing_details(cls, subdomain):
+        """Cache and retrieve subscription details for the billing page"""
+        cache_key = cls.get_cache_key("billing_details", subdomain)
+
+        cached_details = cache.get(cache_key)
+        if cached_details is not None:
+            return cached_details
+
+        # Cache "no subscription" as {} so free users don't hit the DB each time
+        details = get_subscription_details(subdomain) or {}
+        cache.set(cache_key, details, cls.TIMEOUTS["billing_details"])
+        return details
+
     @classmethod
     def get_price_info(cls):
         """Cache and retrieve price information"""
@@ -269,24 +308,22 @@ class HealthCheckCache:
 
     @classmethod
     def get_formatted_report(cls, report, subscription_active):
-        """Cache and retrieve formatted report data"""
-        cache_key = cls.get_cache_key(
-            "formatted_report", f"{report.id}:{subscription_active}"
-        )
+        """Cache and retrieve formatted report data, adding the time-relative overlay"""
+        access_level = get_access_level(subscription_active, report.is_unlocked)
+        cache_key = cls.get_cache_key("formatted_report", f"{report.id}:{access_level}")
 
-        cached_format = cache.get(cache_key)
-        if cached_format:
-            return cached_format
+        formatted_data = cache.get(cache_key)
+        if not formatted_data:
+            formatted_data = format_report_payload(
+                report.raw_response,
+                subscription_active=subscription_active,
+                report_id=report.id,
+                last_check=report.created_at,
+                is_unlocked=report.is_unlocked,
+            )
+            cache.set(cache_key, formatted_data, cls.TIMEOUTS["formatted_report"])
 
-        formatted_data = format_response_data(
-            report.raw_response,
-            subscription_active=subscription_active,
-            report_id=report.id,
-            last_check=report.created_at,
-            is_unlocked=report.is_unlocked,
-        )
-        cache.set(cache_key, formatted_data, cls.TIMEOUTS["report_details"])
-        return formatted_data
+        return {**formatted_data, **format_report_overlay(report.created_at)}
 
     @classmethod
     def get_monitoring_settings(cls, installation_id):
@@ -304,6 +341,8 @@ class HealthCheckCache:
             settings_data = {
                 "is_active": monitoring.is_active,
                 "frequency": monitoring.frequency,
+                "preferred_window": monitoring.preferred_window,
+                "notification_mode": monitoring.notification_mode,
                 "notification_emails": monitoring.notification_emails or [],
                 "last_check": monitoring.last_check,
                 "next_check": monitoring.next_check,
@@ -345,6 +384,7 @@ class HealthCheckCache:
         keys_to_delete = [
             cls.get_cache_key("subscription", subdomain),
             cls.get_cache_key("billing_info", f"{subdomain}:{user_id}"),
+            cls.get_cache_key("billing_details", subdomain),
             cls.get_cache_key("user_info", user_id),
         ]
         cache.delete_many(keys_to_delete)
@@ -380,16 +420,68 @@ class HealthCheckCache:
         logger.info(f"Refreshed all cache for installation: {installation_id}")
 
     @classmethod
-    def invalidate_report_data(cls, report_id, subscription_active=False):
+    def get_report_access_keys(cls, report_id):
+        """Cache keys of a report's formatted data and HTML at every access level"""
+        return [
+            cls.get_cache_key(key_type, f"{report_id}:{access_level}")
+            for key_type in ["report_results", "formatted_report"]
+            for access_level in ["full", "limited"]
+        ]
+
+    @classmethod
+    def invalidate_report_data(cls, report_id):
         """Invalidate all caches related to a report"""
         keys_to_delete = [
-            cls.get_cache_key("report_results", f"{report_id}:{subscription_active}"),
+            *cls.get_report_access_keys(report_id),
             cls.get_cache_key("report_csv", report_id),
             cls.get_cache_key("report_unlock_status", report_id),
         ]
         cache.delete_many(keys_to_delete)
         logger.info(f"Invalidated all caches for report: {report_id}")
 
+    @classmethod
+    def invalidate_reports_data(cls, report_ids):
+        """Invalidate the report caches of many reports, e.g. a detached month"""
+        keys_to_delete = []
+        for report_id in report_ids:
+            keys_to_delete.extend(
+                [
+                    *cls.get_report_access_keys(report_id),
+                    cls.get_cache_key("report_csv", report_id),
+                    cls.get_cache_key("report_unlock_status", report_id),
+                ]
+            )
+        cache.delete_many(keys_to_delete)
+        logger.info(f"Invalidated caches for {len(report_ids)} reports")
+
+    @classmethod
+    def invalidate_unlocked_reports(cls, unlocked_reports):
+        """Invalidate caches for bulk-unlocked (report_id, installation_id) pairs"""
+        if not unlocked_reports:
+            return
+
+        keys_to_delete = []
+        for report_id, _ in unlocked_reports:
+            keys_to_delete.extend(
+                [
+                    *cls.get_report_access_keys(report_id),
+                    cls.get_cache_key("report_unlock_status", report_id),
+                    cls.get_cache_key("report_details", report_id),
+                ]
+            )
+        installation_ids = {installation_id for _, installation_id in unlocked_reports}
+        for installation_id in installation_ids:
+            keys_to_delete.extend(
+                [
+                    cls.get_cache_key("latest_report", installation_id),
+                    cls.get_cache_key("historical_reports", installation_id),
+                ]
+            )
+
+        # delete_many issues a single multi-key DEL against Redis
+        cache.delete_many(keys_to_delete)
+        logger.info(f"Invalidated caches for {len(unlocked_reports)} unlocked reports")
+
     @classmethod
     def invalidate_monitoring_cache(cls, installation_id):
         """Invalidate monitoring settings cache"""
@@ -1,7 +1,7 @@
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-import json
+from . import fastjson
+from .fastjson import FastJsonResponse
 from django.core.cache import cache
 from .cache_utils import HealthCheckCache
 import logging
@@ -11,18 +11,18 @@ logger = logging.getLogger(__name__)
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def cache_zaf_data(request):
+async def cache_zaf_data(request):
     """Cache ZAF client data"""
     try:
-        data = json.loads(request.body)
+        data = fastjson.loads(request.body)
         user_id = data.get("user_id")
 
         if not user_id:
-            return JsonResponse({"error": "Missing user_id"}, status=400)
+            return FastJsonResponse({"error": "Missing user_id"}, status=400)
 
         # Cache the ZAF data
         cache_key = HealthCheckCache.get_cache_key("zaf_data", user_id)
-        cache.set(
+        await cache.aset(
             cache_key,
             {
                 "metadata": data.get("metadata"),
@@ -32,23 +32,23 @@ def cache_zaf_data(request):
             timeout=300,
         )  # 5 minutes
 
-        return JsonResponse({"success": True})
+        return FastJsonResponse({"success": True})
     except Exception as e:
         logger.error(f"Error caching ZAF data: {str(e)}")
-        return JsonResponse({"error": str(e)}, status=500)
+        return FastJsonResponse({"error": str(e)}, status=500)
 
 
 @csrf_exempt
 @require_http_methods(["GET"])
-def get_cached_zaf_data(request):
+async def get_cached_zaf_data(request):
     """Retrieve cached ZAF client data"""
     user_id = request.GET.get("user_id")
     if not user_id:
-        return JsonResponse({"error": "Missing user_id"}, status=400)
+        return FastJsonResponse({"error": "Missing user_id"}, status=400)
 
     cache_key = HealthCheckCache.get_cache_key("zaf_data", user_id)
-    cached_data = cache.get(cache_key)
+    cached_data = await cache.aget(cache_key)
 
     if cached_data:
-        return JsonResponse(cached_data)
-    return JsonResponse({"error": "No cached data found"}, status=404)
+        return FastJsonResponse(cached_data)
+    return FastJsonResponse({"error": "No cached data found"}, status=404)
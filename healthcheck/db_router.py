@@ -0,0 +1,147 @@
+"""
+Read-replica routing for report, history and billing reads.
+
+When ``REPLICA_DATABASE`` names a replica database alias, reads of the models in
+REPLICA_MODELS (and dj-stripe's billing tables) made while handling a request
+go to the replica. Everything else, and everything outside requests (Celery
+tasks, management commands), uses the primary.
+
+Reads stick to the primary when a replica could still be behind:
+- for the rest of a request once it has written anything
+- for REPLICA_STICKY_SECONDS after a write that affects an installation or
+  subdomain (e.g. run_health_check creating a report, a Stripe webhook
+  unlocking reports), for requests that read that installation/subdomain
+- inside ``use_primary()`` blocks
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+
+PRIMARY_ALIAS = "default"
+
+REPLICA_MODELS = {"healthcheck.healthcheckreport"}
+REPLICA_APPS = {"djstripe"}
+
+
+class ReadRouting:
+    """Per-request routing state, shared with threads the request spawns"""
+
+    def __init__(self, pinned=False):
+        # Set when the installation was written to recently, or the request
+        # itself has written
+        self.pinned = pinned
+        # Depth of use_primary() blocks
+        self.forced = 0
+
+    @property
+    def use_primary(self):
+        return self.pinned or self.forced > 0
+
+
+_routing = ContextVar("replica_read_routing", default=None)
+
+
+def replica_configured():
+    return bool(settings.REPLICA_DATABASE)
+
+
+def get_pin_keys(installation_id=None, subdomain=None):
+    keys = []
+    if installation_id:
+        keys.append(f"healthcheck:replica_pin:installation:{installation_id}")
+    if subdomain:
+        keys.append(f"healthcheck:replica_pin:subdomain:{subdomain}")
+    return keys
+
+
+def pin_to_primary(installation_id=None, subdomain=None):
+    """Send this installation's/subdomain's reads to the primary for a while"""
+    if not replica_configured():
+        return
+    keys = get_pin_keys(installation_id, subdomain)
+    if keys:
+        cache.set_many(
+            dict.fromkeys(keys, True), timeout=settings.REPLICA_STICKY_SECONDS
+        )
+
+
+def is_pinned(installation_id=None, subdomain=None):
+    keys = get_pin_keys(installation_id, subdomain)
+    return bool(keys and cache.get_many(keys))
+
+
+async def ais_pinned(installation_id=None, subdomain=None):
+    keys = get_pin_keys(installation_id, subdomain)
+    return bool(keys and await cache.aget_many(keys))
+
+
+@contextmanager
+def allow_replica_reads(pinned=False):
+    """Route reads inside the block (a request) through the replica rules"""
+    token = _routing.set(ReadRouting(pinned))
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block, e.g. right after a write"""
+    routing = _routing.get()
+    if routing is None:
+        yield
+        return
+    routing.forced += 1
+    try:
+        yield
+    finally:
+        routing.forced -= 1
+
+
+@contextmanager
+def read_your_writes(installation_id=None, subdomain=None):
+    """Read from the primary inside the block if this installation/subdomain
+    was written to recently"""
+    routing = _routing.get()
+    if (
+        routing is not None
+        and not routing.use_primary
+        and is_pinned(installation_id, subdomain)
+    ):
+        with use_primary():
+            yield
+    else:
+        yield
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if (
+            routing is None
+            or routing.use_primary
+            or not replica_configured()
+            or (
+                model._meta.label_lower not in REPLICA_MODELS
+                and model._meta.app_label not in REPLICA_APPS
+            )
+        ):
+            return PRIMARY_ALIAS
+        return settings.REPLICA_DATABASE
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            # The replica won't have this write yet
+            routing.pinned = True
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != settings.REPLICA_DATABASE
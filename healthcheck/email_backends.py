@@ -0,0 +1,80 @@
+"""
+Email backend for SendGrid's v3 HTTP API, an alternative to SMTP for
+MONITORING_EMAIL_BACKEND. Like Django's SMTP backend, a connection (here an
+HTTPS session) is kept open between open() and close() so batches of
+messages reuse it.
+"""
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from email.utils import parseaddr
+import requests
+
+
+def address(value):
+    name, email = parseaddr(value)
+    return {"email": email, "name": name} if name else {"email": email}
+
+
+class SendGridAPIBackend(BaseEmailBackend):
+    api_url = "https://api.sendgrid.com/v3/mail/send"
+
+    def __init__(self, api_key=None, timeout=None, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.api_key = api_key or settings.SENDGRID_API_KEY
+        self.timeout = timeout or settings.EMAIL_TIMEOUT
+        self.session = None
+
+    def open(self):
+        if self.session is not None:
+            return False
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {self.api_key}"
+        return True
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        new_session = self.open()
+        sent = 0
+        try:
+            for message in email_messages:
+                try:
+                    self._send(message)
+                    sent += 1
+                except requests.RequestException:
+                    if not self.fail_silently:
+                        raise
+        finally:
+            if new_session:
+                self.close()
+        return sent
+
+    def _send(self, message):
+        personalization = {"to": [address(to) for to in message.to]}
+        if message.cc:
+            personalization["cc"] = [address(cc) for cc in message.cc]
+        if message.bcc:
+            personalization["bcc"] = [address(bcc) for bcc in message.bcc]
+
+        # SendGrid wants text/plain before any other content type
+        content = [{"type": "text/plain", "value": message.body}]
+        for alternative, mimetype in getattr(message, "alternatives", []):
+            content.append({"type": mimetype, "value": alternative})
+
+        payload = {
+            "personalizations": [personalization],
+            "from": address(message.from_email),
+            "subject": message.subject,
+            "content": content,
+        }
+        if message.reply_to:
+            payload["reply_to"] = address(message.reply_to[0])
+
+        response = self.session.post(self.api_url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
@@ -0,0 +1,64 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+import json
+import orjson
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so existing
+# handlers for either keep working
+JSONDecodeError = orjson.JSONDecodeError
+
+# Non-string keys (e.g. the None key of hidden_categories) are stringified
+# the way the stdlib encoder does instead of raising, and datetimes go
+# through DjangoJSONEncoder so output matches JsonResponse
+DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+_django_encoder = DjangoJSONEncoder()
+
+
+def _default(obj):
+    """Fall back to Django's encoder for datetimes and the types orjson
+    doesn't know natively (Decimal, lazy translation strings, timedelta, ...)"""
+    return _django_encoder.default(obj)
+
+
+def dumps(obj):
+    """Serialize obj to JSON bytes"""
+    return orjson.dumps(obj, default=_default, option=DUMPS_OPTIONS)
+
+
+def loads(data):
+    """Parse JSON from bytes or str, e.g. request.body or response.content"""
+    return orjson.loads(data)
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    Drop-in replacement for JsonResponse that serializes with orjson.
+    Report responses carry megabyte-sized results_html strings, which is
+    where the stdlib encoder spends most of its time.
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(data), **kwargs)
+
+
+class OrjsonEncoder(json.JSONEncoder):
+    """JSONField encoder; Django calls json.dumps(value, cls=...), which
+    delegates to encode()"""
+
+    def encode(self, o):
+        return dumps(o).decode()
+
+
+class OrjsonDecoder(json.JSONDecoder):
+    """JSONField decoder; Django calls json.loads(value, cls=...), which
+    delegates to decode()"""
+
+    def decode(self, s, _w=None):
+        return loads(s)
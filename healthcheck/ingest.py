@@ -0,0 +1,152 @@
+"""
+Streaming ingest of upstream health check responses.
+
+A scan of a large instance returns tens of megabytes of JSON. Reading it
+with ``response.content`` and parsing it holds the body, its decoded text,
+the parsed dict and the serialized INSERT parameter in memory together.
+Instead, ``ingest_response`` reads the body a chunk at a time and
+
+- feeds each chunk to an incremental (ijson) parser, which counts issues as
+  they go by (the summary report_archive.summarize_issues produces) and
+  checks the body is a complete JSON object, and
+- spools it to a temporary file, in memory up to INGEST_SPOOL_MAX_MEMORY
+  bytes and on disk beyond that.
+
+``create_report`` then streams the spooled payload to Postgres with COPY,
+a chunk at a time, and inserts the report with its raw_response taken from
+there. No Python object ever holds the whole payload.
+"""
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.expressions import RawSQL
+from .models import HealthCheckReport
+from .report_archive import count_issue, empty_summary
+from urllib3.exceptions import ReadTimeoutError
+import ijson
+import requests
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+PREVIEW_BYTES = 500
+
+# Per-session temporary table the payload is copied into
+PAYLOAD_TABLE = "healthcheck_ingest_payload"
+
+# Bytes with a special meaning in COPY's text format. JSON text only has them
+# as escapes (backslash) or whitespace between tokens, and none of them occur
+# inside multi-byte UTF-8 sequences, so chunks can be escaped independently.
+COPY_ESCAPES = [(b"\\", b"\\\\"), (b"\n", b"\\n"), (b"\r", b"\\r"), (b"\t", b"\\t")]
+
+
+class IngestedResponse:
+    """A response body spooled to a temporary file, with its issue summary"""
+
+    def __init__(self, spool, summary, size, preview):
+        self.spool = spool
+        self.summary = summary
+        self.size = size
+        self.preview = preview
+
+    def chunks(self):
+        self.spool.seek(0)
+        while chunk := self.spool.read(CHUNK_SIZE):
+            yield chunk
+
+    def close(self):
+        self.spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def ingest_response(response):
+    """
+    Read a streamed requests response into an IngestedResponse. Raises
+    ValueError if the body isn't a JSON object, and requests.ReadTimeout if
+    the body stops arriving for longer than the request's read timeout.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.INGEST_SPOOL_MAX_MEMORY)
+    summary = empty_summary()
+    issues = ijson.sendable_list()
+    parser = ijson.items_coro(issues, "issues.item")
+    size = 0
+    preview = b""
+
+    try:
+        with response:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if not preview and not chunk.lstrip().startswith(b"{"):
+                    raise ValueError("Upstream response is not a JSON object")
+                if len(preview) < PREVIEW_BYTES:
+                    preview += chunk[: PREVIEW_BYTES - len(preview)]
+                size += len(chunk)
+                spool.write(chunk)
+
+                parser.send(chunk)
+                for issue in issues:
+                    count_issue(summary, issue)
+                del issues[:]
+        parser.close()
+    except ijson.JSONError as e:
+        spool.close()
+        raise ValueError(f"Invalid JSON in upstream response: {e}") from e
+    except requests.ConnectionError as e:
+        spool.close()
+        # Once the headers are in, requests reports a read timeout in the
+        # body as a ConnectionError; callers handle it as the timeout it is
+        if isinstance(e.__context__, ReadTimeoutError) or any(
+            isinstance(arg, ReadTimeoutError) for arg in e.args
+        ):
+            raise requests.ReadTimeout(
+                f"Upstream response body timed out: {e}", response=response
+            ) from e
+        raise
+    except BaseException:
+        spool.close()
+        raise
+
+    return IngestedResponse(
+        spool, summary, size, preview.decode("utf-8", errors="replace")
+    )
+
+
+def escape_copy_text(chunk):
+    for special, escaped in COPY_ESCAPES:
+        chunk = chunk.replace(special, escaped)
+    return chunk
+
+
+def create_report(ingested, **fields):
+    """
+    Create a HealthCheckReport from fields, its raw_response the ingested
+    payload streamed to Postgres with COPY rather than sent as one parameter
+    """
+    return create_with_payload(HealthCheckReport, ingested, **fields)
+
+
+def create_with_payload(model, ingested, **fields):
+    """create_report for any model with a raw_response JSON field"""
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {PAYLOAD_TABLE} "
+            "(payload jsonb) ON COMMIT DELETE ROWS"
+        )
+        # Already empty unless an enclosing transaction ingested one before
+        cursor.execute(f"TRUNCATE {PAYLOAD_TABLE}")
+        with cursor.copy(f"COPY {PAYLOAD_TABLE} (payload) FROM STDIN") as copy:
+            for chunk in ingested.chunks():
+                copy.write(escape_copy_text(chunk))
+
+        instance = model.objects.using(using).create(
+            raw_response=RawSQL(f"(SELECT payload FROM {PAYLOAD_TABLE})", []),
+            **fields,
+        )
+
+    # Leave raw_response to be loaded from the database if anything reads it
+    instance.__dict__.pop("raw_response", None)
+    return instance
@@ -0,0 +1,101 @@
+"""Synthetic upstream health check payloads for benchmark commands"""
+
+import json
+import random
+
+ITEM_TYPES = [
+    "TicketForms",
+    "TicketFields",
+    "UserFields",
+    "OrganizationFields",
+    "TicketTriggers",
+    "Macros",
+    "ZendeskUsers",
+    "SlaPolicies",
+]
+
+# Upstream sections (HealthCheckSectionResult.SECTION_CHOICES) and the issue
+# item_types and counts keys each one covers
+SECTIONS = {
+    "triggers": (["TicketTriggers"], ["ticket_triggers"]),
+    "macros": (["Macros"], ["macros"]),
+    "fields": (
+        ["TicketFields", "UserFields", "OrganizationFields"],
+        ["ticket_fields", "user_fields", "organization_fields"],
+    ),
+    "forms": (["TicketForms"], ["ticket_forms"]),
+    "slas": (["SlaPolicies"], ["sla_policies"]),
+    "users": (["ZendeskUsers"], ["zendesk_users"]),
+}
+
+
+def synthetic_issue(rng, index):
+    issue = {
+        "item_type": rng.choice(ITEM_TYPES),
+        "type": rng.choice(["error", "warning"]),
+        "message": f"Synthetic issue {index}: field is unused in any form",
+        "zendesk_url": f"https://example.zendesk.com/admin/objects/{index}",
+    }
+    if index % 3:
+        issue["active"] = rng.random() > 0.5
+    return issue
+
+
+def synthetic_response(issue_count, seed=0):
+    """Build an upstream-shaped response with issue_count issues"""
+    rng = random.Random(seed)
+    response = synthetic_envelope(issue_count)
+    response["issues"] = [synthetic_issue(rng, index) for index in range(issue_count)]
+    return response
+
+
+def synthetic_envelope(issue_count):
+    return {
+        "name": "Example",
+        "instance_url": "https://example.zendesk.com",
+        "admin_email": "admin@example.com",
+        "created_at": "2020-01-01",
+        "issues": [],
+        "counts": {"ticket_fields": {"total": issue_count}},
+        "sum_totals": {"sum_total": issue_count},
+    }
+
+
+def synthetic_response_chunks(issue_count, seed=0, issues_per_chunk=1000):
+    """
+    The JSON bytes of synthetic_response(issue_count, seed), generated a
+    chunk at a time so payloads bigger than memory can be served
+    """
+    rng = random.Random(seed)
+    head, tail = json.dumps(synthetic_envelope(issue_count)).split('"issues": []')
+    yield f'{head}"issues": ['.encode()
+    for start in range(0, issue_count, issues_per_chunk):
+        issues = [
+            json.dumps(synthetic_issue(rng, index))
+            for index in range(start, min(start + issues_per_chunk, issue_count))
+        ]
+        yield (", " if start else "").encode() + ", ".join(issues).encode()
+    yield f"]{tail}".encode()
+
+
+def synthetic_section_response(sections, issue_count, seed=0):
+    """
+    synthetic_response(issue_count, seed) cut down to the given sections, as
+    the section-aware upstream API returns it
+    """
+    response = synthetic_response(issue_count, seed)
+    item_types = {item for section in sections for item in SECTIONS[section][0]}
+    response["issues"] = [
+        issue for issue in response["issues"] if issue["item_type"] in item_types
+    ]
+    response["counts"] = {
+        key: {
+            "total": sum(
+                1 for issue in response["issues"] if issue["item_type"] == item_type
+            )
+        }
+        for section in sections
+        for item_type, key in zip(*SECTIONS[section])
+    }
+    response["sum_totals"] = {"sum_total": len(response["issues"])}
+    return response
@@ -0,0 +1,90 @@
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import BigIntegerField, F, Func
+from django.utils import timezone
+from healthcheck.models import HealthCheckReport
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def format_bytes(size):
+    if size < 1024:
+        return f"{size} B"
+    for unit in ("KB", "MB", "GB"):
+        size /= 1024
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the raw_response of old health check reports to compressed "
+        "archive storage, keeping a summary of each report's issue counts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-months",
+            type=int,
+            default=settings.REPORT_ARCHIVE_AFTER_MONTHS,
+            help="Archive reports created more than this many months ago",
+        )
+        parser.add_argument(
+            "--limit", type=int, help="Archive at most this many reports"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show how many reports and bytes would be archived",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - relativedelta(months=options["older_than_months"])
+        reports = (
+            HealthCheckReport.objects.filter(
+                created_at__lt=cutoff, archive_path__isnull=True
+            )
+            .annotate(
+                stored_bytes=Func(
+                    F("raw_response"),
+                    function="pg_column_size",
+                    output_field=BigIntegerField(),
+                )
+            )
+            .order_by("created_at")
+        )
+        if options["limit"]:
+            reports = reports[: options["limit"]]
+
+        if options["dry_run"]:
+            sizes = [
+                size or 0 for size in reports.values_list("stored_bytes", flat=True)
+            ]
+            self.stdout.write(
+                f"Would archive {len(sizes)} reports created before "
+                f"{cutoff:%Y-%m-%d}, reclaiming {format_bytes(sum(sizes))}"
+            )
+            return
+
+        archived = failed = stored_total = archived_total = 0
+        for report in reports.iterator(chunk_size=100):
+            try:
+                summary = report.archive(stored_bytes=report.stored_bytes)
+            except Exception as e:
+                failed += 1
+                logger.error(f"Error archiving report {report.id}: {str(e)}")
+                continue
+            archived += 1
+            stored_total += summary.stored_bytes or 0
+            archived_total += summary.archived_bytes
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {archived} reports: reclaimed {format_bytes(stored_total)} "
+                f"in the database, stored {format_bytes(archived_total)} compressed"
+            )
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} reports failed to archive"))
@@ -0,0 +1,87 @@
+from copy import deepcopy
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.utils import load_backend
+from django.test import Client
+import statistics
+import time
+
+ALIAS = "default"
+
+
+def mode_settings(base, mode, prepared):
+    """The default database settings rewritten for a connection mode"""
+    settings_dict = deepcopy(base)
+    options = settings_dict["OPTIONS"]
+    for key in ("pool", "server_side_binding", "prepare_threshold"):
+        options.pop(key, None)
+    settings_dict["CONN_MAX_AGE"] = 600 if mode == "persistent" else 0
+    if mode == "pool":
+        options["pool"] = {"min_size": 1, "max_size": 4}
+    if prepared:
+        options.update({"server_side_binding": True, "prepare_threshold": 5})
+    return settings_dict
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark request latency against the local database with a new "
+        "connection per request, persistent connections and a connection pool"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default="/api/chat-widget/",
+            help="A path whose view queries the database",
+        )
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--prepared",
+            action="store_true",
+            help="Also run each mode with server-side prepared statements",
+        )
+
+    def handle(self, *args, **options):
+        base = connections[ALIAS].settings_dict
+        backend = load_backend(base["ENGINE"])
+        client = Client()
+
+        variants = [(mode, False) for mode in ("none", "persistent", "pool")]
+        if options["prepared"]:
+            variants += [(mode, True) for mode in ("persistent", "pool")]
+
+        original = connections[ALIAS]
+        try:
+            for mode, prepared in variants:
+                connection = backend.DatabaseWrapper(
+                    mode_settings(base, mode, prepared), ALIAS
+                )
+                connections[ALIAS] = connection
+                latencies = self.run(client, connection, options)
+                connection.close()
+                if mode == "pool":
+                    connection.close_pool()
+
+                label = mode + (" +prepared" if prepared else "")
+                self.stdout.write(
+                    f"{label:<21} p50 {statistics.median(latencies):7.2f} ms  "
+                    f"p95 {statistics.quantiles(latencies, n=20)[-1]:7.2f} ms  "
+                    f"mean {statistics.fmean(latencies):7.2f} ms"
+                )
+        finally:
+            connections[ALIAS] = original
+
+    def run(self, client, connection, options):
+        # Warm up the URL resolver, templates and (for the pool) min_size
+        client.get(options["path"])
+        connection.close_if_unusable_or_obsolete()
+
+        latencies = []
+        for _ in range(options["requests"]):
+            start = time.perf_counter()
+            client.get(options["path"])
+            # What request_finished does outside the test client
+            connection.close_if_unusable_or_obsolete()
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
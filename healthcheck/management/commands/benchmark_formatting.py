@@ -0,0 +1,114 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from healthcheck.management.commands._synthetic import synthetic_response
+from healthcheck.utils.formatting import (
+    FREE_CATEGORIES,
+    aggregate_issues,
+    format_response_data,
+)
+import timeit
+
+
+def multi_pass_issue_fields(issues, restricted):
+    """The issue-derived fields as format_response_data computed them before
+    aggregate_issues, one pass per field. Kept as the benchmark baseline."""
+    has_status_values = any("active" in issue for issue in issues)
+    hidden_issues_count = 0
+    hidden_categories = {}
+    if restricted:
+        for issue in issues:
+            item_type = issue.get("item_type")
+            if item_type not in FREE_CATEGORIES:
+                hidden_categories[item_type] = hidden_categories.get(item_type, 0) + 1
+                hidden_issues_count += 1
+        issues = [
+            issue for issue in issues if issue.get("item_type") in FREE_CATEGORIES
+        ]
+
+    return {
+        "has_status_values": has_status_values,
+        "total_issues": len(issues),
+        "critical_issues": sum(1 for issue in issues if issue.get("type") == "error"),
+        "warning_issues": sum(1 for issue in issues if issue.get("type") == "warning"),
+        "categories": sorted(
+            set(issue.get("item_type", "Unknown") for issue in issues)
+        ),
+        "hidden_issues_count": hidden_issues_count,
+        "hidden_categories": hidden_categories,
+        "issues": [
+            {
+                "category": issue.get("item_type", "Unknown"),
+                "severity": issue.get("type", "warning"),
+                "active": issue.get("active", False),
+                "description": issue.get("message", ""),
+                "zendesk_url": issue.get("zendesk_url", "#"),
+            }
+            for issue in issues
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark format_response_data against the multi-pass baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+
+        for size in options["sizes"]:
+            response_data = synthetic_response(size)
+            issues = response_data["issues"]
+
+            for restricted in [False, True]:
+                formatted = format_response_data(
+                    response_data,
+                    subscription_active=not restricted,
+                    report_id=1,
+                    last_check=now,
+                )
+                baseline = multi_pass_issue_fields(issues, restricted)
+                # Rows also carry precomputed display labels the baseline lacks,
+                # so compare them on the baseline's fields only
+                fields = baseline["issues"][0].keys() if baseline["issues"] else ()
+                formatted_rows = [
+                    {field: row[field] for field in fields}
+                    for row in formatted["issues"]
+                ]
+                mismatched = [
+                    key
+                    for key, value in baseline.items()
+                    if (formatted_rows if key == "issues" else formatted[key]) != value
+                ]
+                if mismatched:
+                    self.stdout.write(
+                        self.style.ERROR(
+                            f"{size} issues, restricted={restricted}: output differs in {mismatched}"
+                        )
+                    )
+                    continue
+
+                multi_pass = min(
+                    timeit.repeat(
+                        lambda: multi_pass_issue_fields(issues, restricted),
+                        number=1,
+                        repeat=options["repeat"],
+                    )
+                )
+                single_pass = min(
+                    timeit.repeat(
+                        lambda: aggregate_issues(issues, restricted),
+                        number=1,
+                        repeat=options["repeat"],
+                    )
+                )
+                self.stdout.write(
+                    f"{size:>7} issues, restricted={restricted!s:<5}  "
+                    f"multi-pass {multi_pass * 1000:8.2f} ms  "
+                    f"single-pass {single_pass * 1000:8.2f} ms  "
+                    f"speedup {multi_pass / single_pass:4.2f}x"
+                )
@@ -0,0 +1,130 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from healthcheck import fastjson, ingest
+from healthcheck.management.commands._synthetic import synthetic_response_chunks
+from healthcheck.models import HealthCheckReport
+from healthcheck.report_archive import summarize_issues
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import requests
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+MODES = ("buffered", "streaming")
+
+REPORT_FIELDS = {
+    "installation_id": 0,
+    "api_token": "benchmark",
+    "admin_email": "benchmark@example.com",
+    "instance_guid": "benchmark",
+    "subdomain": "benchmark",
+    "app_guid": "benchmark",
+    "version": "benchmark",
+}
+
+
+def peak_rss_mib():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def serve_synthetic_response(issue_count):
+    """Start a local stand-in for the upstream API and return its URL"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            # HTTP/1.0 without Content-Length: the body ends when we close
+            for chunk in synthetic_response_chunks(issue_count):
+                self.wfile.write(chunk)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/api/health-check/"
+
+
+def run_buffered(url):
+    """The previous run_health_check success path"""
+    response = requests.post(url, json={}, timeout=(30, 600))
+    response.text[:500]
+    response_data = fastjson.loads(response.content)
+    HealthCheckReport.objects.create(raw_response=response_data, **REPORT_FIELDS)
+    return len(response.content), summarize_issues(response_data)
+
+
+def run_streaming(url):
+    response = requests.post(url, json={}, timeout=(30, 600), stream=True)
+    with ingest.ingest_response(response) as ingested:
+        ingest.create_report(ingested, **REPORT_FIELDS)
+    return ingested.size, ingested.summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark peak memory and time of buffered against streaming ingest "
+        "of a large upstream response, each mode in its own process"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--issues",
+            type=int,
+            default=520_000,
+            help="Issues in the synthetic response (the default is ~100 MB)",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=MODES,
+            help="Run one mode against --url in this process, printing JSON",
+        )
+        parser.add_argument("--url")
+
+    def handle(self, *args, **options):
+        if options["mode"]:
+            self.run_mode(options["mode"], options["url"])
+            return
+
+        url = serve_synthetic_response(options["issues"])
+        self.stdout.write(f"{options['issues']} issues")
+        for mode in MODES:
+            # A fresh process per mode, so each peak RSS is its own
+            output = subprocess.run(
+                [sys.executable, sys.argv[0], "benchmark_ingest"]
+                + ["--mode", mode, "--url", url],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            self.stdout.write(
+                f"  {mode:<10} {result['size'] / 2**20:7.1f} MiB body  "
+                f"{result['seconds']:6.2f} s  "
+                f"peak RSS {result['peak_rss_mib']:7.1f} MiB "
+                f"(+{result['peak_rss_mib'] - result['start_rss_mib']:.1f} MiB)  "
+                f"{result['total_issues']} issues"
+            )
+
+    def run_mode(self, mode, url):
+        run = run_streaming if mode == "streaming" else run_buffered
+        start_rss = peak_rss_mib()
+        started = time.perf_counter()
+        with transaction.atomic():
+            size, summary = run(url)
+            transaction.set_rollback(True)
+        result = {
+            "size": size,
+            "seconds": time.perf_counter() - started,
+            "start_rss_mib": start_rss,
+            "peak_rss_mib": peak_rss_mib(),
+            "total_issues": summary["total_issues"],
+        }
+        self.stdout.write(json.dumps(result))
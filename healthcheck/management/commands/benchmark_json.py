@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.utils import timezone
+from healthcheck import fastjson
+from healthcheck.management.commands._synthetic import synthetic_response
+from healthcheck.utils.formatting import format_response_data
+from healthcheck.utils.reports import render_report_components
+import json
+import timeit
+
+
+class Command(BaseCommand):
+    help = "Benchmark stdlib json against the orjson layer on large report payloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000])
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def compare(self, label, stdlib, fast, repeat):
+        stdlib_time = min(timeit.repeat(stdlib, number=1, repeat=repeat))
+        fast_time = min(timeit.repeat(fast, number=1, repeat=repeat))
+        self.stdout.write(
+            f"  {label:<28} json {stdlib_time * 1000:8.2f} ms  "
+            f"orjson {fast_time * 1000:8.2f} ms  "
+            f"speedup {stdlib_time / fast_time:5.2f}x"
+        )
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+
+        for size in options["sizes"]:
+            raw_response = synthetic_response(size)
+            raw_bytes = json.dumps(raw_response).encode()
+            # The check_task_status / get_historical_report response shape
+            payload = {
+                "status": "complete",
+                "results_html": render_report_components(
+                    format_response_data(
+                        raw_response,
+                        subscription_active=True,
+                        report_id=1,
+                        last_check=timezone.now(),
+                    )
+                ),
+            }
+            self.stdout.write(
+                f"{size} issues: raw response {len(raw_bytes) / 1024:.0f} KiB, "
+                f"results_html {len(payload['results_html']) / 1024:.0f} KiB"
+            )
+
+            self.compare(
+                "parse upstream response",
+                lambda: json.loads(raw_bytes),
+                lambda: fastjson.loads(raw_bytes),
+                repeat,
+            )
+            self.compare(
+                "raw_response JSONField save",
+                lambda: json.dumps(raw_response),
+                lambda: json.dumps(raw_response, cls=fastjson.OrjsonEncoder),
+                repeat,
+            )
+            self.compare(
+                "raw_response JSONField load",
+                lambda: json.loads(raw_bytes.decode()),
+                lambda: json.loads(raw_bytes.decode(), cls=fastjson.OrjsonDecoder),
+                repeat,
+            )
+            self.compare(
+                "report JSON response",
+                lambda: JsonResponse(payload),
+                lambda: fastjson.FastJsonResponse(payload),
+                repeat,
+            )
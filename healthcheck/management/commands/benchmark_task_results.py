@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django_celery_results.models import TaskResult
+from healthcheck.management.commands._synthetic import synthetic_response
+from healthcheck.models import HealthCheckReport
+from healthcheck.tasks import RESULT_MESSAGES
+import json
+import statistics
+import time
+
+PREFIX = "benchmark-"
+
+# run_health_check results (success, error) as they were stored before they
+# were compact, and now
+RESULT_FORMATS = {
+    "legacy": (
+        lambda report_id: json.dumps({"error": False, "report_id": report_id}),
+        json.dumps({"error": True, "message": RESULT_MESSAGES["timeout"]}),
+    ),
+    "compact": (
+        lambda report_id: json.dumps({"status": "ok", "report_id": report_id}),
+        json.dumps({"status": "timeout"}),
+    ),
+}
+
+
+def insert_results(table, start, stop, result_format, days, report_id=1_234_567):
+    """
+    Insert finished run_health_check results numbered start to stop, 1 in 5
+    of them errors, with date_done spread over the last days
+    """
+    success, error = RESULT_FORMATS[result_format]
+    success = success(report_id)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (
+                task_id, task_name, status, content_type, content_encoding,
+                result, date_created, date_done, meta
+            )
+            SELECT
+                %s || n,
+                'healthcheck.tasks.run_health_check',
+                'SUCCESS',
+                'application/json',
+                'utf-8',
+                CASE WHEN n %% 5 = 0 THEN %s ELSE %s END,
+                now() - (n %% (%s * 86400)) * interval '1 second',
+                now() - (n %% (%s * 86400)) * interval '1 second',
+                '{{"children": []}}'
+            FROM generate_series(%s, %s) n
+            """,
+            [PREFIX, error, success, days, days, start, stop],
+        )
+
+
+def table_size(table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark task result table growth with legacy and compact results, "
+        "and check_task_status latency and result expiry at a million results"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tasks", type=int, default=1_000_000)
+        parser.add_argument(
+            "--sample-tasks",
+            type=int,
+            default=100_000,
+            help="Results per format for measuring the size of a result",
+        )
+        parser.add_argument(
+            "--days", type=int, default=30, help="Days the results are spread over"
+        )
+        parser.add_argument("--requests", type=int, default=200)
+
+    def handle(self, *args, **options):
+        table = TaskResult._meta.db_table
+
+        self.stdout.write("Result table growth")
+        sample = options["sample_tasks"]
+        for result_format in RESULT_FORMATS:
+            scratch = f"benchmark_{result_format}_results"
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE {scratch} (LIKE {table} INCLUDING ALL)"
+                )
+            insert_results(scratch, 1, sample, result_format, options["days"])
+            per_task = table_size(scratch) / sample
+            self.stdout.write(
+                f"  {result_format:<8} {per_task:6.0f} bytes per result, "
+                f"{per_task * options['tasks'] / 2**20:7.1f} MiB per "
+                f"{options['tasks']:,} results"
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE {scratch}")
+
+        # Polls for finished results, 1 in 5 of them errors, all of a real
+        # report. Committed, since check_task_status reads from its own threads.
+        report = HealthCheckReport.objects.create(
+            installation_id=0,
+            instance_guid="benchmark",
+            app_guid="benchmark",
+            subdomain="benchmark",
+            version="benchmark",
+            raw_response=synthetic_response(100),
+        )
+        ids = [f"{PREFIX}{n}" for n in range(1, options["requests"] + 1)]
+        try:
+            self.stdout.write("check_task_status latency")
+            insert_results(
+                table, 1, len(ids), "compact", options["days"], report_id=report.id
+            )
+            self.time_status(f"  {len(ids):,} results", ids)
+
+            started = time.perf_counter()
+            insert_results(
+                table,
+                len(ids) + 1,
+                options["tasks"],
+                "compact",
+                options["days"],
+                report_id=report.id,
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {table}")
+            self.stdout.write(
+                f"  (inserted {options['tasks'] - len(ids):,} more results in "
+                f"{time.perf_counter() - started:.1f}s, table now "
+                f"{table_size(table) / 2**20:.0f} MiB)"
+            )
+            self.time_status(f"  {options['tasks']:,} results", ids)
+            self.time_status(
+                "  unknown (pending) task", [f"{PREFIX}pending"] * len(ids)
+            )
+
+            started = time.perf_counter()
+            expired, _ = (
+                TaskResult.objects.get_all_expired(settings.CELERY_RESULT_EXPIRES)
+                .filter(task_id__startswith=PREFIX)
+                .delete()
+            )
+            self.stdout.write(
+                f"Expiring results older than {settings.CELERY_RESULT_EXPIRES}: "
+                f"deleted {expired:,} in {time.perf_counter() - started:.1f}s, "
+                f"table now {table_size(table) / 2**20:.0f} MiB before vacuum"
+            )
+        finally:
+            TaskResult.objects.filter(task_id__startswith=PREFIX).delete()
+            report.delete()
+
+    def time_status(self, label, task_ids):
+        client = Client()
+        timings = []
+        for task_id in task_ids:
+            started = time.perf_counter()
+            response = client.get(f"/health_check/status/{task_id}/")
+            timings.append((time.perf_counter() - started) * 1000)
+            response.json()
+        timings.sort()
+        self.stdout.write(
+            f"{label:<28} median {statistics.median(timings):6.2f} ms  "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:6.2f} ms"
+        )
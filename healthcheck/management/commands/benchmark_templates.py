@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.template.loader import get_template
+from django.utils import timezone
+from healthcheck.management.commands._synthetic import synthetic_response
+from healthcheck.utils.formatting import format_response_data
+import time
+import tracemalloc
+
+# Row expressions of results.html -> the per-row filters they replaced
+FILTERED_ROWS = {
+    "{{ issue.status }}": "{{ issue.active|yesno:'active,inactive' }}",
+    "{{ issue.category_label }}": "{{ issue.category|split_camel_case }}",
+    "{{ issue.severity_label }}": "{{ issue.severity|title }}",
+}
+
+
+def filtered_rows_template():
+    """results.html with its rows running filters instead of precomputed labels"""
+    template = get_template("healthcheck/results.html")
+    with open(template.origin.name) as f:
+        source = f.read()
+    for precomputed, filtered in FILTERED_ROWS.items():
+        if precomputed not in source:
+            raise CommandError(f"results.html no longer renders {precomputed}")
+        source = source.replace(precomputed, filtered)
+    return engines["django"].from_string(source)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark rendering results.html with precomputed row labels against "
+        "the same rows running split_camel_case/yesno/title filters"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000])
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        templates = {
+            "filters": filtered_rows_template(),
+            "precomputed": get_template("healthcheck/results.html"),
+        }
+        for rows in options["rows"]:
+            formatted = format_response_data(
+                synthetic_response(rows),
+                subscription_active=True,
+                report_id=1,
+                last_check=timezone.now(),
+            )
+            context = {"data": formatted, "report_id": 1}
+
+            rendered = {}
+            for name, template in templates.items():
+                # Warm up so template compilation isn't part of the timing
+                rendered[name] = template.render(context)
+
+                timings = []
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    template.render(context)
+                    timings.append(time.perf_counter() - start)
+
+                tracemalloc.start()
+                template.render(context)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                self.stdout.write(
+                    f"{rows:>7} rows  {name:<11}  "
+                    f"{min(timings) * 1000:8.2f} ms  "
+                    f"peak {peak / 1024 / 1024:7.2f} MiB  "
+                    f"output {len(rendered[name]) / 1024:8.1f} KiB"
+                )
+
+            if rendered["filters"] != rendered["precomputed"]:
+                self.stdout.write(self.style.ERROR("  Rendered markup differs"))
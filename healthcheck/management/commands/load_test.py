@@ -0,0 +1,165 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+import requests
+import socket
+import statistics
+import subprocess
+import time
+
+# The previous WSGI setup and the current ASGI one, as start.sh runs them
+SERVERS = {
+    "gthread": [
+        "gunicorn",
+        "zendeskapp.wsgi:application",
+        "--workers",
+        "2",
+        "--threads",
+        "2",
+        "--worker-class",
+        "gthread",
+    ],
+    "uvicorn": [
+        "gunicorn",
+        "zendeskapp.asgi:application",
+        "--workers",
+        "2",
+        "--worker-class",
+        "uvicorn_worker.UvicornWorker",
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test an endpoint at increasing concurrency, either against a "
+        "running server or against the gthread and uvicorn setups in turn"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default="/check-unlock-status/?report_id=1",
+            help="Path to request",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, nargs="+", default=[4, 8, 16, 32, 64]
+        )
+        parser.add_argument(
+            "--requests-per-user",
+            type=int,
+            default=20,
+            help="Requests each simulated user makes back to back",
+        )
+        parser.add_argument(
+            "--server",
+            choices=sorted(SERVERS),
+            nargs="+",
+            help="Start each server setup locally and test it (default: test --base-url)",
+        )
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--p95-slo",
+            type=float,
+            default=1000,
+            help="p95 latency in ms a concurrency level must stay under to count",
+        )
+
+    def handle(self, *args, **options):
+        if not options["server"]:
+            self.run_levels(options["base_url"], options)
+            return
+
+        capacity = {}
+        for name in options["server"]:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name}:"))
+            with self.start_server(name, options["port"]):
+                capacity[name] = self.run_levels(
+                    f"http://127.0.0.1:{options['port']}", options
+                )
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Concurrent-user capacity:"))
+        for name, users in capacity.items():
+            self.stdout.write(f"  {name:<8} {users}")
+
+    def run_levels(self, base_url, options):
+        """Run each concurrency level and return the highest one within the SLO"""
+        url = base_url.rstrip("/") + options["path"]
+        capacity = 0
+        for users in options["concurrency"]:
+            latencies, errors, elapsed = self.run_level(
+                url, users, options["requests_per_user"]
+            )
+            completed = len(latencies)
+            p50 = statistics.median(latencies) if latencies else 0
+            p95 = statistics.quantiles(latencies, n=20)[-1] if completed > 1 else p50
+            self.stdout.write(
+                f"  {users:>4} users  {completed / elapsed:8.1f} req/s  "
+                f"p50 {p50:8.1f} ms  p95 {p95:8.1f} ms  errors {errors}"
+            )
+            if not errors and p95 <= options["p95_slo"]:
+                capacity = users
+        return capacity
+
+    def run_level(self, url, users, requests_per_user):
+        def simulate_user(_):
+            latencies, errors = [], 0
+            with requests.Session() as session:
+                for _ in range(requests_per_user):
+                    start = time.perf_counter()
+                    try:
+                        response = session.get(url, timeout=120)
+                        failed = response.status_code >= 500
+                    except requests.RequestException:
+                        failed = True
+                    if failed:
+                        errors += 1
+                    else:
+                        latencies.append((time.perf_counter() - start) * 1000)
+            return latencies, errors
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            results = list(pool.map(simulate_user, range(users)))
+        elapsed = time.perf_counter() - start
+
+        latencies = [latency for user, _ in results for latency in user]
+        return latencies, sum(errors for _, errors in results), elapsed
+
+    def start_server(self, name, port):
+        command = SERVERS[name] + ["--bind", f"127.0.0.1:{port}", "--timeout", "120"]
+        try:
+            process = subprocess.Popen(
+                command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        except FileNotFoundError:
+            raise CommandError("gunicorn is not installed")
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"{name} server exited during startup")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            process.terminate()
+            raise CommandError(f"{name} server did not start listening on {port}")
+
+        return ServerProcess(process)
+
+
+class ServerProcess:
+    """Context manager that stops a started server on exit"""
+
+    def __init__(self, process):
+        self.process = process
+
+    def __enter__(self):
+        return self.process
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait(timeout=30)
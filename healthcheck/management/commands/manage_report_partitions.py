@@ -0,0 +1,124 @@
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from healthcheck import partitions
+from healthcheck.models import HealthCheckReport
+import json
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly health check report partitions, detach the "
+        "ones past the retention period, and optionally show which partitions "
+        "report lookups scan"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.REPORT_PARTITIONS_AHEAD,
+            help="Months after the current one to have partitions for",
+        )
+        parser.add_argument(
+            "--retention-months",
+            type=int,
+            default=settings.REPORT_RETENTION_MONTHS,
+            help="Detach partitions older than this many months (0 keeps all)",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop detached partitions instead of moving them to the archive schema",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show what would change without changing anything",
+        )
+        parser.add_argument(
+            "--explain",
+            type=int,
+            metavar="INSTALLATION_ID",
+            help="EXPLAIN ANALYZE the latest-report and history lookups for an installation",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            self.stdout.write("Report partitioning needs PostgreSQL, skipping")
+            return
+
+        existing = set(partitions.list_partitions())
+        current = partitions.current_month()
+        dry_run = options["dry_run"]
+        cutoff = None
+        if options["retention_months"] > 0:
+            cutoff = current - relativedelta(months=options["retention_months"])
+
+        # Upcoming months, plus any past month whose rows ended up in the
+        # default partition (e.g. written before its partition existed)
+        wanted = {
+            current + relativedelta(months=offset)
+            for offset in range(options["months_ahead"] + 1)
+        }
+        wanted.update(
+            month
+            for month in partitions.default_partition_months()
+            if cutoff is None or month >= cutoff
+        )
+
+        for month in sorted(wanted - existing):
+            if dry_run:
+                self.stdout.write(f"Would create {partitions.partition_name(month)}")
+                continue
+            moved = partitions.create_partition(month)
+            self.stdout.write(
+                f"Created {partitions.partition_name(month)}"
+                + (f" ({moved} rows moved from the default partition)" if moved else "")
+            )
+
+        if cutoff is not None:
+            action = "drop" if options["drop"] else "archive"
+            for month in sorted(existing):
+                if month >= cutoff:
+                    break
+                name = partitions.partition_name(month)
+                if dry_run:
+                    self.stdout.write(f"Would detach and {action} {name}")
+                    continue
+                partitions.detach_partition(month, drop=options["drop"])
+                self.stdout.write(f"Detached and {action}d {name}")
+
+        if options["explain"] is not None:
+            self.explain_lookups(options["explain"])
+
+    def explain_lookups(self, installation_id):
+        """Run the report lookups and report the partitions each query touched"""
+        total = len(partitions.list_partitions()) + 1  # the default partition
+        lookups = {
+            "latest report": HealthCheckReport.get_latest_for_installation,
+            "history": HealthCheckReport.get_history_for_installation,
+        }
+        for label, lookup in lookups.items():
+            with CaptureQueriesContext(connection) as queries:
+                lookup(installation_id)
+
+            for number, query in enumerate(queries.captured_queries, start=1):
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {query['sql']}")
+                    plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+
+                relations = partitions.scanned_relations(plan[0]["Plan"])
+                planned = {name for name, _ in relations}
+                executed = {name for name, ran in relations if ran}
+                self.stdout.write(
+                    f"{label} query {number}: {len(planned)} of {total} partitions "
+                    f"planned, {len(executed)} scanned "
+                    f"({plan[0]['Execution Time']:.2f} ms)"
+                )
+                for name in sorted(executed):
+                    self.stdout.write(f"  {name}")
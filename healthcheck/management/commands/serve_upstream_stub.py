@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from healthcheck.management.commands._synthetic import (
+    SECTIONS,
+    synthetic_section_response,
+)
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import time
+
+
+class SectionStubHandler(BaseHTTPRequestHandler):
+    """
+    A section-aware stand-in for the upstream health check API. A request
+    with a "sections" list gets only those sections' issues and counts,
+    taking section_delay seconds per section; one without gets them all.
+    """
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        sections = payload.get("sections") or list(SECTIONS)
+        if any(section not in SECTIONS for section in sections):
+            self.send_error(400, "Unknown section")
+            return
+
+        time.sleep(self.server.section_delay * len(sections))
+        body = json.dumps(
+            synthetic_section_response(sections, self.server.issue_count)
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a local section-aware stand-in for the upstream health check "
+        "API; point UPSTREAM_API_URL at it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8001)
+        parser.add_argument("--issues", type=int, default=1000)
+        parser.add_argument(
+            "--section-delay",
+            type=float,
+            default=2.0,
+            help="Seconds each section takes, so fan-out speedups show",
+        )
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(("127.0.0.1", options["port"]), SectionStubHandler)
+        server.issue_count = options["issues"]
+        server.section_delay = options["section_delay"]
+        self.stdout.write(
+            f"Serving the upstream API stub on http://127.0.0.1:{options['port']}/ "
+            f"(UPSTREAM_API_URL=http://127.0.0.1:{options['port']}/api/health-check/)"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,185 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from healthcheck import scheduling
+from healthcheck.models import HealthCheckMonitoring
+import heapq
+import random
+
+TIME_ZONES = [
+    "UTC",
+    "America/New_York",
+    "America/Los_Angeles",
+    "Europe/London",
+    "Europe/Berlin",
+    "Asia/Tokyo",
+    "Australia/Sydney",
+]
+
+
+def minute_of(when):
+    return when.replace(second=0, microsecond=0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate scheduled check load per minute and per hour for exact "
+        "interval scheduling and for the spread schedule"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--installations", type=int, default=2000)
+        parser.add_argument(
+            "--burst-minutes",
+            type=int,
+            default=10,
+            help="Synthetic installations are created within this many minutes",
+        )
+        parser.add_argument(
+            "--frequency",
+            choices=["daily", "weekly", "monthly", "mixed"],
+            default="mixed",
+        )
+        parser.add_argument(
+            "--preferred-share",
+            type=float,
+            default=0.3,
+            help="Share of synthetic installations with a preferred window",
+        )
+        parser.add_argument("--days", type=int, default=28)
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=settings.MONITORING_MAX_CHECKS_PER_MINUTE,
+            help="Checks per minute cap for the spread schedule (0 for none)",
+        )
+        parser.add_argument(
+            "--from-db",
+            action="store_true",
+            help="Simulate the active monitoring settings in the database instead",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        installations = (
+            self.load_installations()
+            if options["from_db"]
+            else self.synthetic_installations(options)
+        )
+        if not installations:
+            self.stdout.write("No installations to simulate")
+            return
+
+        start = min(installation["first_check"] for installation in installations)
+        end = start + timedelta(days=options["days"])
+
+        def exact(installation, last_check, per_minute):
+            return last_check + scheduling.PERIODS[installation["frequency"]]
+
+        def spread(installation, last_check, per_minute):
+            next_check = scheduling.next_check_time(
+                installation["installation_id"],
+                installation["frequency"],
+                last_check,
+                installation["time_zone"],
+                installation["preferred_window"],
+            )
+            return scheduling.first_open_minute(
+                next_check, per_minute, options["limit"]
+            )
+
+        self.stdout.write(
+            f"{len(installations)} installations over {options['days']} days"
+        )
+        for label, policy in (("exact interval", exact), ("spread", spread)):
+            per_minute = self.simulate(installations, policy, end)
+            self.report(label, per_minute, options["days"])
+
+    def synthetic_installations(self, options):
+        rng = random.Random(options["seed"])
+        now = minute_of(timezone.now())
+        frequencies = (
+            ["daily", "weekly", "monthly"]
+            if options["frequency"] == "mixed"
+            else [options["frequency"]]
+        )
+        windows = list(scheduling.PREFERRED_WINDOWS)
+        return [
+            {
+                "installation_id": 10_000_000 + index,
+                "frequency": rng.choice(frequencies),
+                "time_zone": rng.choice(TIME_ZONES),
+                "preferred_window": (
+                    rng.choice(windows)
+                    if rng.random() < options["preferred_share"]
+                    else ""
+                ),
+                "first_check": now
+                + timedelta(seconds=rng.randrange(options["burst_minutes"] * 60)),
+            }
+            for index in range(options["installations"])
+        ]
+
+    def load_installations(self):
+        now = timezone.now()
+        return [
+            {**monitoring, "first_check": monitoring["next_check"] or now}
+            for monitoring in HealthCheckMonitoring.objects.filter(
+                is_active=True
+            ).values(
+                "installation_id",
+                "frequency",
+                "time_zone",
+                "preferred_window",
+                "next_check",
+            )
+        ]
+
+    def simulate(self, installations, policy, end):
+        """
+        Run every installation's checks up to end, scheduling each next check
+        when the previous one runs (as run_monitoring_check does). Returns
+        the number of checks the policy scheduled that ran in each minute;
+        the first checks are the same for every policy and aren't counted.
+        """
+        scheduled = Counter()
+        ran = Counter()
+        queue = []
+        for index, installation in enumerate(installations):
+            heapq.heappush(queue, (installation["first_check"], index, True))
+            scheduled[minute_of(installation["first_check"])] += 1
+
+        while queue:
+            when, index, first = heapq.heappop(queue)
+            if when >= end:
+                break
+            if not first:
+                ran[minute_of(when)] += 1
+            next_check = policy(installations[index], when, scheduled)
+            scheduled[minute_of(next_check)] += 1
+            heapq.heappush(queue, (next_check, index, False))
+        return ran
+
+    def report(self, label, per_minute, days):
+        if not per_minute:
+            self.stdout.write(f"{label}: no checks within {days} days")
+            return
+        total = sum(per_minute.values())
+        peak_minute, peak = per_minute.most_common(1)[0]
+        per_hour = Counter()
+        for minute, count in per_minute.items():
+            per_hour[minute.hour] += count
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{label}:"))
+        self.stdout.write(
+            f"  {total} checks, peak {peak}/min at {peak_minute:%Y-%m-%d %H:%M} UTC, "
+            f"{len(per_minute)} minutes with checks"
+        )
+        self.stdout.write("  Checks per day by UTC hour:")
+        busiest = max(per_hour.values())
+        for hour in range(24):
+            average = per_hour[hour] / days
+            bar = "#" * round(40 * per_hour[hour] / busiest)
+            self.stdout.write(f"    {hour:02d}:00 {average:8.1f} {bar}")
@@ -0,0 +1,267 @@
+from billiard.pool import Pool
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import override_settings
+from healthcheck import worker_memory
+from healthcheck.management.commands._synthetic import synthetic_response_chunks
+from healthcheck.models import HealthCheckReport
+from healthcheck.tasks import run_health_check
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import csv
+import itertools
+import os
+import random
+import statistics
+import threading
+import time
+
+SUBDOMAIN = "soak-test"
+
+CHECK = {
+    "url": f"https://{SUBDOMAIN}.zendesk.com",
+    "email": "soak@example.com",
+    "api_token": "soak-test",
+    "installation_id": 0,
+    "user_id": "soak-test",
+    "subdomain": SUBDOMAIN,
+    "instance_guid": "soak-test",
+    "app_guid": "soak-test",
+    "stripe_subscription_id": None,
+    "version": "soak-test",
+    "read_timeout": 600,
+}
+
+# Colours the plot cycles through, one per worker child
+COLOURS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b"]
+
+
+def serve_synthetic_responses(min_issues, max_issues, seed):
+    """
+    Start a local stand-in for the upstream API whose responses have a random
+    number of issues between min_issues and max_issues, and return its URL
+    """
+    requests = itertools.count()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            number = next(requests)
+            issue_count = random.Random(seed + number).randint(min_issues, max_issues)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            for chunk in synthetic_response_chunks(issue_count, seed=number):
+                self.wfile.write(chunk)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/api/health-check/"
+
+
+def run_check(number):
+    """Run one health check in a pool worker and sample its memory"""
+    result = run_health_check.apply(kwargs=CHECK).result
+    # worker_memory reset the peak as the task started
+    return {
+        "check": number,
+        "finished": time.time(),
+        "pid": os.getpid(),
+        "status": result.get("status"),
+        "rss_kib": worker_memory.current_rss_kib(),
+        "peak_kib": worker_memory.peak_rss_kib(),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Run thousands of synthetic health checks through a pool of recycled "
+        "worker processes, as the Celery worker does, and plot their memory "
+        "over time to an SVG (with the samples in a CSV)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--checks", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--min-issues", type=int, default=1_000)
+        parser.add_argument("--max-issues", type=int, default=60_000)
+        parser.add_argument(
+            "--max-tasks-per-child",
+            type=int,
+            default=settings.CELERY_WORKER_MAX_TASKS_PER_CHILD,
+        )
+        parser.add_argument(
+            "--max-memory-per-child",
+            type=int,
+            default=settings.CELERY_WORKER_MAX_MEMORY_PER_CHILD,
+            help="KiB",
+        )
+        parser.add_argument(
+            "--no-recycle",
+            action="store_true",
+            help="Keep every worker process for the whole run",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output",
+            default="soak-test",
+            help="Path prefix for the .csv and .svg written",
+        )
+
+    def handle(self, *args, **options):
+        if options["no_recycle"]:
+            options["max_tasks_per_child"] = options["max_memory_per_child"] = 0
+
+        url = serve_synthetic_responses(
+            options["min_issues"], options["max_issues"], options["seed"]
+        )
+        # Worker processes are forked with these settings and open their own
+        # database connections; a pool (DB_CONNECTION_MODE=pool) can't be
+        # shared across the fork either
+        overrides = override_settings(
+            UPSTREAM_API_URL=url,
+            UPSTREAM_MAX_REQUESTS_PER_MINUTE=0,
+            ANALYTICS_SINK="null",
+        )
+        overrides.enable()
+        for connection in connections.all():
+            connection.close()
+            connection.close_pool()
+        pool = Pool(
+            processes=options["concurrency"],
+            maxtasksperchild=options["max_tasks_per_child"] or None,
+            max_memory_per_child=options["max_memory_per_child"] or None,
+        )
+        started = time.time()
+        samples = []
+        try:
+            # One job per check: a worker recycled partway through an imap
+            # job gets the whole job marked as lost
+            results = [
+                pool.apply_async(run_check, (number,))
+                for number in range(options["checks"])
+            ]
+            for result in results:
+                sample = result.get()
+                sample["seconds"] = sample.pop("finished") - started
+                samples.append(sample)
+                if len(samples) % 100 == 0:
+                    self.stdout.write(
+                        f"  {len(samples):,} checks, {sample['seconds']:.0f}s"
+                    )
+        finally:
+            pool.terminate()
+            pool.join()
+            overrides.disable()
+            HealthCheckReport.objects.filter(subdomain=SUBDOMAIN).delete()
+
+        self.report(samples, options)
+
+    def report(self, samples, options):
+        samples.sort(key=lambda sample: sample["seconds"])
+        with open(f"{options['output']}.csv", "w", newline="") as f:
+            writer = csv.DictWriter(
+                f, ["check", "seconds", "pid", "status", "rss_kib", "peak_kib"]
+            )
+            writer.writeheader()
+            writer.writerows(samples)
+        with open(f"{options['output']}.svg", "w") as f:
+            f.write(plot_memory(samples, options["max_memory_per_child"]))
+
+        tenth = max(1, len(samples) // 10)
+        first = [sample["rss_kib"] for sample in samples[:tenth]]
+        last = [sample["rss_kib"] for sample in samples[-tenth:]]
+        statuses = {}
+        for sample in samples:
+            statuses[sample["status"]] = statuses.get(sample["status"], 0) + 1
+        self.stdout.write(
+            f"{len(samples):,} checks in {samples[-1]['seconds']:.0f}s "
+            f"({statuses}) across {len({s['pid'] for s in samples})} processes"
+        )
+        self.stdout.write(
+            f"  RSS after a check: median {statistics.median(first) / 1024:.0f} MiB "
+            f"in the first tenth, {statistics.median(last) / 1024:.0f} MiB in the "
+            f"last, max {max(s['rss_kib'] for s in samples) / 1024:.0f} MiB"
+        )
+        self.stdout.write(
+            f"  Peak RSS during a check: max "
+            f"{max(s['peak_kib'] for s in samples) / 1024:.0f} MiB"
+        )
+        self.stdout.write(f"Wrote {options['output']}.csv and {options['output']}.svg")
+
+
+def plot_memory(samples, limit_kib, width=960, height=480, margin=60):
+    """
+    An SVG of RSS after each check (lines, one per worker process) and peak
+    RSS during it (dots) against time, with the memory limit if there is one
+    """
+    max_seconds = max(sample["seconds"] for sample in samples) or 1
+    max_mib = (
+        max([sample["peak_kib"] for sample in samples] + [limit_kib or 0]) / 1024 * 1.1
+    )
+
+    def x(seconds):
+        return margin + seconds / max_seconds * (width - 2 * margin)
+
+    def y(mib):
+        return height - margin - mib / max_mib * (height - 2 * margin)
+
+    parts = [
+        (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+            f'height="{height}" font-family="sans-serif" font-size="12">'
+        ),
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+        (
+            f'<line x1="{margin}" y1="{y(0)}" x2="{width - margin}" y2="{y(0)}" '
+            'stroke="black"/>'
+        ),
+        (
+            f'<line x1="{margin}" y1="{y(0)}" x2="{margin}" y2="{margin}" '
+            'stroke="black"/>'
+        ),
+        (
+            f'<text x="{width / 2}" y="{height - 15}" text-anchor="middle">'
+            "seconds</text>"
+        ),
+        (
+            f'<text x="15" y="{height / 2}" '
+            f'transform="rotate(-90 15 {height / 2})" '
+            'text-anchor="middle">RSS (MiB)</text>'
+        ),
+    ]
+    for tick in range(5):
+        mib, seconds = max_mib * tick / 4, max_seconds * tick / 4
+        parts.append(
+            f'<text x="{margin - 5}" y="{y(mib) + 4:.1f}" text-anchor="end">'
+            f"{mib:.0f}</text>"
+        )
+        parts.append(
+            f'<text x="{x(seconds):.1f}" y="{y(0) + 16}" text-anchor="middle">'
+            f"{seconds:.0f}</text>"
+        )
+    if limit_kib:
+        parts.append(
+            f'<line x1="{margin}" y1="{y(limit_kib / 1024):.1f}" '
+            f'x2="{width - margin}" y2="{y(limit_kib / 1024):.1f}" '
+            'stroke="red" stroke-dasharray="6 4"/>'
+        )
+
+    pids = list(dict.fromkeys(sample["pid"] for sample in samples))
+    for index, pid in enumerate(pids):
+        colour = COLOURS[index % len(COLOURS)]
+        own = [sample for sample in samples if sample["pid"] == pid]
+        points = " ".join(
+            f"{x(s['seconds']):.1f},{y(s['rss_kib'] / 1024):.1f}" for s in own
+        )
+        parts.append(f'<polyline points="{points}" fill="none" stroke="{colour}"/>')
+        parts += [
+            f'<circle cx="{x(s["seconds"]):.1f}" cy="{y(s["peak_kib"] / 1024):.1f}" '
+            f'r="1.5" fill="{colour}" fill-opacity="0.4"/>'
+            for s in own
+        ]
+    parts.append("</svg>")
+    return "\n".join(parts)
@@ -1,7 +1,45 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.utils.deprecation import MiddlewareMixin
+from .db_router import (
+    ais_pinned,
+    allow_replica_reads,
+    is_pinned,
+    replica_configured,
+)
 
 
 class AllowIframeMiddleware(MiddlewareMixin):
     def process_response(self, request, response):
         response["X-Frame-Options"] = "ALLOWALL"
         return response
+
+
+class ReplicaRoutingMiddleware:
+    """Let the request's report/billing reads use the read replica, unless
+    its installation was written to recently"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replica_configured():
+            return self.get_response(request)
+
+        installation_id = request.GET.get("installation_id")
+        with allow_replica_reads(pinned=is_pinned(installation_id)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not replica_configured():
+            return await self.get_response(request)
+
+        installation_id = request.GET.get("installation_id")
+        with allow_replica_reads(pinned=await ais_pinned(installation_id)):
+            return await self.get_response(request)
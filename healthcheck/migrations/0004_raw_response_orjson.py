@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-19 16:21
+
+import healthcheck.fastjson
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("healthcheck", "0003_stripewebhookevent"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="healthcheckreport",
+            name="raw_response",
+            field=models.JSONField(
+                decoder=healthcheck.fastjson.OrjsonDecoder,
+                encoder=healthcheck.fastjson.OrjsonEncoder,
+            ),
+        ),
+    ]
@@ -0,0 +1,104 @@
+"""
+Partition healthcheck_healthcheckreport by month on created_at.
+
+Postgres needs the partition key in every unique constraint, so the primary
+key becomes (id, created_at). Identity columns aren't supported on
+partitioned tables before Postgres 17, so id takes its values from an owned
+sequence instead (pg_get_serial_sequence and Django's sequence resets keep
+working). Monthly partitions are created from the oldest report's month to
+three months ahead; anything outside them lands in the default partition
+until manage_report_partitions creates its month.
+
+Django's model state is unchanged: the model still sees ``id`` as its
+primary key, which stays unique because the sequence is the only source of
+ids.
+"""
+
+from django.db import migrations
+
+TABLE = "healthcheck_healthcheckreport"
+
+FORWARD_SQL = f"""
+CREATE TABLE {TABLE}_partitioned (
+    LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+) PARTITION BY RANGE (created_at);
+
+ALTER TABLE {TABLE}_partitioned
+    ADD CONSTRAINT {TABLE}_partitioned_pkey PRIMARY KEY (id, created_at);
+
+CREATE TABLE {TABLE}_default PARTITION OF {TABLE}_partitioned DEFAULT;
+
+DO $$
+DECLARE
+    month date := date_trunc('month', coalesce(
+        (SELECT min(created_at) FROM {TABLE}), now()
+    ));
+    last_month date := date_trunc('month', now()) + interval '3 months';
+BEGIN
+    WHILE month <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF {TABLE}_partitioned '
+            'FOR VALUES FROM (%L) TO (%L)',
+            '{TABLE}_p' || to_char(month, 'YYYY_MM'),
+            month,
+            month + interval '1 month'
+        );
+        month := month + interval '1 month';
+    END LOOP;
+END
+$$;
+
+INSERT INTO {TABLE}_partitioned SELECT * FROM {TABLE};
+
+DROP TABLE {TABLE};
+ALTER TABLE {TABLE}_partitioned RENAME TO {TABLE};
+ALTER INDEX {TABLE}_partitioned_pkey RENAME TO {TABLE}_pkey;
+
+CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id;
+SELECT setval('{TABLE}_id_seq', coalesce(max(id), 0) + 1, false) FROM {TABLE};
+ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq');
+
+CREATE INDEX {TABLE}_instance_guid_8e4c8fd4 ON {TABLE} (instance_guid);
+CREATE INDEX {TABLE}_instance_guid_8e4c8fd4_like
+    ON {TABLE} (instance_guid varchar_pattern_ops);
+CREATE INDEX healthcheck_instanc_7b6a5b_idx ON {TABLE} (instance_guid, created_at);
+CREATE INDEX healthcheck_install_c0ea02_idx ON {TABLE} (installation_id, created_at);
+CREATE INDEX healthcheck_subdoma_f62e37_idx ON {TABLE} (subdomain, created_at);
+"""
+
+REVERSE_SQL = f"""
+CREATE TABLE {TABLE}_unpartitioned (
+    LIKE {TABLE} INCLUDING CONSTRAINTS
+);
+ALTER TABLE {TABLE}_unpartitioned
+    ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;
+
+INSERT INTO {TABLE}_unpartitioned SELECT * FROM {TABLE};
+SELECT setval(
+    pg_get_serial_sequence('{TABLE}_unpartitioned', 'id'),
+    coalesce(max(id), 0) + 1,
+    false
+) FROM {TABLE}_unpartitioned;
+
+DROP TABLE {TABLE};
+ALTER TABLE {TABLE}_unpartitioned RENAME TO {TABLE};
+ALTER SEQUENCE {TABLE}_unpartitioned_id_seq RENAME TO {TABLE}_id_seq;
+ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id);
+
+CREATE INDEX {TABLE}_instance_guid_8e4c8fd4 ON {TABLE} (instance_guid);
+CREATE INDEX {TABLE}_instance_guid_8e4c8fd4_like
+    ON {TABLE} (instance_guid varchar_pattern_ops);
+CREATE INDEX healthcheck_instanc_7b6a5b_idx ON {TABLE} (instance_guid, created_at);
+CREATE INDEX healthcheck_install_c0ea02_idx ON {TABLE} (installation_id, created_at);
+CREATE INDEX healthcheck_subdoma_f62e37_idx ON {TABLE} (subdomain, created_at);
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("healthcheck", "0004_raw_response_orjson"),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.4 on 2026-10-19 17:14
+
+import healthcheck.fastjson
+import healthcheck.report_archive
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("healthcheck", "0005_partition_healthcheckreport"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthcheckreport",
+            name="archive_path",
+            field=models.CharField(
+                blank=True,
+                help_text="Where raw_response is kept in report archive storage",
+                max_length=255,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="healthcheckreport",
+            name="archived_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="healthcheckreport",
+            name="raw_response",
+            field=healthcheck.report_archive.ArchivableJSONField(
+                blank=True,
+                decoder=healthcheck.fastjson.OrjsonDecoder,
+                encoder=healthcheck.fastjson.OrjsonEncoder,
+                null=True,
+            ),
+        ),
+        migrations.CreateModel(
+            name="HealthCheckReportSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("report_id", models.BigIntegerField(unique=True)),
+                ("installation_id", models.BigIntegerField()),
+                ("subdomain", models.CharField(max_length=255)),
+                ("report_created_at", models.DateTimeField()),
+                ("total_issues", models.PositiveIntegerField(default=0)),
+                ("issues_by_severity", models.JSONField(default=dict)),
+                ("issues_by_category", models.JSONField(default=dict)),
+                ("stored_bytes", models.BigIntegerField(blank=True, null=True)),
+                ("archived_bytes", models.BigIntegerField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["installation_id", "report_created_at"],
+                        name="healthcheck_install_da76f8_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-19 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("healthcheck", "0006_report_archive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthcheckmonitoring",
+            name="lease_expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="healthcheckmonitoring",
+            name="lease_owner",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-19 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("healthcheck", "0007_monitoring_lease"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthcheckmonitoring",
+            name="preferred_window",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("", "Any time"),
+                    ("overnight", "Overnight (00:00-06:00)"),
+                    ("morning", "Morning (06:00-12:00)"),
+                    ("afternoon", "Afternoon (12:00-18:00)"),
+                    ("evening", "Evening (18:00-24:00)"),
+                ],
+                default="",
+                help_text="Part of the day checks should run in; any time if blank",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="healthcheckmonitoring",
+            name="time_zone",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("healthcheck", "0009_monitoringnotification"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthcheckmonitoring",
+            name="last_notified_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="healthcheckmonitoring",
+            name="notification_mode",
+            field=models.CharField(
+                choices=[
+                    ("always", "After every check"),
+                    ("changes", "Only when results change"),
+                    ("digest", "Weekly digest"),
+                ],
+                default="always",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="healthcheckmonitoring",
+            name="notified_counts",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:04
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("healthcheck", "0010_monitoring_notification_mode"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InstallationCheckStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("installation_id", models.BigIntegerField(unique=True)),
+                (
+                    "durations",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.FloatField(),
+                        blank=True,
+                        default=list,
+                        size=None,
+                    ),
+                ),
+                ("consecutive_timeouts", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:20
+
+import healthcheck.fastjson
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("healthcheck", "0011_installation_check_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HealthCheckSectionResult",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("check_id", models.CharField(db_index=True, max_length=255)),
+                (
+                    "section",
+                    models.CharField(
+                        choices=[
+                            ("triggers", "Triggers"),
+                            ("macros", "Macros"),
+                            ("fields", "Fields"),
+                            ("forms", "Forms"),
+                            ("slas", "SLA Policies"),
+                            ("users", "Users"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "raw_response",
+                    models.JSONField(
+                        blank=True,
+                        decoder=healthcheck.fastjson.OrjsonDecoder,
+                        encoder=healthcheck.fastjson.OrjsonEncoder,
+                        null=True,
+                    ),
+                ),
+                ("summary", models.JSONField(blank=True, default=dict)),
+                ("error", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("check_id", "section"), name="unique_check_section"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-19 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("healthcheck", "0012_section_results"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="installationcheckstats",
+            name="peak_memory_kib",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
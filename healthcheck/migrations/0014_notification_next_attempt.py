@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-19 19:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("healthcheck", "0013_installation_peak_memory"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="monitoringnotification",
+            name="healthcheck_status_271734_idx",
+        ),
+        migrations.AddField(
+            model_name="monitoringnotification",
+            name="next_attempt_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="monitoringnotification",
+            index=models.Index(
+                fields=["status", "next_attempt_at"],
+                name="healthcheck_status_5e6b05_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-19 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("healthcheck", "0015_stripe_event_claim"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stripewebhookevent",
+            name="next_attempt_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="stripewebhookevent",
+            index=models.Index(
+                fields=["status", "next_attempt_at"],
+                name="healthcheck_status_1b8b12_idx",
+            ),
+        ),
+    ]
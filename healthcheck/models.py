@@ -1,13 +1,22 @@
 # Create your models here.
-from datetime import timedelta
-from dateutil.relativedelta import relativedelta
-from django.db import models
+from contextlib import contextmanager
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import Count
+from django.db.models.functions import Trunc
+from django.db.models.expressions import RawSQL
 from django.utils import timezone
 from django.contrib.postgres.fields import ArrayField
+from django.core.mail import EmailMultiAlternatives
 from django.core.validators import EmailValidator
 from djstripe.models import Subscription
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from .fastjson import OrjsonDecoder, OrjsonEncoder
+from .report_archive import ArchivableJSONField, summarize_issues, write_payload
+from .db_router import pin_to_primary
+from . import scheduling
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,7 +42,16 @@ class HealthCheckReport(models.Model):
     version = models.CharField(max_length=50)
 
     # Report data
-    raw_response = models.JSONField()  # Store the complete API response
+    raw_response = ArchivableJSONField(
+        encoder=OrjsonEncoder, decoder=OrjsonDecoder, null=True, blank=True
+    )  # Store the complete API response; empty once archived
+    archive_path = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text="Where raw_response is kept in report archive storage",
+    )
+    archived_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -43,14 +61,123 @@ class HealthCheckReport(models.Model):
         max_length=320, null=True, blank=True
     )  # Optional: track payment ID
 
+    # The table is partitioned by month on created_at. Report lookups try the
+    # last few months first, which lets Postgres skip every older partition,
+    # and widen the window a step at a time when that comes up short, only
+    # searching all of them (None) as a last resort.
+    REPORT_WINDOWS = [timedelta(days=92), timedelta(days=365), None]
+
+    @classmethod
+    def get_reports_by_window(cls, installation_id):
+        """An installation's reports, newest first, over each window in turn"""
+        reports = cls.objects.filter(installation_id=installation_id).order_by(
+            "-created_at"
+        )
+        for window in cls.REPORT_WINDOWS:
+            if window is None:
+                yield reports
+            else:
+                yield reports.filter(created_at__gte=timezone.now() - window)
+
     @classmethod
     def get_latest_for_installation(cls, installation_id):
         """Get the most recent report for an installation"""
-        return (
-            cls.objects.filter(installation_id=installation_id)
-            .order_by("-created_at")
-            .first()
+        for reports in cls.get_reports_by_window(installation_id):
+            latest = reports.first()
+            if latest:
+                return latest
+        return None
+
+    @classmethod
+    def get_history_for_installation(cls, installation_id, limit=10):
+        """Get an installation's most recent reports, newest first"""
+        for reports in cls.get_reports_by_window(installation_id):
+            history = list(reports[:limit])
+            if len(history) == limit:
+                break
+        return history
+
+    @classmethod
+    def unlock_for_subdomain(cls, subdomain, chunk_size=500):
+        """
+        Unlock every still-locked report for a subdomain, in chunks, each
+        committed in its own transaction (so call this outside one). Rows
+        that are already unlocked are never touched, so replaying the same
+        subscription event is a no-op. Returns the (id, installation_id)
+        pairs that were unlocked so callers can invalidate exactly those caches.
+        """
+        unlocked = []
+        locked = cls.objects.filter(subdomain=subdomain, is_unlocked=False).order_by(
+            "id"
         )
+        skip_locked = True
+
+        while True:
+            with transaction.atomic():
+                # Rows another transaction holds are skipped at first, so the
+                # chunks keep moving; they are waited for at the end
+                chunk = list(
+                    locked.select_for_update(skip_locked=skip_locked).values_list(
+                        "id", "installation_id"
+                    )[:chunk_size]
+                )
+                if chunk:
+                    cls.objects.filter(
+                        id__in=[report_id for report_id, _ in chunk]
+                    ).update(is_unlocked=True, updated_at=timezone.now())
+
+            unlocked.extend(chunk)
+            if len(chunk) < chunk_size:
+                if skip_locked and locked.exists():
+                    # Some rows were skipped: wait for their locks. A row
+                    # the other transaction unlocked no longer matches.
+                    skip_locked = False
+                    continue
+                break
+
+        return unlocked
+
+    def archive(self, stored_bytes=None):
+        """
+        Move raw_response to report archive storage, keeping a summary row
+        of its issue counts. stored_bytes is the payload's size in the
+        database, recorded to report what archiving reclaimed.
+        """
+        payload = self.raw_response
+        path, archived_bytes = write_payload(self, payload)
+        counts = summarize_issues(payload)
+        archived_at = timezone.now()
+
+        with transaction.atomic():
+            summary, _ = HealthCheckReportSummary.objects.update_or_create(
+                report_id=self.id,
+                defaults={
+                    "installation_id": self.installation_id,
+                    "subdomain": self.subdomain,
+                    "report_created_at": self.created_at,
+                    "total_issues": counts["total_issues"],
+                    "issues_by_severity": counts["by_severity"],
+                    "issues_by_category": counts["by_category"],
+                    "stored_bytes": stored_bytes,
+                    "archived_bytes": archived_bytes,
+                },
+            )
+            self.__class__.objects.filter(
+                id=self.id, created_at=self.created_at
+            ).update(raw_response=None, archive_path=path, archived_at=archived_at)
+
+        # The update above bypasses the post_save invalidation
+        from .cache_utils import HealthCheckCache
+
+        HealthCheckCache.invalidate_report_data(self.id)
+
+        self.archive_path = path
+        self.archived_at = archived_at
+        return summary
+
+    @property
+    def is_archived(self):
+        return bool(self.archive_path)
 
     @property
     def has_active_subscription(self):
@@ -86,6 +213,47 @@ class HealthCheckReport(models.Model):
         ]
 
 
+class HealthCheckReportSummary(models.Model):
+    """Issue counts kept for long-term trends once a report is archived"""
+
+    # Reports are partitioned with a composite primary key, so summaries
+    # refer to them by id instead of a foreign key
+    report_id = models.BigIntegerField(unique=True)
+    installation_id = models.BigIntegerField()
+    subdomain = models.CharField(max_length=255)
+    report_created_at = models.DateTimeField()
+
+    total_issues = models.PositiveIntegerField(default=0)
+    issues_by_severity = models.JSONField(default=dict)
+    issues_by_category = models.JSONField(default=dict)
+
+    # Payload size in the database before archiving, and compressed in storage
+    stored_bytes = models.BigIntegerField(null=True, blank=True)
+    archived_bytes = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def get_trend_for_installation(cls, installation_id, since=None):
+        """Issue counts for an installation's archived reports, oldest first"""
+        summaries = cls.objects.filter(installation_id=installation_id)
+        if since:
+            summaries = summaries.filter(report_created_at__gte=since)
+        return list(
+            summaries.order_by("report_created_at").values(
+                "report_id",
+                "report_created_at",
+                "total_issues",
+                "issues_by_severity",
+                "issues_by_category",
+            )
+        )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["installation_id", "report_created_at"]),
+        ]
+
+
 @receiver(post_save, sender=HealthCheckReport)
 def handle_report_save(sender, instance, created, **kwargs):
     """Handle post-save actions for HealthCheckReport"""
@@ -120,6 +288,25 @@ class HealthCheckMonitoring(models.Model):
         ("monthly", "Monthly"),
     ]
 
+    PREFERRED_WINDOW_CHOICES = [
+        ("", "Any time"),
+        ("overnight", "Overnight (00:00-06:00)"),
+        ("morning", "Morning (06:00-12:00)"),
+        ("afternoon", "Afternoon (12:00-18:00)"),
+        ("evening", "Evening (18:00-24:00)"),
+    ]
+
+    NOTIFICATION_MODE_CHOICES = [
+        ("always", "After every check"),
+        ("changes", "Only when results change"),
+        ("digest", "Weekly digest"),
+    ]
+
+    # A digest goes out once this long after the last email. The leeway lets
+    # a check that runs a little earlier than last week's still send it.
+    DIGEST_PERIOD = timedelta(days=7)
+    DIGEST_LEEWAY = timedelta(hours=12)
+
     # Link to installation
     installation_id = models.BigIntegerField(unique=True)
     instance_guid = models.CharField(max_length=320)
@@ -137,6 +324,22 @@ class HealthCheckMonitoring(models.Model):
         default=list,
         help_text="List of email addresses to receive reports",
     )
+    # When checks run, in the customer's time zone (see healthcheck/scheduling.py)
+    time_zone = models.CharField(max_length=100, null=True, blank=True)
+    preferred_window = models.CharField(
+        max_length=20,
+        choices=PREFERRED_WINDOW_CHOICES,
+        blank=True,
+        default="",
+        help_text="Part of the day checks should run in; any time if blank",
+    )
+    notification_mode = models.CharField(
+        max_length=10, choices=NOTIFICATION_MODE_CHOICES, default="always"
+    )
+    # Issue counts (see report_archive.summarize_issues) in the last email
+    # sent, which later checks are compared against
+    notified_counts = models.JSONField(default=dict, blank=True)
+    last_notified_at = models.DateTimeField(null=True, blank=True)
 
     # Metadata
     last_check = models.DateTimeField(null=True, blank=True)
@@ -144,17 +347,144 @@ class HealthCheckMonitoring(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Set while a scheduler has claimed this check; an expired lease (e.g. the
+    # worker died mid-check) makes the check claimable again
+    lease_owner = models.CharField(max_length=255, null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def claim_due(cls, owner, batch_size=50, lease_seconds=900):
+        """
+        Lease up to batch_size due checks to owner and return them. Rows
+        another scheduler is claiming at the same moment are skipped rather
+        than waited on, so concurrent schedulers never claim the same check.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            claimed_ids = list(
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(is_active=True, next_check__lte=now)
+                .filter(
+                    models.Q(lease_expires_at__isnull=True)
+                    | models.Q(lease_expires_at__lte=now)
+                )
+                .order_by("next_check")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            cls.objects.filter(id__in=claimed_ids).update(
+                lease_owner=owner,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+            )
+        return list(cls.objects.filter(id__in=claimed_ids).order_by("next_check"))
+
+    def holds_lease(self, owner):
+        return (
+            self.lease_owner == owner
+            and self.lease_expires_at is not None
+            and self.lease_expires_at > timezone.now()
+        )
+
+    def complete_check(self, owner, checked_at=None):
+        """
+        Record a check run under owner's lease, schedule the next one and
+        release the lease. Returns False if the lease had already passed to
+        another scheduler, in which case nothing is changed.
+        """
+        self.last_check = checked_at or timezone.now()
+        with self.schedule_lock():
+            self.schedule_next_check()
+            updated = self.__class__.objects.filter(
+                id=self.id, lease_owner=owner
+            ).update(
+                last_check=self.last_check,
+                next_check=self.next_check,
+                lease_owner=None,
+                lease_expires_at=None,
+                updated_at=timezone.now(),
+            )
+        self.lease_owner = self.lease_expires_at = None
+        return bool(updated)
+
+    def defer_check(self, owner, until):
+        """
+        Release owner's lease without recording a check, leaving it due again
+        at until (e.g. once the upstream API is accepting requests again)
+        """
+        updated = self.__class__.objects.filter(id=self.id, lease_owner=owner).update(
+            next_check=until,
+            lease_owner=None,
+            lease_expires_at=None,
+            updated_at=timezone.now(),
+        )
+        self.next_check = until
+        self.lease_owner = self.lease_expires_at = None
+        return bool(updated)
+
+    def notification_due(self, counts, now):
+        """Whether a check with these issue counts should be emailed"""
+        if not self.last_notified_at:
+            return True
+        if self.notification_mode == "changes":
+            return counts != self.notified_counts
+        if self.notification_mode == "digest":
+            since = now - self.last_notified_at
+            return since >= self.DIGEST_PERIOD - self.DIGEST_LEEWAY
+        return True
+
     def schedule_next_check(self):
-        """Calculate and set the next check date based on frequency"""
+        """
+        Set the next check to this installation's slot about one period
+        after the last check, moved on a minute at a time while that minute
+        already has MONITORING_MAX_CHECKS_PER_MINUTE checks
+        """
         if not self.last_check:
             self.last_check = timezone.now()
 
-        if self.frequency == "daily":
-            self.next_check = self.last_check + timedelta(days=1)
-        elif self.frequency == "weekly":
-            self.next_check = self.last_check + timedelta(weeks=1)
-        else:  # monthly
-            self.next_check = self.last_check + relativedelta(months=1)
+        next_check = scheduling.next_check_time(
+            self.installation_id,
+            self.frequency,
+            self.last_check,
+            self.time_zone,
+            self.preferred_window,
+        )
+        limit = settings.MONITORING_MAX_CHECKS_PER_MINUTE
+        self.next_check = scheduling.first_open_minute(
+            next_check, self.get_checks_per_minute(next_check) if limit else {}, limit
+        )
+
+    def get_checks_per_minute(self, start):
+        """
+        Other active checks scheduled in each minute of the day from start's
+        minute, counted in one query
+        """
+        minute_start = start.replace(second=0, microsecond=0)
+        return dict(
+            self.__class__.objects.filter(
+                is_active=True,
+                next_check__gte=minute_start,
+                next_check__lt=minute_start + timedelta(days=1),
+            )
+            .exclude(id=self.id)
+            .annotate(minute=Trunc("next_check", "minute", tzinfo=dt_timezone.utc))
+            .order_by()
+            .values("minute")
+            .annotate(count=Count("id"))
+            .values_list("minute", "count")
+        )
+
+    @staticmethod
+    @contextmanager
+    def schedule_lock():
+        """
+        Serialize scheduling, so two checks being scheduled at once can't
+        both take the last place in a minute. Held until the transaction
+        opened here commits, so schedule and save the check inside it.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(hashtext('monitoring_schedule'))"
+            )
+            yield
 
     def save(self, *args, **kwargs):
         # Ensure notification_emails is never None
@@ -163,8 +493,11 @@ class HealthCheckMonitoring(models.Model):
 
         # Schedule next check only if monitoring is active
         if self.is_active and not self.next_check:
-            self.schedule_next_check()
-        super().save(*args, **kwargs)
+            with self.schedule_lock():
+                self.schedule_next_check()
+                super().save(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
 
     class Meta:
         indexes = [
@@ -255,6 +588,14 @@ def invalidate_report_cache(sender, instance, **kwargs):
     HealthCheckCache.invalidate_report_data(instance.id)
 
 
+@receiver(post_save, sender=HealthCheckReport)
+def pin_report_reads(sender, instance, **kwargs):
+    """Keep the installation's reads on the primary until the replica has caught up"""
+    pin_to_primary(
+        installation_id=instance.installation_id, subdomain=instance.subdomain
+    )
+
+
 class SiteConfiguration(models.Model):
     chat_widget_script = models.TextField(
         blank=True,
@@ -278,3 +619,360 @@ class SiteConfiguration(models.Model):
     @classmethod
     def get_settings(cls):
         return cls.objects.first()
+
+
+class StripeWebhookEvent(models.Model):
+    """Tracks Stripe webhook deliveries handed off to the stripe Celery queue"""
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("processing", "Processing"),
+        ("processed", "Processed"),
+        ("skipped", "Skipped"),
+        ("failed", "Failed"),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=255)
+    # Stripe object the event is about (subscription, checkout session, ...)
+    object_id = models.CharField(max_length=255, blank=True, default="")
+    event_created = models.DateTimeField(null=True, blank=True)
+
+    # How long a delivery's claim on the event lasts, longer than the task
+    # can run; after that another delivery may take it over
+    CLAIM_SECONDS = 300
+    # Failed events are retried by recover_stripe_events, backing off
+    # exponentially from RETRY_SECONDS up to MAX_RETRY_SECONDS
+    RETRY_SECONDS = 60
+    MAX_RETRY_SECONDS = 6 * 3600
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    received_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # Stalled or failed events aren't recovered again before this, so one
+    # isn't queued twice while it waits for a worker
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def record(cls, event):
+        """Record a webhook delivery, returning (webhook_event, should_enqueue)"""
+        webhook_event, created = cls.objects.get_or_create(
+            event_id=event.id,
+            defaults={
+                "event_type": event.type,
+                "object_id": (event.data.get("object") or {}).get("id") or "",
+                "event_created": event.created,
+            },
+        )
+        # Stripe retries deliveries it considers failed; only re-enqueue
+        # events that have not been dealt with yet.
+        return webhook_event, (
+            created
+            or webhook_event.status in ["pending", "failed"]
+            or webhook_event.claim_expired
+        )
+
+    @property
+    def claim_expired(self):
+        """Check if a delivery claimed the event and then never finished it"""
+        return (
+            self.status == "processing"
+            and self.claimed_at is not None
+            and timezone.now() - self.claimed_at > timedelta(seconds=self.CLAIM_SECONDS)
+        )
+
+    @classmethod
+    def claim_stalled(cls, limit, now=None):
+        """
+        Event ids nothing will process without help: pending events never
+        picked up, claims whose delivery died and failed events due a retry.
+        Stripe was already answered, so it won't redeliver them. Each is left
+        alone for CLAIM_SECONDS after being returned.
+        """
+        now = now or timezone.now()
+        stale = now - timedelta(seconds=cls.CLAIM_SECONDS)
+        with transaction.atomic():
+            event_ids = list(
+                cls.objects.filter(
+                    models.Q(status="pending", received_at__lte=stale)
+                    | models.Q(status="processing", claimed_at__lte=stale)
+                    | models.Q(status="failed"),
+                    models.Q(next_attempt_at__isnull=True)
+                    | models.Q(next_attempt_at__lte=now),
+                )
+                .order_by("received_at")
+                .select_for_update(skip_locked=True)
+                .values_list("event_id", flat=True)[:limit]
+            )
+            cls.objects.filter(event_id__in=event_ids).update(
+                next_attempt_at=now + timedelta(seconds=cls.CLAIM_SECONDS)
+            )
+        return event_ids
+
+    def fail(self, now=None):
+        """Mark the event failed, to be retried after an exponential backoff"""
+        now = now or timezone.now()
+        backoff = min(
+            self.RETRY_SECONDS * 2 ** max(self.attempts - 1, 0),
+            self.MAX_RETRY_SECONDS,
+        )
+        self.__class__.objects.filter(id=self.id).update(
+            status="failed",
+            processed_at=now,
+            next_attempt_at=now + timedelta(seconds=backoff),
+        )
+
+    @property
+    def is_superseded(self):
+        """
+        Check if a newer event for the same Stripe object was already
+        processed, or is being processed now
+        """
+        if not self.object_id or not self.event_created:
+            return False
+        return (
+            self.__class__.objects.filter(
+                object_id=self.object_id,
+                status__in=["processed", "processing"],
+                event_created__gt=self.event_created,
+            )
+            .exclude(id=self.id)
+            .exists()
+        )
+
+    def mark(self, status):
+        self.status = status
+        self.processed_at = timezone.now()
+        self.save(update_fields=["status", "processed_at", "attempts"])
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["object_id", "event_created"]),
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+
+class MonitoringNotification(models.Model):
+    """A monitoring report email, queued for the email Celery queue to send"""
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+
+    installation_id = models.BigIntegerField()
+    # Reports are partitioned with a composite primary key, so notifications
+    # refer to them by id instead of a foreign key
+    report_id = models.BigIntegerField(null=True, blank=True)
+    recipients = ArrayField(models.EmailField())
+    subject = models.CharField(max_length=255)
+    html_message = models.TextField()
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    # Pending notifications are sent once this has passed. A sender pushes it
+    # forward while it works on one, and failures back it off.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def retry_later(self, now):
+        """
+        Back off exponentially from MONITORING_EMAIL_RETRY_SECONDS, up to
+        MONITORING_EMAIL_MAX_RETRY_SECONDS, or give up after
+        MONITORING_EMAIL_MAX_ATTEMPTS
+        """
+        if self.attempts >= settings.MONITORING_EMAIL_MAX_ATTEMPTS:
+            self.status = "failed"
+            return
+        delay = min(
+            settings.MONITORING_EMAIL_RETRY_SECONDS * 2 ** (self.attempts - 1),
+            settings.MONITORING_EMAIL_MAX_RETRY_SECONDS,
+        )
+        self.next_attempt_at = now + timedelta(seconds=delay)
+
+    def build_message(self):
+        message = EmailMultiAlternatives(
+            subject=self.subject,
+            body="Please view this email in HTML format",
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=self.recipients,
+        )
+        message.attach_alternative(self.html_message, "text/html")
+        return message
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+
+class InstallationCheckStats(models.Model):
+    """
+    How long an installation's recent health checks took, used to size the
+    next check's timeouts and pick the queue it runs on
+    """
+
+    KEEP_DURATIONS = 10
+
+    installation_id = models.BigIntegerField(unique=True)
+    # Seconds, oldest first. A check that timed out records the timeout it
+    # hit, so the next one gets a longer budget.
+    durations = ArrayField(models.FloatField(), default=list, blank=True)
+    consecutive_timeouts = models.PositiveIntegerField(default=0)
+    # How far the worker's RSS rose above where it started during the last
+    # check, in KiB (see worker_memory)
+    peak_memory_kib = models.PositiveIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def record(cls, installation_id, seconds, timed_out=False):
+        if not installation_id:
+            return
+        with transaction.atomic():
+            stats, _ = cls.objects.select_for_update().get_or_create(
+                installation_id=installation_id
+            )
+            stats.durations = (stats.durations + [round(seconds, 1)])[
+                -cls.KEEP_DURATIONS :
+            ]
+            stats.consecutive_timeouts = (
+                stats.consecutive_timeouts + 1 if timed_out else 0
+            )
+            stats.save()
+
+    @classmethod
+    def record_memory(cls, installation_id, kib):
+        cls.objects.update_or_create(
+            installation_id=installation_id, defaults={"peak_memory_kib": kib}
+        )
+
+    @classmethod
+    def get_budget(cls, installation_id):
+        """
+        HTTP read timeout in seconds for the next check of an installation,
+        and whether it belongs in the large instance lane. Installations
+        without history get HEALTH_CHECK_DEFAULT_TIMEOUT.
+        """
+        durations = (
+            cls.objects.filter(installation_id=installation_id)
+            .values_list("durations", flat=True)
+            .first()
+        )
+        if not durations:
+            return settings.HEALTH_CHECK_DEFAULT_TIMEOUT, False
+
+        slowest = max(durations)
+        timeout = min(
+            max(
+                slowest * settings.HEALTH_CHECK_TIMEOUT_FACTOR,
+                settings.HEALTH_CHECK_MIN_TIMEOUT,
+            ),
+            settings.HEALTH_CHECK_MAX_TIMEOUT,
+        )
+        return round(timeout), slowest >= settings.HEALTH_CHECK_LARGE_SECONDS
+
+
+class HealthCheckSectionResult(models.Model):
+    """
+    One section of a health check fanned out across workers (see
+    tasks.queue_section_checks), kept until merge_section_checks has merged
+    the sections into a HealthCheckReport
+    """
+
+    # In the order their issues appear in the merged report
+    SECTION_CHOICES = [
+        ("triggers", "Triggers"),
+        ("macros", "Macros"),
+        ("fields", "Fields"),
+        ("forms", "Forms"),
+        ("slas", "SLA Policies"),
+        ("users", "Users"),
+    ]
+
+    # The merge task's id, which is also the task id the app polls
+    check_id = models.CharField(max_length=255, db_index=True)
+    section = models.CharField(max_length=20, choices=SECTION_CHOICES)
+    raw_response = models.JSONField(
+        encoder=OrjsonEncoder, decoder=OrjsonDecoder, null=True, blank=True
+    )
+    # Issue counts, as report_archive.summarize_issues gives them
+    summary = models.JSONField(default=dict, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def get_progress(cls, check_id):
+        """The finished sections of a check, without their payloads"""
+        labels = dict(cls.SECTION_CHOICES)
+        return [
+            {
+                "section": section,
+                "label": labels.get(section, section),
+                "status": "error" if error else "complete",
+                "error": error,
+                "total_issues": summary.get("total_issues", 0),
+                "critical_issues": summary.get("by_severity", {}).get("error", 0),
+            }
+            for section, summary, error in cls.objects.filter(
+                check_id=check_id
+            ).values_list("section", "summary", "error")
+        ]
+
+    @classmethod
+    def merged_response(cls, check_id):
+        """
+        An expression for the sections' payloads merged into one upstream
+        response, built in the database so no worker holds every section:
+        issues are concatenated in SECTION_CHOICES order, counts combined
+        and sum_totals added up; other keys come from the first section.
+        """
+        table = cls._meta.db_table
+        sections = [section for section, _ in cls.SECTION_CHOICES]
+        return RawSQL(
+            f"""
+            (SELECT first.raw_response - 'issues' - 'counts' - 'sum_totals'
+                || jsonb_build_object(
+                    'issues', COALESCE((
+                        SELECT jsonb_agg(
+                            issue
+                            ORDER BY array_position(%s::text[], s.section), position
+                        )
+                        FROM {table} s,
+                            jsonb_array_elements(s.raw_response -> 'issues')
+                            WITH ORDINALITY AS issues (issue, position)
+                        WHERE s.check_id = %s
+                    ), '[]'::jsonb),
+                    'counts', COALESCE((
+                        SELECT jsonb_object_agg(key, value)
+                        FROM {table} s, jsonb_each(s.raw_response -> 'counts')
+                        WHERE s.check_id = %s
+                    ), '{{}}'::jsonb),
+                    'sum_totals', COALESCE((
+                        SELECT jsonb_object_agg(key, total)
+                        FROM (
+                            SELECT key, sum((value #>> '{{}}')::numeric) AS total
+                            FROM {table} s, jsonb_each(s.raw_response -> 'sum_totals')
+                            WHERE s.check_id = %s AND jsonb_typeof(value) = 'number'
+                            GROUP BY key
+                        ) totals
+                    ), '{{}}'::jsonb)
+                )
+            FROM {table} first
+            WHERE first.check_id = %s
+            ORDER BY array_position(%s::text[], first.section)
+            LIMIT 1)
+            """,
+            [sections, check_id, check_id, check_id, check_id, sections],
+        )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["check_id", "section"], name="unique_check_section"
+            )
+        ]
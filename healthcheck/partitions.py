@@ -0,0 +1,133 @@
+"""
+Monthly range partitions of ``healthcheck_healthcheckreport`` on created_at.
+
+Migration 0005 turns the table into a partitioned one with a primary key of
+(id, created_at), a partition per month and a default partition for
+anything outside them. The manage_report_partitions command uses these
+helpers to add upcoming months and to detach months past the retention
+period.
+"""
+
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from django.db import connection, transaction
+from django.utils import timezone
+import re
+
+REPORT_TABLE = "healthcheck_healthcheckreport"
+DEFAULT_PARTITION = f"{REPORT_TABLE}_default"
+ARCHIVE_SCHEMA = "archive"
+
+PARTITION_NAME_RE = re.compile(rf"^{REPORT_TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def current_month():
+    return month_start(timezone.now())
+
+
+def partition_name(month):
+    return f"{REPORT_TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def list_partitions():
+    """The months that have a partition attached, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [REPORT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+def default_partition_months():
+    """Months that have rows sitting in the default partition"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', created_at)::date "
+            f"FROM {DEFAULT_PARTITION}"
+        )
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def create_partition(month):
+    """
+    Create and attach the partition for a month. Rows for that month already
+    in the default partition are moved into it first, since attaching a
+    range the default partition still holds rows for would fail.
+    """
+    name = partition_name(month)
+    start, end = month, month + relativedelta(months=1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {name} "
+            f"(LIKE {REPORT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE created_at >= %s AND created_at < %s
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """,
+            [start, end],
+        )
+        moved = cursor.rowcount
+        cursor.execute(
+            f"ALTER TABLE {REPORT_TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+    return moved
+
+
+def detach_partition(month, drop=False):
+    """
+    Detach a month's partition. Detached partitions are kept as plain tables
+    in the archive schema (for pg_dump or later restore) unless drop is set.
+    """
+    from .cache_utils import HealthCheckCache
+
+    name = partition_name(month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SELECT id FROM {name}")
+        report_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute(f"ALTER TABLE {REPORT_TABLE} DETACH PARTITION {name}")
+        if drop:
+            cursor.execute(f"DROP TABLE {name}")
+        else:
+            cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+            cursor.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+    HealthCheckCache.invalidate_reports_data(report_ids)
+
+
+def scanned_relations(plan):
+    """
+    (relation, executed) pairs for every table scan in an
+    EXPLAIN (ANALYZE, FORMAT JSON) plan. Partitions pruned at plan time are
+    absent; ones pruned at run time never execute.
+    """
+    relations = []
+    if "Relation Name" in plan:
+        relations.append((plan["Relation Name"], plan.get("Actual Loops", 1) > 0))
+    for child in plan.get("Plans", []):
+        relations.extend(scanned_relations(child))
+    return relations
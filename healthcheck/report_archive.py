@@ -0,0 +1,93 @@
+"""
+Cold storage for the raw_response of old health check reports.
+
+Archiving a report writes its payload gzip-compressed to the
+``report_archive`` storage (a local directory by default; any Django storage
+backend, e.g. an object store, can be configured in STORAGES) and clears the
+column in the database. ``ArchivableJSONField`` reloads the payload from
+storage the first time an archived report's raw_response is read, so callers
+don't need to know whether a report has been archived.
+"""
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db.models import JSONField
+from django.db.models.query_utils import DeferredAttribute
+from . import fastjson
+import gzip
+
+STORAGE_ALIAS = "report_archive"
+
+
+def get_storage():
+    return storages[STORAGE_ALIAS]
+
+
+def payload_path(report):
+    return f"reports/{report.installation_id}/{report.id}.json.gz"
+
+
+def write_payload(report, payload):
+    """Store a compressed payload and return (path, compressed size)"""
+    data = gzip.compress(fastjson.dumps(payload), compresslevel=6)
+    storage = get_storage()
+    path = payload_path(report)
+    if storage.exists(path):
+        storage.delete(path)
+    return storage.save(path, ContentFile(data)), len(data)
+
+
+def read_payload(path):
+    with get_storage().open(path, "rb") as archived:
+        return fastjson.loads(gzip.decompress(archived.read()))
+
+
+def empty_summary():
+    return {"total_issues": 0, "by_severity": {}, "by_category": {}}
+
+
+def count_issue(summary, issue):
+    """Add one issue to a summary, for callers that see issues one at a time"""
+    severity = issue.get("type", "warning")
+    category = issue.get("item_type", "Unknown")
+    summary["total_issues"] += 1
+    summary["by_severity"][severity] = summary["by_severity"].get(severity, 0) + 1
+    summary["by_category"][category] = summary["by_category"].get(category, 0) + 1
+
+
+def summarize_issues(payload):
+    """Issue counts by severity and category, as kept for archived reports"""
+    summary = empty_summary()
+    for issue in (payload or {}).get("issues", []):
+        count_issue(summary, issue)
+    return summary
+
+
+class ArchivedPayloadAttribute(DeferredAttribute):
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if instance is not None and value is None and instance.archive_path:
+            # Rehydrate once per instance; the column itself stays empty
+            value = read_payload(instance.archive_path)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        # Defining __set__ makes this a data descriptor, so __get__ still runs
+        # once the loaded value is in the instance __dict__
+        instance.__dict__[self.field.attname] = value
+
+
+class ArchivableJSONField(JSONField):
+    """
+    JSONField whose value may live in report archive storage instead of the
+    column, as recorded by the model's archive_path.
+    """
+
+    descriptor_class = ArchivedPayloadAttribute
+
+    def pre_save(self, model_instance, add):
+        # Never write a rehydrated payload back into the database
+        if model_instance.archive_path:
+            return None
+        return super().pre_save(model_instance, add)
@@ -0,0 +1,90 @@
+"""
+When scheduled monitoring checks run.
+
+Rather than exactly one period after the last check, which keeps
+installations created together firing in the same minute forever, each
+installation gets a fixed slot inside its check window: a deterministic
+offset from a hash of its installation_id, in the customer's time zone and
+preferred hours. The next check is that slot on the day nearest to one
+period after the last check, so an installation keeps the same time of day
+from run to run while different installations spread across the window.
+``first_open_minute`` then caps how many checks share a minute.
+"""
+
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import hashlib
+
+PERIODS = {
+    "daily": relativedelta(days=1),
+    "weekly": relativedelta(weeks=1),
+    "monthly": relativedelta(months=1),
+}
+
+# Local hours (start, end) for each preferred check window
+PREFERRED_WINDOWS = {
+    "overnight": (0, 6),
+    "morning": (6, 12),
+    "afternoon": (12, 18),
+    "evening": (18, 24),
+}
+
+
+def get_window(preferred_window=None):
+    """Start and end hour of a check window; the end may wrap past midnight"""
+    if preferred_window in PREFERRED_WINDOWS:
+        return PREFERRED_WINDOWS[preferred_window]
+    return settings.MONITORING_WINDOW_START_HOUR, settings.MONITORING_WINDOW_END_HOUR
+
+
+def get_time_zone(name=None):
+    try:
+        return ZoneInfo(name or settings.MONITORING_DEFAULT_TIME_ZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+
+def installation_offset(installation_id, window_seconds):
+    """Seconds into the window an installation's checks run at, always the same"""
+    digest = hashlib.sha256(str(installation_id).encode()).digest()
+    return int.from_bytes(digest[:8], "big") % window_seconds
+
+
+def next_check_time(
+    installation_id, frequency, last_check, time_zone=None, preferred_window=None
+):
+    """The installation's slot nearest to one period after last_check"""
+    target = last_check + PERIODS.get(frequency, PERIODS["monthly"])
+    tz = get_time_zone(time_zone)
+    start_hour, end_hour = get_window(preferred_window)
+    window_seconds = ((end_hour - start_hour) % 24 or 24) * 3600
+    slot = timedelta(
+        hours=start_hour,
+        seconds=installation_offset(installation_id, window_seconds),
+    )
+
+    target_date = target.astimezone(tz).date()
+    candidates = [
+        datetime.combine(target_date + timedelta(days=days), time(), tzinfo=tz) + slot
+        for days in (-1, 0, 1)
+    ]
+    nearest = min(candidates, key=lambda candidate: abs(candidate - target))
+    return nearest.astimezone(dt_timezone.utc)
+
+
+def first_open_minute(when, checks_per_minute, limit):
+    """
+    Move when forward a minute at a time until fewer than limit checks are
+    scheduled in its minute. checks_per_minute maps the start of each minute
+    in the day from when to the number of checks scheduled in it.
+    """
+    if not limit:
+        return when
+    for _ in range(24 * 60):
+        minute_start = when.replace(second=0, microsecond=0)
+        if checks_per_minute.get(minute_start, 0) < limit:
+            return when
+        when += timedelta(minutes=1)
+    return when
@@ -296,6 +296,33 @@ function updateLoadingProgress(progressBar, startTime, duration) {
     progressBar.setAttribute('aria-valuenow', progress);
 }
 
+// Sections of a fanned-out health check that have finished, shown under the
+// progress bar while the rest are still running
+function updateSectionProgress(resultsDiv, sections, totalSections) {
+    let list = resultsDiv.querySelector('.section-progress');
+    if (!list) {
+        list = document.createElement('ul');
+        list.className = 'section-progress list-group text-start mt-3';
+        resultsDiv.querySelector('.progress').after(list);
+    }
+    list.innerHTML = sections.map(section => {
+        const detail = section.status === 'error'
+            ? '<span class="badge bg-danger">Failed</span>'
+            : `<span class="badge bg-secondary">${section.total_issues} issues</span>
+               ${section.critical_issues ? `<span class="badge bg-danger">${section.critical_issues} critical</span>` : ''}`;
+        return `
+            <li class="list-group-item d-flex justify-content-between align-items-center">
+                ${section.label}
+                <span>${detail}</span>
+            </li>
+        `;
+    }).join('') + `
+        <li class="list-group-item text-muted small">
+            ${sections.length} of ${totalSections} sections checked
+        </li>
+    `;
+}
+
 function initializeRunCheck() {
     const runCheckButton = document.getElementById('run-check');
     if (!runCheckButton) return;
@@ -371,7 +398,9 @@ function initializeRunCheck() {
             if (response.task_id) {
                 let retryCount = 0;
                 const maxRetries = 3;
-                const maxPollingTime = 300000; // 5 minutes in milliseconds
+                // The server sizes this from the check's time limit, which is
+                // longer for large instances; 5 minutes if it didn't say
+                const maxPollingTime = (response.poll_seconds || 300) * 1000;
                 const startPollingTime = Date.now();
 
                 const pollInterval = setInterval(async () => {
@@ -390,6 +419,10 @@ function initializeRunCheck() {
                             secure: true
                         });
                         
+                        if (statusResponse.sections?.length) {
+                            updateSectionProgress(resultsDiv, statusResponse.sections, statusResponse.total_sections);
+                        }
+
                         if (statusResponse.status === 'complete') {
                             clearInterval(pollInterval);
                             clearInterval(progressInterval);
@@ -425,7 +458,10 @@ function initializeRunCheck() {
         } catch (error) {
             clearInterval(progressInterval);
             console.error('Full error details:', error);
-            showError(resultsDiv, error, 'Error Running Health Check');
+            // While the upstream service is unavailable the server turns
+            // new scans away with a 503 and a message saying when to retry
+            const serverMessage = error.responseJSON?.message;
+            showError(resultsDiv, serverMessage ? new Error(serverMessage) : error, 'Error Running Health Check');
         }
     });
 }
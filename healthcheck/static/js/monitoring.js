@@ -104,6 +104,8 @@ const MonitoringApp = {
                 user_id: ZAFClientSingleton.userInfo?.id,
                 is_active: isActive,
                 frequency: form.querySelector('#frequency').value,
+                preferred_window: form.querySelector('#preferred_window')?.value || '',
+                notification_mode: form.querySelector('#notification_mode')?.value || 'always',
                 notification_emails: emails
             };
 
@@ -1,17 +1,201 @@
-from celery import shared_task
-from .models import HealthCheckReport
+from celery import chord, shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from .models import (
+    HealthCheckMonitoring,
+    HealthCheckReport,
+    HealthCheckSectionResult,
+    InstallationCheckStats,
+    MonitoringNotification,
+    StripeWebhookEvent,
+)
 import requests
 import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import timedelta
 from django.conf import settings
-import segment.analytics as analytics  # Add this import
+from django.core.mail import get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from . import analytics
+from . import ingest
+from . import upstream
+from . import worker_memory  # noqa: F401 - connects the task memory signals
 
 logger = logging.getLogger(__name__)
 
+# Health check task results sit in the results table until
+# CELERY_RESULT_EXPIRES, so they are kept compact: a status code, plus the
+# report id when the status is "ok". The app shows these messages for the
+# other statuses; the details are logged.
+RESULT_MESSAGES = {
+    "auth_failed": "Authentication failed.",
+    "api_error": "The health check service returned an error. Please try again.",
+    "unavailable": (
+        "The health check service is busy or temporarily unavailable. "
+        "Please try again in a few minutes."
+    ),
+    "timeout": (
+        "The health check timed out. Large instances take longer to check; "
+        "please try again and it will be given more time."
+    ),
+    "failed": "Health check failed. Please try again.",
+}
+
+
+def get_result_error(result):
+    """The message to show for a health check result, or None if it succeeded"""
+    if isinstance(result, Exception):
+        # The task itself failed, e.g. a chord whose section task was killed
+        return RESULT_MESSAGES["failed"]
+    if "status" not in result:
+        # Written before results were compact
+        return result["message"] if result.get("error") else None
+    if result["status"] == "ok":
+        return None
+    return RESULT_MESSAGES.get(result["status"], RESULT_MESSAGES["failed"])
+
+
+def health_check_options(installation_id):
+    """
+    HTTP read timeout and apply_async options for a health check, sized from
+    the installation's recent check durations. Slow installations go to the
+    large instance queue.
+    """
+    timeout, large = InstallationCheckStats.get_budget(installation_id)
+    options = {
+        "soft_time_limit": timeout + settings.HEALTH_CHECK_TIME_LIMIT_GRACE,
+        "time_limit": timeout + 2 * settings.HEALTH_CHECK_TIME_LIMIT_GRACE,
+    }
+    if large:
+        options["queue"] = settings.HEALTH_CHECK_LARGE_QUEUE
+    return timeout, options
+
+
+def queue_health_check(**check):
+    """
+    Queue run_health_check with timeouts and a queue sized for the
+    installation. Returns its result and its time limit in seconds.
+    """
+    timeout, options = health_check_options(check.get("installation_id"))
+    task = run_health_check.apply_async(
+        kwargs={**check, "read_timeout": timeout}, **options
+    )
+    return task, options["time_limit"]
+
+
+def queue_section_checks(**check):
+    """
+    Queue a health check as a chord: one run_section_check per section, run
+    in parallel, then merge_section_checks to merge them into a report.
+    Returns the merge task's result and the sections' time limit in seconds.
+    The result's id is also the sections' check_id, so polling it shows
+    sections as they finish.
+    """
+    timeout, options = health_check_options(check.get("installation_id"))
+    check_id = str(uuid.uuid4())
+    sections = [
+        run_section_check.signature(
+            kwargs={
+                "check_id": check_id,
+                "section": section,
+                "check": check,
+                "read_timeout": timeout,
+            },
+            **options,
+        )
+        for section, _ in HealthCheckSectionResult.SECTION_CHOICES
+    ]
+    merge = merge_section_checks.signature(
+        kwargs={"check_id": check_id, "check": check, "started_at": time.time()},
+        task_id=check_id,
+    )
+    return chord(sections)(merge), options["time_limit"]
+
+
+def request_health_check(task, check, read_timeout, sections=None):
+    """
+    POST a health check, or only the given sections of one, to the upstream
+    API. Returns (response, None) with the streamed response for a 200 and
+    (None, result status) otherwise. Raises UpstreamUnavailable when the
+    check should be retried later.
+    """
+    payload = {
+        "url": f"https://{check['subdomain']}.zendesk.com",
+        "email": check["email"],
+        "api_token": check["api_token"],
+        "status": "active",
+    }
+    if sections:
+        payload["sections"] = sections
+
+    # Raises UpstreamUnavailable without calling the API while the
+    # upstream circuit breaker is open or every worker is backing off
+    response = upstream.post_health_check(
+        payload,
+        read_timeout,
+        headers={"User-Agent": f"HealthCheck/v{check['version']}"},
+    )
+
+    logger.info(f"Response status code: {response.status_code}")
+
+    if response.status_code in (429, 502, 503, 504):
+        response.close()
+        # Already recorded for the breaker and shared backoff, so wait
+        # for whichever ends last rather than on a schedule of our own
+        raise upstream.UpstreamUnavailable(
+            f"Upstream API returned {response.status_code}",
+            upstream.get_state()["retry_after"] or 60 * (2**task.request.retries),
+        )
+
+    if response.status_code != 200:
+        logger.error(
+            f"API error for {check['subdomain']}: "
+            f"{response.status_code} {response.text}"
+        )
+        return None, "auth_failed" if response.status_code == 401 else "api_error"
+
+    return response, None
+
+
+def retry_unavailable(task, e, subdomain):
+    """Retry a task the upstream API can't take yet, or give up with an error"""
+    if (
+        e.retry_after <= settings.UPSTREAM_MAX_RETRY_WAIT
+        and task.request.retries < task.max_retries
+    ):
+        # Jitter keeps retries held off until the same moment from all
+        # arriving together
+        countdown = e.retry_after + random.uniform(0, 10)
+        logger.warning(
+            f"{e} for {subdomain}, retrying in {countdown:.0f}s "
+            f"(attempt {task.request.retries + 1} of {task.max_retries})"
+        )
+        raise task.retry(exc=e, countdown=countdown)
+    logger.error(f"{e} for {subdomain}, giving up")
+    return {"status": "unavailable"}
+
+
+def record_timeout(installation_id, subdomain, started):
+    # Not retried with the same budget; the next check gets a longer one
+    elapsed = time.monotonic() - started
+    InstallationCheckStats.record(installation_id, elapsed, timed_out=True)
+    logger.warning(f"Health check for {subdomain} timed out after {elapsed:.0f}s")
+    return {"status": "timeout"}
+
 
 @shared_task(
     bind=True,
     max_retries=3,
-    time_limit=120,  # 2 minute timeout
+    # Limits for checks queued without health_check_options
+    soft_time_limit=settings.HEALTH_CHECK_DEFAULT_TIMEOUT
+    + settings.HEALTH_CHECK_TIME_LIMIT_GRACE,
+    time_limit=settings.HEALTH_CHECK_DEFAULT_TIMEOUT
+    + 2 * settings.HEALTH_CHECK_TIME_LIMIT_GRACE,
 )
 def run_health_check(
     self,
@@ -25,117 +209,570 @@ def run_health_check(
     app_guid,
     stripe_subscription_id,
     version,
+    read_timeout=None,
 ):
+    if not read_timeout:
+        read_timeout, _ = InstallationCheckStats.get_budget(installation_id)
+    started = time.monotonic()
     try:
-        zendesk_url = f"https://{subdomain}.zendesk.com"
-        api_url = (
-            "https://app.configly.io/api/health-check/"
-            if settings.ENVIRONMENT == "production"
-            else "https://django-server-development-1b87.up.railway.app/api/health-check/"
-        )
-
         logger.info(f"Starting health check for subdomain: {subdomain}")
-        logger.info(f"Making request to: {api_url}")
-
-        response = requests.post(
-            api_url,
-            headers={
-                "X-API-Token": settings.HEALTHCHECK_TOKEN,
-                "Content-Type": "application/json",
-                "User-Agent": f"HealthCheck/v{version}",
-            },
-            json={
-                "url": zendesk_url,
+        response, status = request_health_check(
+            self,
+            {
+                "subdomain": subdomain,
                 "email": email,
                 "api_token": api_token,
-                "status": "active",
+                "version": version,
             },
-            timeout=(30, 300),
+            read_timeout,
         )
+        if status:
+            return {"status": status}
 
-        logger.info(f"Response status code: {response.status_code}")
-        logger.info(
-            f"Response content: {response.text[:500]}"
-        )  # Log first 500 chars of response
+        # Success path: the body is streamed to a spool file and on into
+        # Postgres, counting issues on the way, without ever being parsed
+        # into one dict
+        with ingest.ingest_response(response) as ingested:
+            InstallationCheckStats.record(installation_id, time.monotonic() - started)
+            logger.info(
+                f"Received {ingested.size} bytes for {subdomain}: {ingested.preview}"
+            )
 
-        if response.status_code == 502:
-            attempt = self.request.retries + 1
-            logger.warning(
-                f"Received 502 error for {subdomain}, attempt {attempt} of 3"
+            report = ingest.create_report(
+                ingested,
+                installation_id=installation_id,
+                api_token=api_token,
+                admin_email=email,
+                instance_guid=instance_guid,
+                subdomain=subdomain,
+                app_guid=app_guid,
+                stripe_subscription_id=stripe_subscription_id,
+                version=version,
             )
+        critical_issues = ingested.summary["by_severity"].get("error", 0)
+
+        # Track health check completed
+        analytics.track(
+            user_id,
+            "Health Check Completed",
+            {
+                "critical_issues": critical_issues,
+                "is_unlocked": report.is_unlocked,
+                "report_id": report.id,
+            },
+        )
+
+        logger.info(f"Successfully completed health check for {subdomain}")
+        return {"status": "ok", "report_id": report.id}
+
+    except upstream.UpstreamUnavailable as e:
+        return retry_unavailable(self, e, subdomain)
+
+    except (requests.Timeout, SoftTimeLimitExceeded):
+        return record_timeout(installation_id, subdomain, started)
+
+    except Exception as e:
+        logger.error(
+            f"Error during health check for {subdomain}: {str(e)}", exc_info=True
+        )
+        return {"status": "failed"}
+
 
-            if attempt < 3:  # Only retry if we haven't hit max retries
-                countdown = 60 * (2**self.request.retries)
-                logger.info(f"Retrying in {countdown} seconds...")
-                self.retry(
-                    exc=Exception(f"502 error from API for {subdomain}"),
-                    countdown=countdown,
+@shared_task(
+    bind=True,
+    max_retries=3,
+    soft_time_limit=settings.HEALTH_CHECK_DEFAULT_TIMEOUT
+    + settings.HEALTH_CHECK_TIME_LIMIT_GRACE,
+    time_limit=settings.HEALTH_CHECK_DEFAULT_TIMEOUT
+    + 2 * settings.HEALTH_CHECK_TIME_LIMIT_GRACE,
+)
+def run_section_check(self, check_id, section, check, read_timeout):
+    """
+    Check one section of an installation, storing the result for
+    merge_section_checks. Errors are stored and returned rather than raised,
+    so the chord still reaches its callback.
+    """
+    subdomain = check["subdomain"]
+    started = time.monotonic()
+    try:
+        logger.info(f"Starting {section} check for subdomain: {subdomain}")
+        response, status = request_health_check(
+            self, check, read_timeout, sections=[section]
+        )
+        if response is not None:
+            with ingest.ingest_response(response) as ingested:
+                ingest.create_with_payload(
+                    HealthCheckSectionResult,
+                    ingested,
+                    check_id=check_id,
+                    section=section,
+                    summary=ingested.summary,
                 )
-            else:
-                logger.error(f"Max retries reached for {subdomain}")
-                return {
-                    "error": True,
-                    "message": "Health check failed after multiple retries. The instance might be too large or temporarily unavailable.",
-                }
-
-        # Rest of the status code handling
-        if response.status_code == 429:
-            logger.warning(f"Rate limit hit for {subdomain}")
-            if self.request.retries < 2:
-                self.retry(countdown=300)
-            return {
-                "error": True,
-                "message": "Rate limit exceeded. Please try again later.",
-            }
+            return {"status": "ok", "section": section}
 
-        if response.status_code != 200:
-            error_message = (
-                "Authentication failed."
-                if response.status_code == 401
-                else f"API Error: {response.text}"
-            )
-            logger.error(f"API error for {subdomain}: {error_message}")
-            return {"error": True, "message": error_message}
+    except upstream.UpstreamUnavailable as e:
+        status = retry_unavailable(self, e, subdomain)["status"]
+
+    except (requests.Timeout, SoftTimeLimitExceeded):
+        status = record_timeout(check.get("installation_id"), subdomain, started)[
+            "status"
+        ]
+
+    except Exception as e:
+        logger.error(
+            f"Error during {section} check for {subdomain}: {str(e)}", exc_info=True
+        )
+        status = "failed"
+
+    HealthCheckSectionResult.objects.update_or_create(
+        check_id=check_id, section=section, defaults={"error": RESULT_MESSAGES[status]}
+    )
+    return {"status": status, "section": section}
 
-        # Success path
-        response_data = response.json()
-        logger.info(f"Successfully received response for {subdomain}")
+
+@shared_task
+def merge_section_checks(results, check_id, check, started_at):
+    """
+    Chord callback for queue_section_checks: merge the sections into one
+    HealthCheckReport and return what run_health_check would have
+    """
+    subdomain = check["subdomain"]
+    try:
+        failed = [result for result in results if result["status"] != "ok"]
+        if failed:
+            labels = dict(HealthCheckSectionResult.SECTION_CHOICES)
+            sections = ", ".join(
+                labels.get(result["section"], result["section"]) for result in failed
+            )
+            logger.error(f"Health check sections failed for {subdomain}: {sections}")
+            return {"status": failed[0]["status"]}
 
         report = HealthCheckReport.objects.create(
-            installation_id=installation_id,
-            api_token=api_token,
-            admin_email=email,
-            instance_guid=instance_guid,
+            installation_id=check["installation_id"],
+            api_token=check["api_token"],
+            admin_email=check["email"],
+            instance_guid=check["instance_guid"],
             subdomain=subdomain,
-            app_guid=app_guid,
-            stripe_subscription_id=stripe_subscription_id,
-            version=version,
-            raw_response=response_data,
+            app_guid=check["app_guid"],
+            stripe_subscription_id=check["stripe_subscription_id"],
+            version=check["version"],
+            raw_response=HealthCheckSectionResult.merged_response(check_id),
         )
-                # Calculate critical issues
-        critical_issues = sum(
-            1
-            for issue in response_data.get("issues", [])
-            if issue.get("type") == "error"
+        # Leave raw_response to be loaded from the database if anything reads it
+        report.__dict__.pop("raw_response", None)
+        # The check's wall-clock time, which is what its budget has to cover
+        InstallationCheckStats.record(
+            check["installation_id"], time.time() - started_at
         )
 
-        # Track health check completed
+        critical_issues = sum(
+            summary.get("by_severity", {}).get("error", 0)
+            for summary in HealthCheckSectionResult.objects.filter(
+                check_id=check_id
+            ).values_list("summary", flat=True)
+        )
         analytics.track(
-            user_id,
+            check["user_id"],
             "Health Check Completed",
             {
                 "critical_issues": critical_issues,
                 "is_unlocked": report.is_unlocked,
                 "report_id": report.id,
-            }
+                "sections": len(results),
+            },
         )
 
+        logger.info(f"Successfully merged health check sections for {subdomain}")
+        return {"status": "ok", "report_id": report.id}
 
-        logger.info(f"Successfully completed health check for {subdomain}")
-        return {"error": False, "report_id": report.id}
+    except Exception as e:
+        logger.error(
+            f"Error merging health check for {subdomain}: {str(e)}", exc_info=True
+        )
+        return {"status": "failed"}
+
+    finally:
+        HealthCheckSectionResult.objects.filter(check_id=check_id).delete()
+
+
+@shared_task(ignore_result=True)
+def delete_stale_section_results():
+    """
+    Delete the sections of fanned out checks that never reached
+    merge_section_checks, e.g. because a section task was killed at its time
+    limit or ran out of memory, which fails the whole chord. Run by beat.
+    """
+    stale = timezone.now() - timedelta(
+        seconds=settings.HEALTH_CHECK_SECTION_RESULT_MAX_AGE
+    )
+    deleted, _ = HealthCheckSectionResult.objects.filter(created_at__lt=stale).delete()
+    if deleted:
+        logger.warning(f"Deleted {deleted} section results of unfinished checks")
+    return deleted
+
+
+def claim_stripe_event(event_id):
+    """
+    Claim a recorded Stripe event for this delivery, returning it, or None if
+    it has been dealt with or another delivery is processing it. The row is
+    only locked while it is claimed, not while the event is processed.
+    """
+    with transaction.atomic():
+        webhook_event = StripeWebhookEvent.objects.select_for_update().get(
+            event_id=event_id
+        )
+        if webhook_event.status in ["processed", "skipped"]:
+            logger.info(f"Stripe event {event_id} already {webhook_event.status}")
+            return None
+        if webhook_event.status == "processing" and not webhook_event.claim_expired:
+            logger.info(f"Stripe event {event_id} is being processed elsewhere")
+            return None
+
+        webhook_event.attempts += 1
+
+        # Stripe does not guarantee delivery order; never let an older
+        # subscription state overwrite a newer one.
+        if webhook_event.is_superseded:
+            logger.info(f"Skipping superseded Stripe event {event_id}")
+            webhook_event.mark("skipped")
+            return None
+
+        webhook_event.status = "processing"
+        webhook_event.claimed_at = timezone.now()
+        webhook_event.save(update_fields=["status", "claimed_at", "attempts"])
+    return webhook_event
+
+
+@shared_task(
+    bind=True,
+    max_retries=5,
+    default_retry_delay=30,
+    ignore_result=True,
+    # A worker killed mid-event puts the message back on the queue instead of
+    # losing it; recover_stripe_events covers anything that still stalls
+    acks_late=True,
+    reject_on_worker_lost=True,
+)
+def process_stripe_event(self, event_id):
+    """Process a Stripe webhook event recorded by the dj-stripe receivers"""
+    from djstripe.models import Event
+    from .webhooks import EVENT_PROCESSORS
+
+    webhook_event = None
+    try:
+        webhook_event = claim_stripe_event(event_id)
+        if webhook_event is None:
+            return
+
+        # Outside any transaction: the processors commit their own short
+        # ones, so report rows are only locked while they are updated
+        event = Event.objects.get(id=event_id)
+        EVENT_PROCESSORS[event.type](event)
+        webhook_event.mark("processed")
+        logger.info(f"Processed Stripe event {event_id} ({event.type})")
 
     except Exception as e:
         logger.error(
-            f"Error during health check for {subdomain}: {str(e)}", exc_info=True
+            f"Error processing Stripe event {event_id}: {str(e)}", exc_info=True
+        )
+        if self.request.retries >= self.max_retries:
+            # recover_stripe_events tries it again after a backoff
+            webhook_event = (
+                webhook_event
+                or StripeWebhookEvent.objects.filter(event_id=event_id).first()
+            )
+            if webhook_event is not None:
+                webhook_event.fail()
+            return
+        if webhook_event is not None:
+            # Give up this delivery's claim so the retry can take it
+            StripeWebhookEvent.objects.filter(
+                event_id=event_id,
+                status="processing",
+                claimed_at=webhook_event.claimed_at,
+            ).update(status="pending")
+        raise self.retry(exc=e)
+
+
+@shared_task(ignore_result=True)
+def recover_stripe_events():
+    """
+    Queue Stripe events again that stalled or failed. Run by Celery beat,
+    since Stripe only redelivers events the webhook didn't accept.
+    """
+    event_ids = StripeWebhookEvent.claim_stalled(settings.STRIPE_RECOVERY_BATCH_SIZE)
+    for event_id in event_ids:
+        process_stripe_event.delay(event_id)
+    if event_ids:
+        logger.warning(f"Queued {len(event_ids)} stalled or failed Stripe events")
+    return len(event_ids)
+
+
+def get_scheduler_id():
+    """Lease owner name, unique to this scheduler run"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim_due_checks(owner, limit=None):
+    """Lease due monitoring checks (up to limit) to owner, a batch at a time"""
+    claimed = 0
+    while limit is None or claimed < limit:
+        batch_size = settings.MONITORING_CLAIM_BATCH_SIZE
+        if limit is not None:
+            batch_size = min(batch_size, limit - claimed)
+        batch = HealthCheckMonitoring.claim_due(
+            owner, batch_size, settings.MONITORING_LEASE_SECONDS
+        )
+        yield from batch
+        claimed += len(batch)
+        if len(batch) < batch_size:
+            break
+
+
+@shared_task(ignore_result=True)
+def schedule_due_checks():
+    """
+    Queue a run_monitoring_check for every due monitoring check. Run by
+    Celery beat; any number of schedulers can run at once, as each check is
+    leased to exactly one of them.
+    """
+    owner = get_scheduler_id()
+    queued = 0
+    # Beat runs this every minute, so this caps checks started per minute;
+    # a backlog (e.g. after an outage) drains at that rate
+    limit = settings.MONITORING_MAX_CHECKS_PER_MINUTE or None
+    for monitoring in claim_due_checks(owner, limit):
+        timeout, options = health_check_options(monitoring.installation_id)
+        run_monitoring_check.apply_async(
+            (monitoring.id, owner), {"read_timeout": timeout}, **options
+        )
+        queued += 1
+
+    if queued:
+        logger.info(f"Queued {queued} scheduled health checks ({owner})")
+    return queued
+
+
+@shared_task(ignore_result=True, time_limit=600)
+def run_monitoring_check(monitoring_id, lease_owner, read_timeout=None):
+    """Run a scheduled health check leased to lease_owner and email the results"""
+    try:
+        monitoring = HealthCheckMonitoring.objects.get(id=monitoring_id)
+    except HealthCheckMonitoring.DoesNotExist:
+        return
+
+    if not monitoring.holds_lease(lease_owner):
+        # The lease expired before this ran and another scheduler took over
+        logger.info(f"Skipping check for {monitoring.subdomain}: lease not held")
+        return
+
+    if not read_timeout:
+        read_timeout, _ = InstallationCheckStats.get_budget(monitoring.installation_id)
+    checked_at = timezone.now()
+    started = time.monotonic()
+    deferred_until = None
+    try:
+        # Get latest report to get metadata
+        latest_report = HealthCheckReport.get_latest_for_installation(
+            monitoring.installation_id
+        )
+        if not latest_report:
+            logger.warning(f"No latest report found for {monitoring.installation_id}")
+            return
+
+        response = upstream.post_health_check(
+            {
+                "url": f"https://{monitoring.subdomain}.zendesk.com",
+                "email": latest_report.admin_email,
+                "api_token": latest_report.api_token,
+                "status": "active",
+            },
+            read_timeout,
+        )
+        if response.status_code == 429 or response.status_code >= 500:
+            response.close()
+            # Already recorded for the breaker and shared backoff: defer
+            # until whichever ends last (handled below)
+            raise upstream.UpstreamUnavailable(
+                f"Upstream API returned {response.status_code}",
+                upstream.get_state()["retry_after"]
+                or settings.UPSTREAM_BREAKER_COOLDOWN,
+            )
+        if response.status_code != 200:
+            response.close()
+            logger.error(
+                f"Scheduled check API error for {monitoring.subdomain}: "
+                f"{response.status_code}"
+            )
+            return
+
+        with ingest.ingest_response(response) as ingested:
+            InstallationCheckStats.record(
+                monitoring.installation_id, time.monotonic() - started
+            )
+            report = ingest.create_report(
+                ingested,
+                installation_id=monitoring.installation_id,
+                instance_guid=monitoring.instance_guid,
+                subdomain=monitoring.subdomain,
+                admin_email=latest_report.admin_email,
+                api_token=latest_report.api_token,
+                app_guid=latest_report.app_guid,
+                version=latest_report.version,
+            )
+
+        # Send email notification if configured and due under the
+        # installation's notification mode; most change-only and digest
+        # checks stop here without rendering anything
+        counts = ingested.summary
+        if monitoring.notification_emails and monitoring.notification_due(
+            counts, checked_at
+        ):
+            previous = monitoring.notified_counts or {}
+            context = {
+                "subdomain": monitoring.subdomain,
+                "total_issues": counts["total_issues"],
+                "critical_issues": counts["by_severity"].get("error", 0),
+                "warning_issues": counts["by_severity"].get("warning", 0),
+                "previous_total_issues": previous.get("total_issues"),
+                "is_digest": monitoring.notification_mode == "digest",
+                "report_url": f"{settings.APP_URL}/report/{report.id}/",
+            }
+            MonitoringNotification.objects.create(
+                installation_id=monitoring.installation_id,
+                report_id=report.id,
+                recipients=monitoring.notification_emails,
+                subject=f"Zendesk Healthcheck Report: {monitoring.subdomain}",
+                html_message=render_to_string(
+                    "healthcheck/email/monitoring_report.html", context
+                ),
+            )
+            monitoring.notified_counts = counts
+            monitoring.last_notified_at = checked_at
+            monitoring.save(update_fields=["notified_counts", "last_notified_at"])
+            transaction.on_commit(send_monitoring_notifications.delay)
+            logger.info(f"Email queued for {monitoring.notification_emails}")
+        elif monitoring.notification_emails:
+            logger.info(
+                f"No email for {monitoring.subdomain}: "
+                f"{monitoring.notification_mode} mode, nothing new to report"
+            )
+
+        logger.info(f"Completed scheduled health check for {monitoring.subdomain}")
+
+    except upstream.UpstreamUnavailable as e:
+        # Try again once the upstream API is accepting requests, rather than
+        # waiting a whole period for the next scheduled check
+        deferred_until = timezone.now() + timedelta(
+            seconds=e.retry_after + random.uniform(0, 60)
+        )
+        logger.warning(
+            f"{e}, deferring check for {monitoring.subdomain} to {deferred_until}"
         )
-        return {"error": True, "message": f"Health check failed: {str(e)}"}
+
+    except (requests.Timeout, SoftTimeLimitExceeded):
+        elapsed = time.monotonic() - started
+        InstallationCheckStats.record(
+            monitoring.installation_id, elapsed, timed_out=True
+        )
+        logger.warning(
+            f"Scheduled check for {monitoring.subdomain} timed out after {elapsed:.0f}s"
+        )
+
+    except Exception as e:
+        logger.error(
+            f"Error processing check for {monitoring.subdomain}: {str(e)}",
+            exc_info=True,
+        )
+    finally:
+        # Failed checks wait for their next scheduled time, as before
+        if deferred_until:
+            monitoring.defer_check(lease_owner, deferred_until)
+        elif not monitoring.complete_check(lease_owner, checked_at):
+            logger.warning(
+                f"Lease for {monitoring.subdomain} was lost before the check finished"
+            )
+
+
+def claim_due_notifications(limit):
+    """
+    Claim up to limit due monitoring notifications for this sender. The claim
+    pushes their next_attempt_at MONITORING_EMAIL_CLAIM_SECONDS ahead and
+    commits straight away, so other senders skip them without any row lock
+    being held while they are sent, and they are tried again if this sender
+    dies.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            MonitoringNotification.objects.select_for_update(skip_locked=True)
+            .filter(status="pending", next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "created_at")[:limit]
+        )
+        MonitoringNotification.objects.filter(
+            id__in=[notification.id for notification in batch]
+        ).update(
+            next_attempt_at=now
+            + timedelta(seconds=settings.MONITORING_EMAIL_CLAIM_SECONDS)
+        )
+    return batch
+
+
+@shared_task(ignore_result=True)
+def send_monitoring_notifications():
+    """
+    Send due monitoring emails in batches over one reused connection to
+    MONITORING_EMAIL_BACKEND, opened only once there is something to send.
+    Runs on the email queue, both when a check queues a notification and
+    every minute from beat; a notification that fails to send is retried
+    with exponential backoff (MonitoringNotification.retry_later).
+    """
+    batch_size = settings.MONITORING_EMAIL_BATCH_SIZE
+    connection = None
+    sent = failed = 0
+
+    try:
+        while batch := claim_due_notifications(batch_size):
+            if connection is None:
+                connection = get_connection(settings.MONITORING_EMAIL_BACKEND)
+                connection.open()
+            for notification in batch:
+                notification.attempts += 1
+                try:
+                    message = notification.build_message()
+                    if not connection.send_messages([message]):
+                        raise RuntimeError("The email backend sent nothing")
+                except Exception as e:
+                    failed += 1
+                    notification.last_error = str(e)
+                    notification.retry_later(timezone.now())
+                    logger.warning(
+                        f"Error sending monitoring email {notification.id}: {str(e)}"
+                    )
+                    # Drop a connection the error may have broken; the
+                    # backend opens a new one for the next message
+                    connection.close()
+                else:
+                    sent += 1
+                    notification.status = "sent"
+                    notification.sent_at = timezone.now()
+                    notification.last_error = None
+                notification.save(
+                    update_fields=[
+                        "status",
+                        "attempts",
+                        "last_error",
+                        "next_attempt_at",
+                        "sent_at",
+                    ]
+                )
+
+            if len(batch) < batch_size:
+                break
+    finally:
+        if connection is not None:
+            connection.close()
+
+    if sent or failed:
+        logger.info(f"Sent {sent} monitoring emails, {failed} failed")
+    return sent
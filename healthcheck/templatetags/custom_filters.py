@@ -1,5 +1,5 @@
 from django import template
-import re
+from ..utils.formatting import category_label
 
 register = template.Library()
 
@@ -10,4 +10,4 @@ def split_camel_case(value):
     Splits camel case string into separate words.
     Example: 'TicketForms' -> 'Ticket Forms'
     """
-    return re.sub(r"(?<!^)(?=[A-Z])", " ", value)
+    return category_label(value)
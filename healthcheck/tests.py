@@ -1,10 +1,80 @@
-from django.test import TestCase
+from django.test import (
+    AsyncRequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
 from django.utils import timezone
 from django.core import mail
 from datetime import timedelta
-from .models import HealthCheckMonitoring, HealthCheckReport
+from dateutil.relativedelta import relativedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import os
+import queue
+import requests
+import socketserver
+import tempfile
+import threading
+import time
+from .models import (
+    HealthCheckMonitoring,
+    HealthCheckReport,
+    HealthCheckReportSummary,
+    HealthCheckSectionResult,
+    InstallationCheckStats,
+    MonitoringNotification,
+    StripeWebhookEvent,
+    ZendeskUser,
+)
+from .tasks import (
+    RESULT_MESSAGES,
+    delete_stale_section_results,
+    health_check_options,
+    merge_section_checks,
+    process_stripe_event,
+    recover_stripe_events,
+    run_health_check,
+    run_monitoring_check,
+    run_section_check,
+    send_monitoring_notifications,
+)
+from .management.commands._synthetic import SECTIONS, synthetic_section_response
+from .management.commands.serve_upstream_stub import SectionStubHandler
+from . import (
+    analytics,
+    fastjson,
+    ingest,
+    partitions,
+    scheduling,
+    throttle,
+    upstream,
+    worker_memory,
+)
+from .report_archive import summarize_issues
+from zendeskapp.celery import app as celery_app
+from celery.exceptions import ChordError
+from celery.signals import worker_process_shutdown
+from djstripe.models import Customer, Event, Invoice, Plan, Product, Subscription
+from django_celery_results.models import TaskResult
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.core.mail import send_mail
+from django.core.management import call_command
+from django.core.cache import cache
 from django.template.loader import render_to_string
+from decimal import Decimal
+from django.core.serializers.json import DjangoJSONEncoder
+from .cache_utils import HealthCheckCache
+from . import cache_views
+from .db_router import allow_replica_reads, is_pinned, read_your_writes, use_primary
+from .utils.formatting import format_response_data
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
 
 
 class MonitoringTestCase(TestCase):
@@ -130,3 +200,1932 @@ class MonitoringTestCase(TestCase):
         # Should only find our original monitoring setting
         self.assertEqual(due_for_check.count(), 1)
         self.assertEqual(due_for_check.first(), self.monitoring)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SubscriptionUnlockTestCase(TestCase):
+    def setUp(self):
+        self.reports = [
+            HealthCheckReport.objects.create(
+                installation_id=12345,
+                instance_guid="test-guid",
+                app_guid="test-app-guid",
+                subdomain="test-subdomain",
+                version="1.0.0",
+                raw_response={"issues": []},
+                is_unlocked=index == 0,
+            )
+            for index in range(5)
+        ]
+        HealthCheckReport.objects.create(
+            installation_id=54321,
+            instance_guid="other-guid",
+            app_guid="test-app-guid",
+            subdomain="other-subdomain",
+            version="1.0.0",
+            raw_response={"issues": []},
+        )
+
+    def test_unlock_only_touches_locked_reports(self):
+        """Test that bulk unlock skips already-unlocked rows and other subdomains"""
+        unlocked = HealthCheckReport.unlock_for_subdomain(
+            "test-subdomain", chunk_size=2
+        )
+
+        self.assertEqual(
+            sorted(report_id for report_id, _ in unlocked),
+            sorted(report.id for report in self.reports[1:]),
+        )
+        self.assertFalse(
+            HealthCheckReport.objects.filter(
+                subdomain="test-subdomain", is_unlocked=False
+            ).exists()
+        )
+        self.assertTrue(
+            HealthCheckReport.objects.filter(
+                subdomain="other-subdomain", is_unlocked=False
+            ).exists()
+        )
+
+    def test_unlock_is_idempotent(self):
+        """Test that a retried delivery unlocks nothing the second time"""
+        HealthCheckReport.unlock_for_subdomain("test-subdomain")
+        self.assertEqual(HealthCheckReport.unlock_for_subdomain("test-subdomain"), [])
+
+    def test_unlock_invalidates_cached_status(self):
+        """Test that cached unlock status is dropped for unlocked reports"""
+        report = self.reports[1]
+        self.assertFalse(HealthCheckCache.get_report_unlock_status(report.id))
+
+        unlocked = HealthCheckReport.unlock_for_subdomain("test-subdomain")
+        HealthCheckCache.invalidate_unlocked_reports(unlocked)
+
+        self.assertIsNone(
+            cache.get(HealthCheckCache.get_cache_key("report_unlock_status", report.id))
+        )
+        self.assertTrue(HealthCheckCache.get_report_unlock_status(report.id))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StripeWebhookProcessingTestCase(TestCase):
+    def setUp(self):
+        ZendeskUser.objects.create(
+            user_id=1,
+            name="Test User",
+            email="test@example.com",
+            role="admin",
+            locale="en-US",
+            subdomain="test-subdomain",
+        )
+        self.report = HealthCheckReport.objects.create(
+            installation_id=12345,
+            instance_guid="test-guid",
+            app_guid="test-app-guid",
+            subdomain="test-subdomain",
+            version="1.0.0",
+            raw_response={"issues": []},
+        )
+
+    def create_event(self, event_id, status, created):
+        return Event.objects.create(
+            id=event_id,
+            type="customer.subscription.updated",
+            livemode=False,
+            created=created,
+            data={
+                "object": {
+                    "id": "sub_123",
+                    "status": status,
+                    "metadata": {
+                        "user_id": "1",
+                        "subdomain": "test-subdomain",
+                        "installation_id": "12345",
+                    },
+                }
+            },
+        )
+
+    def test_duplicate_delivery_is_not_reprocessed(self):
+        """Test that a processed event is neither re-enqueued nor re-run"""
+        event = self.create_event("evt_1", "active", timezone.now())
+        StripeWebhookEvent.record(event)
+        process_stripe_event("evt_1")
+
+        webhook_event, should_enqueue = StripeWebhookEvent.record(event)
+        self.assertEqual(webhook_event.status, "processed")
+        self.assertFalse(should_enqueue)
+
+        process_stripe_event("evt_1")
+        webhook_event.refresh_from_db()
+        self.assertEqual(webhook_event.attempts, 1)
+
+    def test_out_of_order_event_is_skipped(self):
+        """Test that an older event arriving after a newer one is ignored"""
+        now = timezone.now()
+        newer = self.create_event("evt_new", "canceled", now)
+        older = self.create_event("evt_old", "active", now - timedelta(minutes=5))
+
+        StripeWebhookEvent.record(newer)
+        process_stripe_event("evt_new")
+        StripeWebhookEvent.record(older)
+        process_stripe_event("evt_old")
+
+        self.assertEqual(
+            StripeWebhookEvent.objects.get(event_id="evt_old").status, "skipped"
+        )
+        self.report.refresh_from_db()
+        self.assertFalse(self.report.is_unlocked)
+
+    def test_event_older_than_one_in_progress_is_skipped(self):
+        """Test that a newer event still being processed supersedes older ones"""
+        now = timezone.now()
+        newer = self.create_event("evt_new", "canceled", now)
+        older = self.create_event("evt_old", "active", now - timedelta(minutes=5))
+        webhook_event, _ = StripeWebhookEvent.record(newer)
+        StripeWebhookEvent.objects.filter(id=webhook_event.id).update(
+            status="processing", claimed_at=now
+        )
+
+        StripeWebhookEvent.record(older)
+        process_stripe_event("evt_old")
+
+        self.assertEqual(
+            StripeWebhookEvent.objects.get(event_id="evt_old").status, "skipped"
+        )
+
+    def test_stalled_and_failed_events_are_recovered(self):
+        """Test that events Stripe won't redeliver are queued again by beat"""
+        now = timezone.now()
+        stale = now - timedelta(seconds=StripeWebhookEvent.CLAIM_SECONDS + 1)
+        states = {
+            "evt_never_run": {"status": "pending", "received_at": stale},
+            "evt_just_received": {"status": "pending"},
+            "evt_worker_died": {"status": "processing", "claimed_at": stale},
+            "evt_in_progress": {"status": "processing", "claimed_at": now},
+            "evt_failed_due": {"status": "failed", "next_attempt_at": now},
+            "evt_backing_off": {
+                "status": "failed",
+                "next_attempt_at": now + timedelta(hours=1),
+            },
+        }
+        for event_id, fields in states.items():
+            event = self.create_event(event_id, "active", now)
+            webhook_event, _ = StripeWebhookEvent.record(event)
+            StripeWebhookEvent.objects.filter(id=webhook_event.id).update(**fields)
+
+        self.assertEqual(
+            sorted(StripeWebhookEvent.claim_stalled(10, now=now)),
+            ["evt_failed_due", "evt_never_run", "evt_worker_died"],
+        )
+        # Not returned again while they wait for a worker
+        self.assertEqual(StripeWebhookEvent.claim_stalled(10, now=now), [])
+
+    def test_failed_event_backs_off_and_is_retried(self):
+        """Test that an event that ran out of retries is retried by beat later"""
+        event = Event.objects.create(
+            id="evt_unknown",
+            type="customer.subscription.paused",
+            livemode=False,
+            created=timezone.now(),
+            data={"object": {"id": "sub_123", "metadata": {}}},
+        )
+        StripeWebhookEvent.record(event)
+        process_stripe_event.apply(("evt_unknown",), retries=5)
+
+        webhook_event = StripeWebhookEvent.objects.get(event_id="evt_unknown")
+        self.assertEqual(webhook_event.status, "failed")
+        self.assertGreater(
+            webhook_event.next_attempt_at, timezone.now() + timedelta(seconds=50)
+        )
+        self.assertEqual(recover_stripe_events(), 0)
+
+        StripeWebhookEvent.objects.filter(id=webhook_event.id).update(
+            next_attempt_at=timezone.now()
+        )
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", False)
+        self.assertEqual(recover_stripe_events(), 1)
+        # Ran through its retries again, failed, and backs off for longer
+        webhook_event.refresh_from_db()
+        self.assertEqual(webhook_event.attempts, 7)
+        self.assertEqual(webhook_event.status, "failed")
+        self.assertGreater(
+            webhook_event.next_attempt_at, timezone.now() + timedelta(hours=1)
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ANALYTICS_SINK="null")
+class StripeWebhookLockingTestCase(TransactionTestCase):
+    def setUp(self):
+        ZendeskUser.objects.create(
+            user_id=1,
+            name="Test User",
+            email="test@example.com",
+            role="admin",
+            locale="en-US",
+            subdomain="test-subdomain",
+        )
+        self.reports = [
+            HealthCheckReport.objects.create(
+                installation_id=12345,
+                instance_guid="test-guid",
+                app_guid="test-app-guid",
+                subdomain="test-subdomain",
+                version="1.0.0",
+                raw_response={"issues": []},
+            )
+            for _ in range(3)
+        ]
+
+    def hold_lock(self, queryset, seconds):
+        """Lock queryset's rows from another connection for a while"""
+        locked = threading.Event()
+
+        def hold():
+            try:
+                with transaction.atomic():
+                    list(queryset.select_for_update())
+                    locked.set()
+                    time.sleep(seconds)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        self.addCleanup(thread.join)
+        locked.wait(5)
+
+    def test_unlock_waits_for_rows_it_skipped(self):
+        """Test that rows another transaction held are unlocked once it ends"""
+        self.hold_lock(HealthCheckReport.objects.filter(id=self.reports[1].id), 0.5)
+
+        unlocked = HealthCheckReport.unlock_for_subdomain(
+            "test-subdomain", chunk_size=2
+        )
+
+        self.assertEqual(
+            sorted(report_id for report_id, _ in unlocked),
+            sorted(report.id for report in self.reports),
+        )
+        self.assertFalse(HealthCheckReport.objects.filter(is_unlocked=False).exists())
+
+    def test_event_row_is_not_locked_while_processing(self):
+        """Test that the event is claimed, then processed outside a transaction"""
+        from .webhooks import EVENT_PROCESSORS
+
+        seen = {}
+
+        def processor(event):
+            seen["in_transaction"] = connection.in_atomic_block
+            seen["status"] = StripeWebhookEvent.objects.get(event_id=event.id).status
+
+        original = EVENT_PROCESSORS["customer.subscription.updated"]
+        EVENT_PROCESSORS["customer.subscription.updated"] = processor
+        self.addCleanup(
+            EVENT_PROCESSORS.__setitem__, "customer.subscription.updated", original
+        )
+        event = Event.objects.create(
+            id="evt_claim",
+            type="customer.subscription.updated",
+            livemode=False,
+            created=timezone.now(),
+            data={"object": {"id": "sub_123", "status": "active", "metadata": {}}},
+        )
+        StripeWebhookEvent.record(event)
+
+        process_stripe_event("evt_claim")
+
+        self.assertEqual(seen, {"in_transaction": False, "status": "processing"})
+        webhook_event = StripeWebhookEvent.objects.get(event_id="evt_claim")
+        self.assertEqual(webhook_event.status, "processed")
+
+        # A delivery that claimed the event and died is taken over later
+        webhook_event.status = "processing"
+        webhook_event.claimed_at = timezone.now()
+        webhook_event.save()
+        self.assertFalse(StripeWebhookEvent.record(event)[1])
+        webhook_event.claimed_at -= timedelta(
+            seconds=StripeWebhookEvent.CLAIM_SECONDS + 1
+        )
+        webhook_event.save()
+        self.assertTrue(StripeWebhookEvent.record(event)[1])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BillingPageTestCase(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        ZendeskUser.objects.create(
+            user_id=1,
+            name="Test User",
+            email="test@example.com",
+            role="admin",
+            locale="en-US",
+            subdomain="test-subdomain",
+        )
+        product = Product.objects.create(
+            id="prod_1", name="Healthcheck", type="service"
+        )
+        plan = Plan.objects.create(
+            id="plan_1",
+            product=product,
+            active=True,
+            amount=119,
+            currency="usd",
+            interval="month",
+            nickname="Monthly",
+        )
+        customer = Customer.objects.create(
+            id="cus_1", name="Test User", email="test@example.com", currency="usd"
+        )
+        invoice = Invoice.objects.create(
+            id="in_1",
+            customer=customer,
+            amount_due=119,
+            amount_paid=119,
+            amount_remaining=0,
+            currency="usd",
+            number="INV-1",
+            status="paid",
+            attempt_count=1,
+            starting_balance=0,
+            attempted=True,
+            auto_advance=False,
+            billing_reason="subscription_create",
+            collection_method="charge_automatically",
+            period_start=now,
+            period_end=now,
+            subtotal=119,
+            total=119,
+        )
+        Subscription.objects.create(
+            id="sub_1",
+            customer=customer,
+            plan=plan,
+            latest_invoice=invoice,
+            status="active",
+            collection_method="charge_automatically",
+            current_period_start=now,
+            current_period_end=now + timedelta(days=30),
+            start_date=now,
+            metadata={"subdomain": "test-subdomain"},
+        )
+
+    def test_billing_page_query_count_is_bounded(self):
+        """Test that subscription details are loaded with a bounded query count"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/billing/", {"installation_id": "12345", "user_id": "1"}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context["subscription"]["latest_invoice"]["number"], "INV-1"
+        )
+        self.assertEqual(
+            response.context["subscription"]["plan"]["product_name"], "Healthcheck"
+        )
+        # user + subscription status + one joined subscription details query
+        self.assertLessEqual(len(queries), 3)
+
+        # A second load is served entirely from cache
+        with self.assertNumQueries(0):
+            self.client.get("/billing/", {"installation_id": "12345", "user_id": "1"})
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ANALYTICS_SINK="null")
+class AnalyticsDispatchTestCase(TestCase):
+    def test_file_sink_receives_events(self):
+        """Test that buffered events are written to the file sink"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "events.jsonl")
+            # Drain events buffered by earlier tests into the null sink
+            analytics.flush()
+            with self.settings(ANALYTICS_SINK="file", ANALYTICS_FILE_PATH=path):
+                analytics.track("1", "App Loaded", {"subdomain": "test"})
+                analytics.identify("1", {"last_healthcheck": timezone.now()})
+                analytics.flush()
+
+            with open(path) as f:
+                events = [json.loads(line) for line in f]
+
+        self.assertEqual([event["type"] for event in events], ["track", "identify"])
+        self.assertEqual(events[0]["args"], ["1", "App Loaded", {"subdomain": "test"}])
+
+    def test_worker_process_shutdown_flushes_buffer(self):
+        """Test that a recycled worker child delivers what it buffered"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "events.jsonl")
+            analytics.flush()
+            with self.settings(ANALYTICS_SINK="file", ANALYTICS_FILE_PATH=path):
+                analytics.track("1", "App Loaded", {"subdomain": "test"})
+                worker_process_shutdown.send(sender=None, pid=os.getpid(), exitcode=0)
+
+                with open(path) as f:
+                    self.assertEqual(len(f.readlines()), 1)
+
+    def test_full_buffer_drops_and_counts(self):
+        """Test that events are dropped, not blocked on, when the buffer is full"""
+        dispatcher = analytics.AnalyticsDispatcher(max_size=2)
+        # Pretend the delivery thread is running but stalled
+        dispatcher._pid = os.getpid()
+        dispatcher._queue = queue.Queue(maxsize=2)
+
+        for _ in range(5):
+            dispatcher.enqueue("track", "1", "App Loaded", {})
+
+        self.assertEqual(dispatcher.stats["enqueued"], 2)
+        self.assertEqual(dispatcher.stats["dropped"], 3)
+
+    def test_unchanged_traits_are_suppressed(self):
+        """Test that identify is only sent again once traits change"""
+        before = analytics.get_stats()
+
+        analytics.identify_if_changed("1", {"role": "admin", "locale": "en-US"})
+        analytics.identify_if_changed("1", {"locale": "en-US", "role": "admin"})
+        analytics.identify_if_changed("1", {"role": "agent", "locale": "en-US"})
+
+        after = analytics.get_stats()
+        self.assertEqual(after["enqueued"] - before["enqueued"], 2)
+        self.assertEqual(after["suppressed"] - before["suppressed"], 1)
+
+    def test_dropped_identify_is_not_suppressed(self):
+        """Test that traits dropped with a full buffer are sent next time"""
+        stalled = analytics.AnalyticsDispatcher(max_size=1)
+        stalled._pid = os.getpid()
+        stalled._queue = queue.Queue(maxsize=1)
+        stalled._queue.put_nowait(("track", ()))
+        self.addCleanup(setattr, analytics, "dispatcher", analytics.dispatcher)
+        analytics.dispatcher = stalled
+
+        analytics.identify_if_changed("2", {"role": "admin"})
+        stalled._queue.get_nowait()
+        analytics.identify_if_changed("2", {"role": "admin"})
+
+        self.assertEqual(stalled.stats["dropped"], 1)
+        self.assertEqual(stalled.stats["enqueued"], 1)
+        self.assertEqual(stalled.stats["suppressed"], 0)
+
+
+class FormatResponseDataTestCase(TestCase):
+    response_data = {
+        "issues": [
+            {"item_type": "TicketForms", "type": "error", "message": "A"},
+            {"item_type": "TicketFields", "type": "warning", "active": True},
+            {"item_type": "Macros", "type": "error", "zendesk_url": "https://x"},
+            {"item_type": "Macros", "message": "No type"},
+            {"type": "warning"},
+        ]
+    }
+
+    def test_full_access_output(self):
+        """Test counts, categories and rows when the report is unlocked"""
+        data = format_response_data(
+            self.response_data, subscription_active=True, report_id=1
+        )
+
+        self.assertTrue(data["has_status_values"])
+        self.assertEqual(data["total_issues"], 5)
+        self.assertEqual(data["critical_issues"], 2)
+        self.assertEqual(data["warning_issues"], 2)
+        self.assertEqual(
+            data["categories"], ["Macros", "TicketFields", "TicketForms", "Unknown"]
+        )
+        self.assertEqual(data["hidden_issues_count"], 0)
+        self.assertEqual(data["hidden_categories"], {})
+        self.assertEqual(
+            data["issues"][3],
+            {
+                "category": "Macros",
+                "category_label": "Macros",
+                "severity": "warning",
+                "severity_label": "Warning",
+                "active": False,
+                "status": "inactive",
+                "description": "No type",
+                "zendesk_url": "#",
+            },
+        )
+
+    def test_restricted_output(self):
+        """Test that locked reports only show free categories and tally the rest"""
+        data = format_response_data(self.response_data, report_id=1)
+
+        # Status values are detected across all issues, not only visible ones
+        self.assertTrue(data["has_status_values"])
+        self.assertEqual(data["total_issues"], 2)
+        self.assertEqual(data["critical_issues"], 1)
+        self.assertEqual(data["warning_issues"], 1)
+        self.assertEqual(data["categories"], ["TicketFields", "TicketForms"])
+        self.assertEqual(data["hidden_issues_count"], 3)
+        self.assertEqual(data["hidden_categories"], {"Macros": 2, None: 1})
+        self.assertEqual(
+            [issue["category"] for issue in data["issues"]],
+            ["TicketForms", "TicketFields"],
+        )
+
+    def test_results_template_renders_precomputed_labels(self):
+        """Test that report rows show their precomputed labels"""
+        data = format_response_data(
+            self.response_data, subscription_active=True, report_id=1
+        )
+        html = render_to_string(
+            "healthcheck/results.html", {"data": data, "report_id": 1}
+        )
+
+        self.assertIn("Ticket Forms", html)
+        self.assertIn("Warning", html)
+        self.assertIn('data-status="inactive"', html)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReportResultsCacheTestCase(TestCase):
+    def setUp(self):
+        self.report = HealthCheckReport.objects.create(
+            installation_id=12345,
+            instance_guid="test-guid",
+            app_guid="test-app-guid",
+            subdomain="test-subdomain",
+            version="1.0.0",
+            raw_response={"issues": [{"item_type": "Macros", "type": "error"}]},
+            created_at=timezone.now() - timedelta(days=2),
+        )
+
+    def test_cached_html_gets_current_time_since(self):
+        """Test that cached report HTML is stored without the time since the report"""
+        results_html = HealthCheckCache.get_report_results(self.report.id)
+        self.assertIn("Time since report: 2\xa0days ago", results_html)
+
+        cached = cache.get(
+            HealthCheckCache.get_cache_key(
+                "report_results", f"{self.report.id}:limited"
+            )
+        )
+        self.assertNotIn("2\xa0days", cached["html"])
+        self.assertEqual(
+            HealthCheckCache.get_report_results(self.report.id), results_html
+        )
+
+    def test_unlocking_switches_access_level(self):
+        """Test that an unlocked report is served from the full-access entry"""
+        self.assertIn(
+            "Unlock This Report", HealthCheckCache.get_report_results(self.report.id)
+        )
+
+        self.report.is_unlocked = True
+        self.report.save()
+
+        self.assertNotIn(
+            "Unlock This Report", HealthCheckCache.get_report_results(self.report.id)
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FastJsonTestCase(TestCase):
+    def test_response_matches_stdlib_encoding(self):
+        """Test that FastJsonResponse output parses like JsonResponse output"""
+        data = {
+            "results_html": "<div>\u00e9</div>" * 100,
+            "hidden_categories": {"Macros": 2, None: 1},
+            "amount": Decimal("9.99"),
+            "created_at": timezone.now(),
+        }
+        response = fastjson.FastJsonResponse(data, status=201)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(
+            json.loads(response.content),
+            json.loads(json.dumps(data, cls=DjangoJSONEncoder)),
+        )
+
+    def test_non_dict_requires_safe_false(self):
+        """Test that non-dict payloads are rejected unless safe=False"""
+        with self.assertRaises(TypeError):
+            fastjson.FastJsonResponse([1, 2])
+        self.assertEqual(
+            fastjson.FastJsonResponse([1, 2], safe=False).content, b"[1,2]"
+        )
+
+    def test_decode_error_is_stdlib_compatible(self):
+        """Test that existing json.JSONDecodeError handlers still catch errors"""
+        with self.assertRaises(json.JSONDecodeError):
+            fastjson.loads(b"{not json")
+
+    def test_raw_response_round_trip(self):
+        """Test that raw_response survives the orjson JSONField encoder/decoder"""
+        raw_response = {"issues": [{"item_type": "Macros", "message": "\u2713 ok"}]}
+        report = HealthCheckReport.objects.create(
+            installation_id=1,
+            instance_guid="guid",
+            app_guid="app-guid",
+            subdomain="test",
+            version="1.0.0",
+            raw_response=raw_response,
+        )
+
+        report.refresh_from_db()
+        self.assertEqual(report.raw_response, raw_response)
+        self.assertEqual(
+            HealthCheckReport.objects.filter(
+                raw_response__issues__0__item_type="Macros"
+            ).count(),
+            1,
+        )
+
+
+# Async views read through executor threads with their own DB connections,
+# so test data has to be committed to be visible to them
+@override_settings(CACHES=LOCMEM_CACHES, ANALYTICS_SINK="null")
+class AsyncViewsTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        ZendeskUser.objects.create(
+            user_id=1,
+            name="Test User",
+            email="test@example.com",
+            role="admin",
+            locale="en-US",
+            subdomain="test-subdomain",
+        )
+        self.report = HealthCheckReport.objects.create(
+            installation_id=12345,
+            instance_guid="test-guid",
+            app_guid="test-app-guid",
+            subdomain="test-subdomain",
+            version="1.0.0",
+            raw_response={"issues": [{"item_type": "TicketForms", "type": "error"}]},
+        )
+
+    async def test_app_loads_report(self):
+        """Test that the app view gathers its data and renders the report"""
+        response = await self.async_client.get(
+            "/", {"installation_id": "12345", "user_id": "1"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Error loading health check data")
+        self.assertContains(response, "Ticket Forms")
+
+    async def test_check_task_status_returns_finished_report(self):
+        """Test that a finished health check task returns its rendered report"""
+        await HealthCheckReport.objects.filter(id=self.report.id).aupdate(
+            is_unlocked=True
+        )
+        await TaskResult.objects.acreate(
+            task_id="finished-task",
+            status="SUCCESS",
+            content_type="application/json",
+            content_encoding="utf-8",
+            result=json.dumps({"status": "ok", "report_id": self.report.id}),
+        )
+
+        response = await self.async_client.get("/health_check/status/finished-task/")
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(set(data), {"status", "results_html"})
+        self.assertEqual(data["status"], "complete")
+        self.assertIn("Ticket Forms", data["results_html"])
+        # The report's own download link, not an error page
+        self.assertIn(
+            reverse("download_report_csv", kwargs={"report_id": self.report.id}),
+            data["results_html"],
+        )
+
+    async def test_check_task_status_explains_error_codes(self):
+        """Test that compact and older error results both show a message"""
+        results = {
+            "compact-error": {"status": "timeout"},
+            "legacy-error": {"error": True, "message": "Authentication failed."},
+        }
+        for task_id, result in results.items():
+            await TaskResult.objects.acreate(
+                task_id=task_id,
+                status="SUCCESS",
+                content_type="application/json",
+                content_encoding="utf-8",
+                result=json.dumps(result),
+            )
+
+        compact = await self.async_client.get("/health_check/status/compact-error/")
+        legacy = await self.async_client.get("/health_check/status/legacy-error/")
+
+        self.assertEqual(
+            json.loads(compact.content)["error"], RESULT_MESSAGES["timeout"]
+        )
+        self.assertEqual(json.loads(legacy.content)["error"], "Authentication failed.")
+
+    async def test_check_unlock_status(self):
+        """Test that unlock status is served from the async view"""
+        response = await self.async_client.get(
+            "/check-unlock-status/", {"report_id": self.report.id}
+        )
+
+        self.assertEqual(
+            json.loads(response.content),
+            {"is_unlocked": False, "report_id": str(self.report.id)},
+        )
+
+    async def test_zaf_data_round_trip(self):
+        """Test that ZAF data cached by one async view is returned by the other"""
+        response = await self.async_client.post(
+            "/api/cache/zaf-data/",
+            {"user_id": 1, "metadata": {"app": "healthcheck"}},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+        request = AsyncRequestFactory().get("/api/cache/zaf-data/", {"user_id": 1})
+        response = await cache_views.get_cached_zaf_data(request)
+        self.assertEqual(
+            json.loads(response.content)["metadata"], {"app": "healthcheck"}
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, REPLICA_DATABASE="replica")
+class ReplicaRoutingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def create_report(self):
+        return HealthCheckReport.objects.create(
+            installation_id=12345,
+            instance_guid="test-guid",
+            app_guid="test-app-guid",
+            subdomain="test-subdomain",
+            version="1.0.0",
+            raw_response={"issues": []},
+        )
+
+    def test_request_reads_use_replica(self):
+        """Test that report and billing reads in a request go to the replica"""
+        with allow_replica_reads():
+            self.assertEqual(HealthCheckReport.objects.all().db, "replica")
+            self.assertEqual(Subscription.objects.all().db, "replica")
+            self.assertEqual(ZendeskUser.objects.all().db, "default")
+            self.assertEqual(
+                HealthCheckReport.objects.select_for_update().db, "default"
+            )
+
+        # Tasks and commands always read from the primary
+        self.assertEqual(HealthCheckReport.objects.all().db, "default")
+
+    def test_write_pins_rest_of_request(self):
+        """Test that a request reads its own writes from the primary"""
+        with allow_replica_reads():
+            ZendeskUser.objects.create(
+                user_id=1,
+                name="Test User",
+                email="test@example.com",
+                role="admin",
+                locale="en-US",
+                subdomain="test-subdomain",
+            )
+            self.assertEqual(HealthCheckReport.objects.all().db, "default")
+
+    def test_report_save_pins_installation_and_subdomain(self):
+        """Test that reads stick to the primary after a report is created"""
+        self.create_report()
+
+        self.assertTrue(is_pinned(installation_id=12345))
+        self.assertFalse(is_pinned(installation_id=1))
+        with allow_replica_reads():
+            with read_your_writes(subdomain="test-subdomain"):
+                self.assertEqual(HealthCheckReport.objects.all().db, "default")
+            with read_your_writes(subdomain="other-subdomain"):
+                self.assertEqual(HealthCheckReport.objects.all().db, "replica")
+
+        # What the middleware does for a request with this installation_id
+        with allow_replica_reads(pinned=is_pinned(installation_id=12345)):
+            self.assertEqual(HealthCheckReport.objects.all().db, "default")
+
+    def test_use_primary_blocks_nest(self):
+        """Test that leaving use_primary() restores replica reads"""
+        with allow_replica_reads():
+            with use_primary():
+                with use_primary():
+                    self.assertEqual(HealthCheckReport.objects.all().db, "default")
+                self.assertEqual(HealthCheckReport.objects.all().db, "default")
+            self.assertEqual(HealthCheckReport.objects.all().db, "replica")
+
+    @override_settings(REPLICA_DATABASE=None)
+    def test_no_replica_configured(self):
+        """Test that everything uses the primary without a replica"""
+        self.create_report()
+
+        self.assertFalse(is_pinned(installation_id=12345))
+        with allow_replica_reads():
+            self.assertEqual(HealthCheckReport.objects.all().db, "default")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReportPartitioningTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def create_report(self, created_at):
+        return HealthCheckReport.objects.create(
+            installation_id=12345,
+            instance_guid="test-guid",
+            app_guid="test-app-guid",
+            subdomain="test-subdomain",
+            version="1.0.0",
+            raw_response={"issues": []},
+            created_at=created_at,
+        )
+
+    def get_partition(self, report):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT tableoid::regclass::text FROM {partitions.REPORT_TABLE} "
+                f"WHERE id = %s",
+                [report.id],
+            )
+            return cursor.fetchone()[0]
+
+    def manage_partitions(self, *args):
+        call_command("manage_report_partitions", *args, stdout=io.StringIO())
+
+    def get_scanned_partitions(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return {name for name, _ in partitions.scanned_relations(plan[0]["Plan"])}
+
+    def test_reports_are_stored_in_monthly_partitions(self):
+        """Test that reports land in their month's partition once it exists"""
+        current = partitions.current_month()
+        old_month = current - relativedelta(months=14)
+        recent = self.create_report(timezone.now())
+        old = self.create_report(timezone.now() - relativedelta(months=14))
+
+        self.assertEqual(self.get_partition(recent), partitions.partition_name(current))
+        self.assertEqual(self.get_partition(old), partitions.DEFAULT_PARTITION)
+
+        self.manage_partitions("--retention-months", "0")
+
+        self.assertEqual(self.get_partition(old), partitions.partition_name(old_month))
+        self.assertIn(old_month, partitions.list_partitions())
+        self.assertIn(current + relativedelta(months=3), partitions.list_partitions())
+
+    def test_retention_detaches_old_partitions(self):
+        """Test that partitions past the retention period are archived"""
+        old_month = partitions.current_month() - relativedelta(months=14)
+        old = self.create_report(timezone.now() - relativedelta(months=14))
+        self.manage_partitions("--retention-months", "0")
+
+        self.manage_partitions("--retention-months", "12", "--dry-run")
+        self.assertIn(old_month, partitions.list_partitions())
+
+        report_keys = HealthCheckCache.get_report_access_keys(old.id)
+        cache.set_many({key: "<cached html>" for key in report_keys})
+
+        self.manage_partitions("--retention-months", "12")
+        self.assertNotIn(old_month, partitions.list_partitions())
+        self.assertFalse(HealthCheckReport.objects.exists())
+        self.assertEqual(cache.get_many(report_keys), {})
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM {partitions.ARCHIVE_SCHEMA}."
+                f"{partitions.partition_name(old_month)}"
+            )
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_report_lookups_prune_old_partitions(self):
+        """Test that latest/history lookups only scan recent partitions"""
+        old_month = partitions.current_month() - relativedelta(months=14)
+        old = self.create_report(timezone.now() - relativedelta(months=14))
+        self.manage_partitions("--retention-months", "0")
+
+        # Only an old report: the recent lookup misses and falls back
+        self.assertEqual(HealthCheckReport.get_latest_for_installation(12345), old)
+
+        recent = self.create_report(timezone.now())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                HealthCheckReport.get_latest_for_installation(12345), recent
+            )
+        with CaptureQueriesContext(connection) as history_queries:
+            self.assertEqual(
+                HealthCheckReport.get_history_for_installation(12345, limit=1),
+                [recent],
+            )
+
+        for query in queries.captured_queries + history_queries.captured_queries:
+            scanned = self.get_scanned_partitions(query["sql"])
+            self.assertIn(
+                partitions.partition_name(partitions.current_month()), scanned
+            )
+            self.assertNotIn(partitions.partition_name(old_month), scanned)
+
+    def test_short_history_widens_the_window_a_step_at_a_time(self):
+        """Test that a short recent history looks back a year before all time"""
+        old_month = partitions.current_month() - relativedelta(months=14)
+        self.create_report(timezone.now() - relativedelta(months=14))
+        half_year_old = self.create_report(timezone.now() - relativedelta(months=6))
+        recent = self.create_report(timezone.now())
+        self.manage_partitions("--retention-months", "0")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                HealthCheckReport.get_history_for_installation(12345, limit=2),
+                [recent, half_year_old],
+            )
+
+        self.assertEqual(len(queries.captured_queries), 2)
+        for query in queries.captured_queries:
+            self.assertNotIn(
+                partitions.partition_name(old_month),
+                self.get_scanned_partitions(query["sql"]),
+            )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReportArchiveTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        storages = {
+            "report_archive": {
+                "BACKEND": "django.core.files.storage.FileSystemStorage",
+                "OPTIONS": {"location": archive_dir.name},
+            }
+        }
+        storage_override = override_settings(STORAGES=storages)
+        storage_override.enable()
+        self.addCleanup(storage_override.disable)
+
+    def create_report(self, months_ago=0):
+        return HealthCheckReport.objects.create(
+            installation_id=12345,
+            instance_guid="test-guid",
+            app_guid="test-app-guid",
+            subdomain="test-subdomain",
+            version="1.0.0",
+            raw_response={
+                "issues": [
+                    {"type": "error", "item_type": "TicketFields"},
+                    {"type": "warning", "item_type": "TicketFields"},
+                    {"type": "warning", "item_type": "Macros"},
+                ]
+            },
+            created_at=timezone.now() - relativedelta(months=months_ago),
+        )
+
+    def get_stored_payload(self, report):
+        return (
+            HealthCheckReport.objects.filter(id=report.id)
+            .values_list("raw_response", flat=True)
+            .get()
+        )
+
+    def test_archive_keeps_summary_and_rehydrates(self):
+        """Test that an archived report keeps its counts and payload"""
+        report = self.create_report()
+        summary = report.archive(stored_bytes=100)
+
+        self.assertIsNone(self.get_stored_payload(report))
+        self.assertEqual(summary.total_issues, 3)
+        self.assertEqual(summary.issues_by_severity, {"error": 1, "warning": 2})
+        self.assertEqual(summary.issues_by_category, {"TicketFields": 2, "Macros": 1})
+        self.assertGreater(summary.archived_bytes, 0)
+
+        archived = HealthCheckReport.objects.get(id=report.id)
+        self.assertTrue(archived.is_archived)
+        self.assertEqual(len(archived.raw_response["issues"]), 3)
+
+        # Saving a rehydrated report doesn't put the payload back
+        archived.version = "1.0.1"
+        archived.save()
+        self.assertIsNone(self.get_stored_payload(report))
+        self.assertEqual(
+            HealthCheckReportSummary.get_trend_for_installation(12345)[0]["report_id"],
+            report.id,
+        )
+
+    def test_archive_invalidates_cached_report(self):
+        """Test that archiving a report drops its cached HTML"""
+        report = self.create_report()
+        report_keys = HealthCheckCache.get_report_access_keys(report.id)
+        cache.set_many({key: "<cached html>" for key in report_keys})
+
+        report.archive(stored_bytes=100)
+
+        self.assertEqual(cache.get_many(report_keys), {})
+
+    def test_archive_reports_command(self):
+        """Test that only reports past the archive age are archived"""
+        old = self.create_report(months_ago=13)
+        recent = self.create_report()
+
+        out = io.StringIO()
+        call_command("archive_reports", "--dry-run", stdout=out)
+        self.assertIn("Would archive 1 reports", out.getvalue())
+        self.assertIsNotNone(self.get_stored_payload(old))
+
+        out = io.StringIO()
+        call_command("archive_reports", "--older-than-months", "12", stdout=out)
+        self.assertIn("Archived 1 reports", out.getvalue())
+        self.assertIsNone(self.get_stored_payload(old))
+        self.assertIsNotNone(self.get_stored_payload(recent))
+        self.assertGreater(
+            HealthCheckReportSummary.objects.get(report_id=old.id).stored_bytes, 0
+        )
+
+
+class MonitoringLeaseTestCase(TransactionTestCase):
+    def create_monitoring(self, installation_id, **kwargs):
+        return HealthCheckMonitoring.objects.create(
+            installation_id=installation_id,
+            instance_guid="test-guid",
+            subdomain=f"test-subdomain-{installation_id}",
+            frequency="daily",
+            next_check=timezone.now() - timedelta(minutes=5),
+            **kwargs,
+        )
+
+    def test_concurrent_schedulers_claim_disjoint_checks(self):
+        """Test that two schedulers claiming at once never share a check"""
+        for installation_id in range(10):
+            self.create_monitoring(installation_id)
+        self.create_monitoring(100, is_active=False)
+
+        barrier = threading.Barrier(2)
+        claims = {}
+
+        def claim(owner):
+            barrier.wait()
+            claims[owner] = {
+                monitoring.id
+                for monitoring in HealthCheckMonitoring.claim_due(owner, batch_size=6)
+            }
+            connection.close()
+
+        threads = [threading.Thread(target=claim, args=(owner,)) for owner in "ab"]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertFalse(claims["a"] & claims["b"])
+        self.assertEqual(len(claims["a"] | claims["b"]), 10)
+        self.assertEqual(HealthCheckMonitoring.claim_due("c"), [])
+
+    def test_expired_lease_is_reclaimed(self):
+        """Test that a check whose scheduler died becomes claimable again"""
+        monitoring = self.create_monitoring(1)
+        HealthCheckMonitoring.claim_due("dead-scheduler")
+        HealthCheckMonitoring.objects.filter(id=monitoring.id).update(
+            lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        claimed = HealthCheckMonitoring.claim_due("new-scheduler")
+        self.assertEqual([m.id for m in claimed], [monitoring.id])
+
+        # The old owner can no longer complete it
+        monitoring.refresh_from_db()
+        self.assertFalse(monitoring.complete_check("dead-scheduler"))
+        self.assertTrue(monitoring.complete_check("new-scheduler"))
+
+    def test_run_monitoring_check_releases_lease(self):
+        """Test that a leased check reschedules itself and only runs for its owner"""
+        monitoring = self.create_monitoring(1)
+        HealthCheckMonitoring.claim_due("scheduler")
+
+        run_monitoring_check(monitoring.id, "other-scheduler")
+        monitoring.refresh_from_db()
+        self.assertEqual(monitoring.lease_owner, "scheduler")
+        self.assertIsNone(monitoring.last_check)
+
+        # No previous report to take credentials from, so nothing is called
+        run_monitoring_check(monitoring.id, "scheduler")
+        monitoring.refresh_from_db()
+        self.assertIsNone(monitoring.lease_owner)
+        self.assertIsNotNone(monitoring.last_check)
+        self.assertGreater(monitoring.next_check, timezone.now())
+        self.assertEqual(HealthCheckMonitoring.claim_due("scheduler"), [])
+
+    @override_settings(CACHES=LOCMEM_CACHES, UPSTREAM_MAX_REQUESTS_PER_MINUTE=0)
+    def test_run_monitoring_check_defers_when_upstream_is_busy(self):
+        """Test that a 503 with Retry-After defers the check until it ends"""
+        cache.clear()
+        server, api_url = start_upstream_stub(self)
+        server.responses.append((503, {"Retry-After": "600"}))
+        monitoring = self.create_monitoring(1)
+        HealthCheckReport.objects.create(
+            installation_id=1,
+            instance_guid="test-guid",
+            app_guid="test-app-guid",
+            subdomain=monitoring.subdomain,
+            admin_email="admin@example.com",
+            api_token="token",
+            version="1.0.0",
+            raw_response={"issues": []},
+        )
+        HealthCheckMonitoring.claim_due("scheduler")
+
+        with override_settings(UPSTREAM_API_URL=api_url):
+            run_monitoring_check(monitoring.id, "scheduler")
+
+        self.assertEqual(server.requests, 1)
+        monitoring.refresh_from_db()
+        self.assertIsNone(monitoring.lease_owner)
+        self.assertIsNone(monitoring.last_check)
+        self.assertGreater(
+            monitoring.next_check, timezone.now() + timedelta(seconds=590)
+        )
+        self.assertLess(monitoring.next_check, timezone.now() + timedelta(minutes=12))
+
+
+@override_settings(
+    MONITORING_WINDOW_START_HOUR=0,
+    MONITORING_WINDOW_END_HOUR=24,
+    MONITORING_MAX_CHECKS_PER_MINUTE=2,
+)
+class MonitoringScheduleTestCase(TestCase):
+    def create_monitoring(self, installation_id, **kwargs):
+        return HealthCheckMonitoring.objects.create(
+            installation_id=installation_id,
+            instance_guid="test-guid",
+            subdomain=f"test-subdomain-{installation_id}",
+            frequency="daily",
+            **kwargs,
+        )
+
+    def test_checks_keep_a_stable_slot(self):
+        """Test that an installation runs at the same time every period"""
+        last_check = timezone.now()
+        first = scheduling.next_check_time(1, "daily", last_check)
+        second = scheduling.next_check_time(1, "daily", first)
+        weekly = scheduling.next_check_time(1, "weekly", first)
+
+        self.assertEqual(second - first, timedelta(days=1))
+        self.assertEqual(weekly - first, timedelta(weeks=1))
+        self.assertLessEqual(
+            abs(first - (last_check + timedelta(days=1))), timedelta(hours=12)
+        )
+
+    def test_burst_installations_spread_out(self):
+        """Test that installations checked together get different slots"""
+        last_check = timezone.now()
+        slots = {
+            scheduling.next_check_time(installation_id, "daily", last_check).replace(
+                second=0, microsecond=0
+            )
+            for installation_id in range(100)
+        }
+        self.assertGreater(len(slots), 90)
+
+    def test_preferred_window_in_customer_time_zone(self):
+        """Test that checks land in the preferred local hours"""
+        from zoneinfo import ZoneInfo
+
+        last_check = timezone.now()
+        for installation_id in range(50):
+            next_check = scheduling.next_check_time(
+                installation_id, "weekly", last_check, "Australia/Sydney", "morning"
+            )
+            local = next_check.astimezone(ZoneInfo("Australia/Sydney"))
+            self.assertTrue(6 <= local.hour < 12)
+            self.assertGreater(next_check, last_check + timedelta(days=6))
+
+    def test_checks_per_minute_are_capped(self):
+        """Test that a full minute pushes the next check to a later one"""
+        last_check = timezone.now() - timedelta(days=1)
+        slot = scheduling.next_check_time(3, "daily", last_check)
+        minute = slot.replace(second=0, microsecond=0)
+        for installation_id in (1, 2):
+            self.create_monitoring(installation_id, next_check=minute)
+
+        monitoring = self.create_monitoring(3, last_check=last_check)
+        self.assertEqual(monitoring.next_check, slot + timedelta(minutes=1))
+
+    def test_full_minutes_are_counted_in_one_query(self):
+        """Test that skipping several full minutes still counts them once"""
+        last_check = timezone.now() - timedelta(days=1)
+        slot = scheduling.next_check_time(13, "daily", last_check)
+        minute = slot.replace(second=0, microsecond=0)
+        for installation_id in range(1, 11):
+            offset = timedelta(minutes=(installation_id - 1) // 2)
+            self.create_monitoring(installation_id, next_check=minute + offset)
+
+        monitoring = HealthCheckMonitoring(
+            installation_id=13, frequency="daily", last_check=last_check
+        )
+        with CaptureQueriesContext(connection) as queries:
+            monitoring.schedule_next_check()
+
+        self.assertEqual(monitoring.next_check, slot + timedelta(minutes=5))
+        self.assertEqual(len(queries), 1)
+
+    def test_simulation_command(self):
+        """Test that the load simulation runs both policies"""
+        out = io.StringIO()
+        call_command(
+            "simulate_monitoring_load",
+            "--installations",
+            "50",
+            "--days",
+            "3",
+            stdout=out,
+        )
+        self.assertIn("exact interval", out.getvalue())
+        self.assertIn("spread", out.getvalue())
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail; recipients containing "bounce" are refused"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 smtp-stub")
+        while line := self.rfile.readline():
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 smtp-stub")
+            elif verb == "RCPT" and "bounce" in command:
+                self.reply("550 No such user")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b""
+                while (line := self.rfile.readline()) != b".\r\n":
+                    data += line
+                self.server.messages.append(data)
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class MonitoringNotificationTestCase(TestCase):
+    def queue_notification(self, recipient="test@example.com"):
+        return MonitoringNotification.objects.create(
+            installation_id=12345,
+            report_id=1,
+            recipients=[recipient],
+            subject="Zendesk Healthcheck Report: test-subdomain",
+            html_message="<p>3 issues</p>",
+        )
+
+    def start_smtp_stub(self):
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPStubHandler)
+        server.connections = 0
+        server.messages = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_notifications_sent_with_locmem_backend(self):
+        """Test that pending notifications are sent and marked sent"""
+        for _ in range(3):
+            self.queue_notification()
+
+        self.assertEqual(send_monitoring_notifications(), 3)
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].alternatives[0][0], "<p>3 issues</p>")
+        self.assertFalse(MonitoringNotification.objects.exclude(status="sent").exists())
+        # Nothing left to send
+        self.assertEqual(send_monitoring_notifications(), 0)
+
+    def test_batch_reuses_one_smtp_connection(self):
+        """Test that a batch goes over a single SMTP connection"""
+        server = self.start_smtp_stub()
+        for _ in range(5):
+            self.queue_notification()
+
+        with override_settings(
+            MONITORING_EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            MONITORING_EMAIL_BATCH_SIZE=2,
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=server.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+        ):
+            self.assertEqual(send_monitoring_notifications(), 5)
+
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(len(server.messages), 5)
+
+    def create_monitoring(self, mode):
+        return HealthCheckMonitoring.objects.create(
+            installation_id=12345,
+            instance_guid="test-guid",
+            subdomain="test-subdomain",
+            frequency="daily",
+            notification_emails=["test@example.com"],
+            notification_mode=mode,
+        )
+
+    def test_change_only_mode_skips_unchanged_counts(self):
+        """Test that change-only monitoring emails only when the counts differ"""
+        monitoring = self.create_monitoring("changes")
+        now = timezone.now()
+        counts = summarize_issues(
+            {"issues": [{"type": "error", "item_type": "Macros"}]}
+        )
+        # The first check always emails
+        self.assertTrue(monitoring.notification_due(counts, now))
+
+        monitoring.notified_counts = counts
+        monitoring.last_notified_at = now
+        self.assertFalse(monitoring.notification_due(dict(counts), now))
+
+        # Same total, but the issue moved to another category
+        moved = summarize_issues({"issues": [{"type": "error", "item_type": "Views"}]})
+        self.assertTrue(monitoring.notification_due(moved, now))
+
+    def test_digest_mode_emails_weekly(self):
+        """Test that digest monitoring emails once a week and always mode every check"""
+        monitoring = self.create_monitoring("digest")
+        now = timezone.now()
+        counts = summarize_issues({"issues": []})
+        monitoring.notified_counts = summarize_issues({"issues": [{"type": "error"}]})
+
+        monitoring.last_notified_at = now - timedelta(days=3)
+        self.assertFalse(monitoring.notification_due(counts, now))
+        # A daily check running slightly earlier than last week's still sends
+        monitoring.last_notified_at = now - timedelta(days=7) + timedelta(minutes=5)
+        self.assertTrue(monitoring.notification_due(counts, now))
+
+        monitoring.notification_mode = "always"
+        monitoring.last_notified_at = now - timedelta(hours=1)
+        monitoring.notified_counts = counts
+        self.assertTrue(monitoring.notification_due(counts, now))
+
+    def test_nothing_due_opens_no_connection(self):
+        """Test that a run with nothing due doesn't connect to the mail server"""
+        server = self.start_smtp_stub()
+        notification = self.queue_notification()
+        notification.next_attempt_at = timezone.now() + timedelta(minutes=5)
+        notification.save()
+
+        with override_settings(
+            MONITORING_EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=server.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+        ):
+            self.assertEqual(send_monitoring_notifications(), 0)
+
+        self.assertEqual(server.connections, 0)
+
+    @override_settings(
+        MONITORING_EMAIL_MAX_ATTEMPTS=3,
+        MONITORING_EMAIL_RETRY_SECONDS=60,
+        MONITORING_EMAIL_MAX_RETRY_SECONDS=3600,
+    )
+    def test_failed_notification_backs_off_then_is_given_up(self):
+        """Test that a refused email backs off until its attempts run out"""
+        server = self.start_smtp_stub()
+        bounced = self.queue_notification("bounce@example.com")
+        delivered = self.queue_notification()
+
+        with override_settings(
+            MONITORING_EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=server.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+        ):
+            for attempts, delay in ((1, 60), (2, 120)):
+                started = timezone.now()
+                send_monitoring_notifications()
+                bounced.refresh_from_db()
+                self.assertEqual(bounced.status, "pending")
+                self.assertEqual(bounced.attempts, attempts)
+                self.assertIn("No such user", bounced.last_error)
+                self.assertAlmostEqual(
+                    (bounced.next_attempt_at - started).total_seconds(), delay, delta=5
+                )
+                # Not due again until the backoff has passed
+                send_monitoring_notifications()
+                bounced.refresh_from_db()
+                self.assertEqual(bounced.attempts, attempts)
+
+                bounced.next_attempt_at = timezone.now()
+                bounced.save()
+
+            send_monitoring_notifications()
+            bounced.refresh_from_db()
+            self.assertEqual(bounced.status, "failed")
+            self.assertEqual(bounced.attempts, 3)
+
+        delivered.refresh_from_db()
+        self.assertEqual(delivered.status, "sent")
+
+
+@override_settings(
+    HEALTH_CHECK_DEFAULT_TIMEOUT=300,
+    HEALTH_CHECK_MIN_TIMEOUT=60,
+    HEALTH_CHECK_MAX_TIMEOUT=780,
+    HEALTH_CHECK_TIMEOUT_FACTOR=2.0,
+    HEALTH_CHECK_TIME_LIMIT_GRACE=30,
+    HEALTH_CHECK_LARGE_SECONDS=60,
+)
+class CheckBudgetTestCase(TestCase):
+    def test_budget_follows_recent_durations(self):
+        """Test that timeouts and the queue are sized from past check durations"""
+        self.assertEqual(InstallationCheckStats.get_budget(1), (300, False))
+
+        InstallationCheckStats.record(1, 10)
+        InstallationCheckStats.record(1, 12)
+        timeout, options = health_check_options(1)
+        self.assertEqual(timeout, 60)
+        self.assertEqual(options, {"soft_time_limit": 90, "time_limit": 120})
+
+        InstallationCheckStats.record(1, 200)
+        timeout, options = health_check_options(1)
+        self.assertEqual(timeout, 400)
+        self.assertEqual(options["time_limit"], 460)
+        self.assertEqual(options["queue"], "large_checks")
+
+        InstallationCheckStats.record(1, 5000)
+        self.assertEqual(InstallationCheckStats.get_budget(1), (780, True))
+
+    def test_timeouts_extend_the_next_budget(self):
+        """Test that a timed out check doubles the next budget and keeps a short history"""
+        InstallationCheckStats.record(1, 300, timed_out=True)
+        InstallationCheckStats.record(1, 600, timed_out=True)
+        stats = InstallationCheckStats.objects.get(installation_id=1)
+        self.assertEqual(stats.consecutive_timeouts, 2)
+        self.assertEqual(InstallationCheckStats.get_budget(1), (780, True))
+
+        for _ in range(InstallationCheckStats.KEEP_DURATIONS):
+            InstallationCheckStats.record(1, 20)
+        stats.refresh_from_db()
+        self.assertEqual(stats.consecutive_timeouts, 0)
+        self.assertEqual(
+            stats.durations, [20.0] * InstallationCheckStats.KEEP_DURATIONS
+        )
+        self.assertEqual(InstallationCheckStats.get_budget(1), (60, False))
+
+    @override_settings(
+        CACHES=LOCMEM_CACHES,
+        ANALYTICS_SINK="null",
+        UPSTREAM_MAX_REQUESTS_PER_MINUTE=0,
+        HEALTH_CHECK_POLL_GRACE=120,
+    )
+    def test_app_polls_for_the_checks_time_limit(self):
+        """Test that a large instance's check is polled for as long as it may run"""
+        cache.clear()
+        server, api_url = start_upstream_stub(self)
+        server.responses.append((200, {"Content-Type": "application/json"}))
+        InstallationCheckStats.record(1, 5000)
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", False)
+
+        with override_settings(UPSTREAM_API_URL=api_url):
+            response = self.client.post(
+                "/health_check/",
+                data=json.dumps(
+                    {
+                        "installation_id": 1,
+                        "user_id": "1",
+                        "subdomain": "test-subdomain",
+                        "email": "admin@example.com",
+                        "api_token": "token",
+                        "instance_guid": "guid",
+                        "app_guid": "app",
+                    }
+                ),
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.json()["status"], "pending")
+        # 780s read timeout, 60s of grace to the time limit, 120s to start
+        self.assertEqual(response.json()["poll_seconds"], 960)
+
+
+class UpstreamStubHandler(BaseHTTPRequestHandler):
+    """
+    Answers POSTs with the server's queued (status, headers) responses and
+    its body
+    """
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests += 1
+        status, headers = self.server.responses.pop(0)
+        body = self.server.body
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.server.body_delay:
+            # A slow upstream: half the body, then a stall
+            self.wfile.write(body[: len(body) // 2])
+            self.wfile.flush()
+            time.sleep(self.server.body_delay)
+            body = body[len(body) // 2 :]
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_upstream_stub(test):
+    """Serve UpstreamStubHandler for the duration of a test"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), UpstreamStubHandler)
+    server.requests = 0
+    server.responses = []
+    server.body = b'{"issues": []}'
+    server.body_delay = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    UPSTREAM_BREAKER_THRESHOLD=3,
+    UPSTREAM_BREAKER_WINDOW=60,
+    UPSTREAM_BREAKER_COOLDOWN=120,
+    UPSTREAM_DEFAULT_BACKOFF=60,
+    UPSTREAM_MAX_BACKOFF=900,
+    UPSTREAM_MAX_REQUESTS_PER_MINUTE=0,
+)
+class UpstreamBreakerTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.server, self.api_url = start_upstream_stub(self)
+
+    def post(self, status=200, headers=None):
+        self.server.responses.append((status, headers or {}))
+        return upstream.post_health_check({}, 5, api_url=self.api_url)
+
+    def test_breaker_opens_then_probes_and_closes(self):
+        """Test that repeated 502s open the breaker and one probe closes it again"""
+        for _ in range(3):
+            self.assertEqual(self.post(502).status_code, 502)
+        self.assertEqual(upstream.get_state()["state"], "open")
+
+        with self.assertRaises(upstream.UpstreamUnavailable) as raised:
+            upstream.post_health_check({}, 5, api_url=self.api_url)
+        self.assertGreater(raised.exception.retry_after, 100)
+        self.assertEqual(self.server.requests, 3)
+
+        # Cooldown over: exactly one request gets to probe
+        cache.set(upstream.key("open_until"), time.time() - 1, None)
+        self.assertEqual(upstream.get_state()["state"], "half_open")
+        upstream.check_available()
+        with self.assertRaises(upstream.UpstreamUnavailable):
+            upstream.check_available()
+        cache.delete(upstream.key("probe"))
+
+        self.assertEqual(self.post(200).status_code, 200)
+        state = upstream.get_state()
+        self.assertEqual(state["state"], "closed")
+        self.assertEqual(state["counters"]["failures"], 3)
+        self.assertEqual(state["counters"]["rejected"], 1)
+
+    def test_retry_after_holds_off_every_caller(self):
+        """Test that a 429 with Retry-After blocks requests and sheds new scans"""
+        self.post(429, {"Retry-After": "30"})
+
+        with self.assertRaises(upstream.UpstreamUnavailable) as raised:
+            upstream.post_health_check({}, 5, api_url=self.api_url)
+        self.assertIn(raised.exception.retry_after, (29, 30))
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(upstream.get_state()["state"], "closed")
+
+        response = self.client.post(
+            "/health_check/",
+            data=json.dumps({"subdomain": "test-subdomain"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn(response["Retry-After"], ("29", "30"))
+        self.assertEqual(response.json()["status"], "unavailable")
+
+        status = self.client.get("/api/upstream-status/").json()
+        self.assertEqual(status["counters"]["shed"], 1)
+        self.assertEqual(status["counters"]["rate_limited"], 1)
+
+    @override_settings(UPSTREAM_MAX_REQUESTS_PER_MINUTE=2)
+    def test_shared_request_rate_limit(self):
+        """Test that requests beyond the per-minute limit are not sent"""
+        self.post()
+        self.post()
+        with self.assertRaises(upstream.UpstreamUnavailable):
+            upstream.post_health_check({}, 5, api_url=self.api_url)
+        self.assertEqual(self.server.requests, 2)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    INGEST_SPOOL_MAX_MEMORY=1024,
+    UPSTREAM_MAX_REQUESTS_PER_MINUTE=0,
+)
+class StreamingIngestTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.server, self.api_url = start_upstream_stub(self)
+
+    def ingest(self, body):
+        self.server.body = body
+        self.server.responses.append((200, {"Content-Type": "application/json"}))
+        response = upstream.post_health_check({}, 5, api_url=self.api_url)
+        return ingest.ingest_response(response)
+
+    def test_ingest_summarizes_and_copies_payload(self):
+        """Test that a streamed response is summarized and stored unchanged"""
+        payload = {
+            "name": 'Tab\there, quote " and backslash \\n',
+            "issues": [
+                {
+                    "item_type": "TicketFields" if index % 2 else "Macros",
+                    "type": "error" if index % 3 else "warning",
+                    "message": f"Field {index}\nunused \u00e9\t\\ {'x' * 100}",
+                }
+                for index in range(2000)
+            ],
+        }
+        body = json.dumps(payload, indent=1, ensure_ascii=False).encode()
+        self.assertGreater(len(body), 2 * ingest.CHUNK_SIZE)
+
+        with self.ingest(body) as ingested:
+            self.assertEqual(ingested.size, len(body))
+            self.assertEqual(ingested.summary, summarize_issues(payload))
+            report = ingest.create_report(
+                ingested,
+                installation_id=1,
+                instance_guid="guid",
+                subdomain="test",
+                admin_email="admin@example.com",
+                api_token="token",
+                app_guid="app",
+                version="1.0",
+            )
+
+        stored = HealthCheckReport.objects.get(pk=report.pk)
+        self.assertEqual(stored.raw_response, payload)
+        self.assertEqual(report.raw_response, payload)
+
+    def test_slow_body_times_out_the_check(self):
+        """Test that a body stalling past the read timeout counts as a timeout"""
+        self.server.body = json.dumps({"issues": [{"type": "error"}] * 100}).encode()
+        self.server.body_delay = 2
+        self.server.responses.append((200, {"Content-Type": "application/json"}))
+        response = upstream.post_health_check({}, 0.5, api_url=self.api_url)
+        with self.assertRaises(requests.Timeout):
+            ingest.ingest_response(response)
+
+        self.server.responses.append((200, {"Content-Type": "application/json"}))
+        with override_settings(UPSTREAM_API_URL=self.api_url):
+            result = run_health_check.apply(
+                kwargs={
+                    "url": "https://test.zendesk.com",
+                    "email": "admin@example.com",
+                    "api_token": "token",
+                    "installation_id": 1,
+                    "user_id": "user",
+                    "subdomain": "test",
+                    "instance_guid": "guid",
+                    "app_guid": "app",
+                    "stripe_subscription_id": None,
+                    "version": "1.0",
+                    "read_timeout": 0.5,
+                }
+            ).result
+
+        self.assertEqual(result, {"status": "timeout"})
+        stats = InstallationCheckStats.objects.get(installation_id=1)
+        self.assertEqual(stats.consecutive_timeouts, 1)
+        self.assertFalse(HealthCheckReport.objects.filter(installation_id=1).exists())
+
+    def test_invalid_json_raises_value_error(self):
+        """Test that truncated or non-JSON bodies are rejected"""
+        for body in (b'{"issues": [{"type": "error"}', b"<html>Bad gateway</html>"):
+            with self.assertRaises(ValueError):
+                self.ingest(body)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    HEALTH_CHECK_SECTION_FAN_OUT=True,
+    UPSTREAM_MAX_REQUESTS_PER_MINUTE=0,
+)
+class SectionFanOutTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), SectionStubHandler)
+        self.server.issue_count = 300
+        self.server.section_delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.check = {
+            "url": "test-subdomain",
+            "email": "admin@example.com",
+            "api_token": "token",
+            "installation_id": 12345,
+            "user_id": 1,
+            "subdomain": "test-subdomain",
+            "instance_guid": "test-guid",
+            "app_guid": "test-app-guid",
+            "stripe_subscription_id": None,
+            "version": "1.0.0",
+        }
+
+    def run_section(self, section):
+        with self.settings(
+            UPSTREAM_API_URL=f"http://127.0.0.1:{self.server.server_address[1]}/"
+        ):
+            return run_section_check(
+                check_id="check-1", section=section, check=self.check, read_timeout=5
+            )
+
+    def test_sections_show_progress_and_merge_into_one_report(self):
+        """Test that finished sections are polled and merged into one report"""
+        results = [self.run_section("fields"), self.run_section("triggers")]
+        status = self.client.get("/health_check/status/check-1/").json()
+        self.assertEqual(status["status"], "pending")
+        self.assertEqual(status["total_sections"], len(SECTIONS))
+        self.assertEqual(
+            {
+                section["section"]: section["total_issues"]
+                for section in status["sections"]
+            },
+            {
+                section: len(synthetic_section_response([section], 300)["issues"])
+                for section in ("fields", "triggers")
+            },
+        )
+
+        results += [
+            self.run_section(section)
+            for section in ("macros", "forms", "slas", "users")
+        ]
+        result = merge_section_checks(
+            results, check_id="check-1", check=self.check, started_at=time.time()
+        )
+        self.assertEqual(result["status"], "ok")
+
+        # Issues come section by section, in SECTION_CHOICES order
+        expected = synthetic_section_response(list(SECTIONS), 300)
+        raw_response = HealthCheckReport.objects.get(
+            id=result["report_id"]
+        ).raw_response
+        self.assertEqual(
+            raw_response["issues"],
+            [
+                issue
+                for section, _ in HealthCheckSectionResult.SECTION_CHOICES
+                for issue in synthetic_section_response([section], 300)["issues"]
+            ],
+        )
+        self.assertEqual(raw_response["counts"], expected["counts"])
+        self.assertEqual(raw_response["sum_totals"], {"sum_total": 300})
+        self.assertEqual(raw_response["instance_url"], expected["instance_url"])
+        self.assertFalse(HealthCheckSectionResult.objects.exists())
+
+    def test_failed_section_fails_the_check(self):
+        """Test that a section the API rejects fails the whole check"""
+        results = [self.run_section("fields"), self.run_section("unknown")]
+        self.assertEqual(results[1], {"status": "api_error", "section": "unknown"})
+
+        result = merge_section_checks(
+            results, check_id="check-1", check=self.check, started_at=time.time()
+        )
+        self.assertEqual(result, {"status": "api_error"})
+        self.assertFalse(HealthCheckReport.objects.exists())
+
+    def test_check_whose_chord_failed_is_reported_and_swept(self):
+        """Test that a killed section fails the check and its rows are deleted"""
+        self.run_section("fields")
+        HealthCheckSectionResult.objects.update(
+            created_at=timezone.now() - timedelta(hours=2)
+        )
+        HealthCheckSectionResult.objects.create(check_id="check-2", section="fields")
+        # A section task killed at its time limit fails the chord, and
+        # merge_section_checks never runs
+        celery_app.backend.mark_as_failure(
+            "check-1", ChordError("Dependency raised WorkerLostError()")
+        )
+
+        response = self.client.get("/health_check/status/check-1/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "error")
+        self.assertEqual(response.json()["error"], RESULT_MESSAGES["failed"])
+
+        self.assertEqual(delete_stale_section_results(), 1)
+        self.assertEqual(
+            list(HealthCheckSectionResult.objects.values_list("check_id", flat=True)),
+            ["check-2"],
+        )
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    SCAN_THROTTLE_BURST=2,
+    SCAN_THROTTLE_PER_HOUR=12,
+    SCAN_THROTTLE_SUBDOMAIN_BURST=5,
+    SCAN_THROTTLE_SUBDOMAIN_PER_HOUR=30,
+    SCAN_THROTTLE_GLOBAL_BURST=4,
+    SCAN_THROTTLE_GLOBAL_PER_MINUTE=30,
+)
+class ScanThrottleTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_installation_bucket_allows_a_burst_then_throttles(self):
+        """Test that an installation gets its burst and then a 429"""
+        throttle.take_scan_token(1, "test-subdomain")
+        throttle.take_scan_token(1, "test-subdomain")
+
+        response = self.client.post(
+            "/health_check/",
+            data=json.dumps({"installation_id": 1, "subdomain": "test-subdomain"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()["status"], "throttled")
+        # A token every 5 minutes at 12 an hour
+        self.assertIn(int(response["Retry-After"]), range(299, 301))
+
+        stats = self.client.get("/api/throttle-status/").json()
+        self.assertEqual(stats["allowed"], 2)
+        self.assertEqual(stats["throttled_installation"], 1)
+
+    def test_global_bucket_takes_no_tokens_when_throttled(self):
+        """Test that a scan the global bucket refuses leaves the others full"""
+        for installation_id in range(1, 5):
+            throttle.take_scan_token(installation_id, f"subdomain-{installation_id}")
+
+        with self.assertRaises(throttle.ScanThrottled) as raised:
+            throttle.take_scan_token(5, "subdomain-5")
+        self.assertEqual(raised.exception.scope, "global")
+        self.assertEqual(raised.exception.retry_after, 2)
+        self.assertIsNone(cache.get(throttle.key("installation:5")))
+
+        # Two seconds later the global bucket has a token again
+        tokens, updated = cache.get(throttle.key("global"))
+        cache.set(throttle.key("global"), (tokens, updated - 2))
+        throttle.take_scan_token(5, "subdomain-5")
+        self.assertEqual(throttle.get_stats()["throttled_global"], 1)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    ANALYTICS_SINK="null",
+    UPSTREAM_MAX_REQUESTS_PER_MINUTE=0,
+)
+class WorkerMemoryTestCase(TestCase):
+    def test_peak_rss_resets_to_current(self):
+        """Test that the peak RSS can be reset and then tracks new growth"""
+        self.assertTrue(worker_memory.reset_peak_rss())
+        start = worker_memory.current_rss_kib()
+        self.assertLessEqual(worker_memory.peak_rss_kib() - start, 1024)
+
+        block = bytearray(64 * 2**20)
+        block[::4096] = b"x" * len(block[::4096])
+        del block
+        self.assertGreaterEqual(worker_memory.peak_rss_kib() - start, 60 * 1024)
+
+    def test_health_check_records_peak_memory(self):
+        """Test that run_health_check logs and records its peak memory"""
+        server, api_url = start_upstream_stub(self)
+        server.responses.append((200, {"Content-Type": "application/json"}))
+        check = {
+            "url": "https://test.zendesk.com",
+            "email": "admin@example.com",
+            "api_token": "token",
+            "installation_id": 1,
+            "user_id": "user",
+            "subdomain": "test",
+            "instance_guid": "guid",
+            "app_guid": "app",
+            "stripe_subscription_id": None,
+            "version": "1.0",
+            "read_timeout": 5,
+        }
+
+        with (
+            override_settings(UPSTREAM_API_URL=api_url),
+            self.assertLogs(worker_memory.logger, "INFO") as logs,
+        ):
+            result = run_health_check.apply(kwargs=check).result
+
+        self.assertEqual(result["status"], "ok")
+        self.assertIn("run_health_check", logs.output[0])
+        self.assertIn("peak RSS", logs.output[0])
+        stats = InstallationCheckStats.objects.get(installation_id=1)
+        self.assertIsNotNone(stats.peak_memory_kib)
+        self.assertFalse(worker_memory._started)
@@ -0,0 +1,186 @@
+"""
+Token-bucket limits on new health check scans, enforced before anything is
+queued.
+
+A scan takes a token from each of three buckets: its installation's, its
+subdomain's (shared by the subdomain's installations) and a global one. A
+bucket holds up to its burst of tokens and refills at a steady rate, so a
+double click still gets through but a client that keeps posting is held to
+the rate, and the queue can only grow as fast as the global rate. A scan is
+let through only if every bucket has a token, and then takes one from each.
+
+With the Redis cache the check and take is a single Lua script, so it is
+atomic across web processes. Other cache backends (local memory in tests
+and development) do the same arithmetic without that guarantee.
+"""
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from .cache_utils import HealthCheckCache
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+# Counters kept for get_stats()
+STATS = ("allowed", "throttled_installation", "throttled_subdomain", "throttled_global")
+
+# KEYS are the buckets; ARGV holds each one's burst and refill rate (tokens
+# per second) in turn. Returns {0, ""} after taking a token from every bucket,
+# or {the 1-based index of the bucket that is furthest from a token, the
+# seconds until it has one} without taking any.
+TAKE_TOKENS_SCRIPT = """
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local levels = {}
+local denied, wait = 0, 0
+for i, key in ipairs(KEYS) do
+    local burst = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    local bucket = redis.call("HMGET", key, "tokens", "updated")
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    if tokens < 1 and (1 - tokens) / rate > wait then
+        denied, wait = i, (1 - tokens) / rate
+    end
+end
+if denied == 0 then
+    for i, key in ipairs(KEYS) do
+        local burst = tonumber(ARGV[2 * i - 1])
+        local rate = tonumber(ARGV[2 * i])
+        redis.call("HSET", key, "tokens", levels[i] - 1, "updated", now)
+        redis.call("EXPIRE", key, math.ceil(burst / rate) + 1)
+    end
+end
+return {denied, tostring(wait)}
+"""
+
+_scripts = {}
+
+
+class ScanThrottled(Exception):
+    """A bucket (scope) is out of tokens for another retry_after seconds"""
+
+    def __init__(self, scope, retry_after):
+        super().__init__(f"Health check scans throttled for {scope}")
+        self.scope = scope
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def key(name):
+    return HealthCheckCache.get_cache_key("throttle", name)
+
+
+def count(stat):
+    cache_key = key(f"stats:{stat}")
+    cache.add(cache_key, 0, None)
+    try:
+        cache.incr(cache_key)
+    except ValueError:
+        cache.set(cache_key, 1, None)
+
+
+def get_buckets(installation_id, subdomain):
+    """(scope, cache key, burst, tokens per second) for each bucket in use"""
+    buckets = []
+    if installation_id:
+        buckets.append(
+            (
+                "installation",
+                key(f"installation:{installation_id}"),
+                settings.SCAN_THROTTLE_BURST,
+                settings.SCAN_THROTTLE_PER_HOUR / 3600,
+            )
+        )
+    if subdomain:
+        buckets.append(
+            (
+                "subdomain",
+                key(f"subdomain:{subdomain}"),
+                settings.SCAN_THROTTLE_SUBDOMAIN_BURST,
+                settings.SCAN_THROTTLE_SUBDOMAIN_PER_HOUR / 3600,
+            )
+        )
+    buckets.append(
+        (
+            "global",
+            key("global"),
+            settings.SCAN_THROTTLE_GLOBAL_BURST,
+            settings.SCAN_THROTTLE_GLOBAL_PER_MINUTE / 60,
+        )
+    )
+    # A rate of 0 turns a bucket off
+    return [bucket for bucket in buckets if bucket[2] > 0 and bucket[3] > 0]
+
+
+def take_tokens_redis(backend, buckets):
+    client = backend._cache.get_client(write=True)
+    script = _scripts.get(id(client))
+    if script is None:
+        script = _scripts[id(client)] = client.register_script(TAKE_TOKENS_SCRIPT)
+
+    args = []
+    for _, _, burst, rate in buckets:
+        args += [burst, rate]
+    denied, wait = script(
+        keys=[backend.make_and_validate_key(bucket[1]) for bucket in buckets],
+        args=args,
+    )
+    if denied:
+        return buckets[denied - 1][0], float(wait)
+    return None
+
+
+def take_tokens_cache(buckets):
+    """TAKE_TOKENS_SCRIPT through the cache API, for non-Redis caches"""
+    now = time.time()
+    stored = cache.get_many([bucket[1] for bucket in buckets])
+    levels = {}
+    denied, wait = None, 0
+    for scope, cache_key, burst, rate in buckets:
+        tokens, updated = stored.get(cache_key, (burst, now))
+        tokens = min(burst, tokens + max(0, now - updated) * rate)
+        levels[cache_key] = tokens
+        if tokens < 1 and (1 - tokens) / rate > wait:
+            denied, wait = scope, (1 - tokens) / rate
+    if denied:
+        return denied, wait
+
+    for _, cache_key, burst, rate in buckets:
+        cache.set(cache_key, (levels[cache_key] - 1, now), math.ceil(burst / rate) + 1)
+    return None
+
+
+def take_scan_token(installation_id, subdomain):
+    """
+    Take a token for a new scan from every bucket, or raise ScanThrottled
+    without taking any
+    """
+    buckets = get_buckets(installation_id, subdomain)
+    if not buckets:
+        return
+
+    backend = caches["default"]
+    if isinstance(backend, RedisCache):
+        throttled = take_tokens_redis(backend, buckets)
+    else:
+        throttled = take_tokens_cache(buckets)
+
+    if throttled:
+        scope, retry_after = throttled
+        count(f"throttled_{scope}")
+        logger.warning(
+            f"Throttled health check scan for installation {installation_id} "
+            f"({subdomain}) on its {scope} bucket, retry in {retry_after:.0f}s"
+        )
+        raise ScanThrottled(scope, retry_after)
+    count("allowed")
+
+
+def get_stats():
+    stats = cache.get_many([key(f"stats:{stat}") for stat in STATS])
+    return {stat: stats.get(key(f"stats:{stat}"), 0) for stat in STATS}
@@ -0,0 +1,217 @@
+"""
+Client for the upstream health check API, shared by every worker.
+
+Its state lives in the cache (Redis in production), so all workers and
+processes act on it together:
+
+- Failed requests (5xx responses and connection errors) are counted over
+  UPSTREAM_BREAKER_WINDOW seconds. At UPSTREAM_BREAKER_THRESHOLD the circuit
+  breaker opens and calls fail straight away with UpstreamUnavailable
+  instead of adding load to an API that is already struggling. After
+  UPSTREAM_BREAKER_COOLDOWN a single probe request is let through, and its
+  result closes the breaker or opens it again.
+- A 429 (or a 503 with Retry-After) holds every worker off until the time
+  the API asked for.
+- At most UPSTREAM_MAX_REQUESTS_PER_MINUTE requests start in any minute.
+
+Timeouts don't count as failures: large instances legitimately take a long
+time (see InstallationCheckStats).
+"""
+
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from email.utils import parsedate_to_datetime
+from .cache_utils import HealthCheckCache
+import logging
+import math
+import requests
+import time
+
+logger = logging.getLogger(__name__)
+
+PRODUCTION_API_URL = "https://app.configly.io/api/health-check/"
+DEVELOPMENT_API_URL = (
+    "https://django-server-development-1b87.up.railway.app/api/health-check/"
+)
+
+# Counters kept for get_state()
+STATS = ("requests", "successes", "failures", "rejected", "rate_limited", "shed")
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream API shouldn't be called for another retry_after seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def get_api_url():
+    # e.g. a local serve_upstream_stub in development
+    if settings.UPSTREAM_API_URL:
+        return settings.UPSTREAM_API_URL
+    if settings.ENVIRONMENT == "production":
+        return PRODUCTION_API_URL
+    return DEVELOPMENT_API_URL
+
+
+def key(name):
+    return HealthCheckCache.get_cache_key("upstream", name)
+
+
+def increment(name, timeout=None):
+    cache_key = key(name)
+    cache.add(cache_key, 0, timeout)
+    try:
+        return cache.incr(cache_key)
+    except ValueError:
+        # Expired between add and incr
+        cache.set(cache_key, 1, timeout)
+        return 1
+
+
+def count(stat):
+    increment(f"stats:{stat}")
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (seconds or an HTTP date)"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        seconds = (when - datetime.now(dt_timezone.utc)).total_seconds()
+    return min(max(seconds, 1), settings.UPSTREAM_MAX_BACKOFF)
+
+
+def check_available():
+    """
+    Raise UpstreamUnavailable if no request should be made now. When the
+    breaker is half open this claims the one probe request.
+    """
+    now = time.time()
+    backoff_until = cache.get(key("backoff_until"))
+    if backoff_until and backoff_until > now:
+        raise UpstreamUnavailable(
+            "Upstream API asked us to back off", backoff_until - now
+        )
+
+    open_until = cache.get(key("open_until"))
+    if open_until and open_until > now:
+        raise UpstreamUnavailable("Upstream circuit breaker is open", open_until - now)
+
+    limit = settings.UPSTREAM_MAX_REQUESTS_PER_MINUTE
+    if limit and increment(f"rate:{int(now // 60)}", 120) > limit:
+        raise UpstreamUnavailable("Upstream request rate limit reached", 60 - now % 60)
+
+    if open_until and not cache.add(
+        key("probe"), 1, settings.UPSTREAM_BREAKER_COOLDOWN
+    ):
+        raise UpstreamUnavailable(
+            "Upstream circuit breaker is waiting on a probe request",
+            settings.UPSTREAM_BREAKER_COOLDOWN,
+        )
+
+
+def record_success():
+    cache.delete_many([key("open_until"), key("probe"), key("failures")])
+    count("successes")
+
+
+def record_failure():
+    count("failures")
+    failures = increment("failures", settings.UPSTREAM_BREAKER_WINDOW)
+    # A failed probe opens the breaker again straight away
+    if failures >= settings.UPSTREAM_BREAKER_THRESHOLD or cache.get(key("open_until")):
+        cache.set(
+            key("open_until"), time.time() + settings.UPSTREAM_BREAKER_COOLDOWN, None
+        )
+        cache.delete(key("probe"))
+        logger.warning(
+            f"Upstream circuit breaker opened after {failures} failures, "
+            f"for {settings.UPSTREAM_BREAKER_COOLDOWN}s"
+        )
+
+
+def back_off(seconds):
+    cache.set(key("backoff_until"), time.time() + seconds, math.ceil(seconds))
+    count("rate_limited")
+    logger.warning(f"Upstream API asked us to back off for {seconds:.0f}s")
+
+
+def post_health_check(payload, read_timeout, api_url=None, headers=None):
+    """
+    POST a health check to the upstream API and return the (streamed, so
+    not yet read) response, recording its outcome for the breaker. Raises UpstreamUnavailable
+    without making a request while the breaker is open or backing off.
+    """
+    try:
+        check_available()
+    except UpstreamUnavailable:
+        count("rejected")
+        raise
+
+    count("requests")
+    try:
+        response = requests.post(
+            api_url or get_api_url(),
+            headers={
+                "Content-Type": "application/json",
+                "X-API-Token": settings.HEALTHCHECK_TOKEN,
+                **(headers or {}),
+            },
+            json=payload,
+            timeout=(30, read_timeout),
+            # Bodies can be tens of megabytes; callers read them with
+            # ingest.ingest_response or response.text
+            stream=True,
+        )
+    except requests.ConnectionError:
+        record_failure()
+        raise
+    except requests.Timeout:
+        # Says nothing about the API's health; let the next request probe
+        cache.delete(key("probe"))
+        raise
+
+    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    if response.status_code == 429:
+        # The API is up but busy; probe again once the backoff ends
+        cache.delete(key("probe"))
+        back_off(retry_after or settings.UPSTREAM_DEFAULT_BACKOFF)
+    elif response.status_code >= 500:
+        record_failure()
+        if retry_after:
+            back_off(retry_after)
+    else:
+        record_success()
+    return response
+
+
+def get_state():
+    """Breaker state, how long until requests resume, and counters"""
+    now = time.time()
+    open_until = cache.get(key("open_until"))
+    backoff_until = cache.get(key("backoff_until")) or 0
+
+    if open_until and open_until > now:
+        state = "open"
+    elif open_until:
+        state = "half_open"
+    else:
+        state = "closed"
+    resume_at = max(open_until or 0, backoff_until)
+
+    stats = cache.get_many([key(f"stats:{stat}") for stat in STATS])
+    return {
+        "state": state,
+        "retry_after": math.ceil(resume_at - now) if resume_at > now else 0,
+        "recent_failures": cache.get(key("failures")) or 0,
+        "counters": {stat: stats.get(key(f"stats:{stat}"), 0) for stat in STATS},
+    }
@@ -17,7 +17,9 @@ from .views import (
     get_historical_report,
     check_task_status,
     test_timeout,
-    get_chat_widget
+    get_chat_widget,
+    upstream_status,
+    throttle_status,
 )
 
 # from . import views
@@ -87,4 +89,6 @@ urlpatterns = [
         name="get_cached_zaf_data",
     ),
     path('api/chat-widget/', get_chat_widget, name='get_chat_widget'),
+    path("api/upstream-status/", upstream_status, name="upstream_status"),
+    path("api/throttle-status/", throttle_status, name="throttle_status"),
 ]
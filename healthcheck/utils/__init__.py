@@ -1,13 +1,33 @@
-from .formatting import format_response_data, format_historical_reports
+from .formatting import (
+    format_response_data,
+    format_report_payload,
+    format_report_overlay,
+    format_historical_reports,
+    get_access_level,
+)
 from .monitoring import get_monitoring_context
-from .stripe import get_default_subscription_status, create_webhook_endpoint
-from .reports import render_report_components
+from .stripe import (
+    get_default_subscription_status,
+    get_subscription_details,
+    create_webhook_endpoint,
+)
+from .reports import (
+    render_report_components,
+    apply_report_overlay,
+    TIME_SINCE_PLACEHOLDER,
+)
 
 __all__ = [
     "format_response_data",
+    "format_report_payload",
+    "format_report_overlay",
     "format_historical_reports",
+    "get_access_level",
     "get_monitoring_context",
     "get_default_subscription_status",
+    "get_subscription_details",
     "create_webhook_endpoint",
     "render_report_components",
+    "apply_report_overlay",
+    "TIME_SINCE_PLACEHOLDER",
 ]
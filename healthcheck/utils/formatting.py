@@ -1,4 +1,78 @@
 from django.utils.timesince import timesince
+from functools import lru_cache
+import re
+
+# Categories visible in the free version of a report
+FREE_CATEGORIES = ("TicketForms", "TicketFields")
+
+
+@lru_cache(maxsize=256)
+def category_label(category):
+    """
+    Display label for a category, computed once per distinct value.
+    Example: 'TicketForms' -> 'Ticket Forms'
+    """
+    return re.sub(r"(?<!^)(?=[A-Z])", " ", category)
+
+
+def aggregate_issues(issues, restricted=False):
+    """
+    Walk the raw issues once, collecting counts, categories and display rows.
+    When restricted, only FREE_CATEGORIES issues are kept and the rest are
+    tallied per category as hidden.
+    """
+    has_status_values = False
+    critical_issues = 0
+    warning_issues = 0
+    categories = set()
+    hidden_issues_count = 0
+    hidden_categories = {}
+    rows = []
+    add_row = rows.append
+
+    for issue in issues:
+        if not has_status_values and "active" in issue:
+            has_status_values = True
+
+        category = issue.get("item_type", "Unknown")
+        if restricted and category not in FREE_CATEGORIES:
+            # Missing item_type is tallied under None, not "Unknown"
+            item_type = issue.get("item_type")
+            hidden_categories[item_type] = hidden_categories.get(item_type, 0) + 1
+            hidden_issues_count += 1
+            continue
+
+        severity = issue.get("type", "warning")
+        if severity == "error":
+            critical_issues += 1
+        elif severity == "warning" and "type" in issue:
+            warning_issues += 1
+
+        categories.add(category)
+        active = issue.get("active", False)
+        # Display labels are precomputed so the templates run no filters per row
+        add_row(
+            {
+                "category": category,
+                "category_label": category_label(category),
+                "severity": severity,
+                "severity_label": severity.title(),
+                "active": active,
+                "status": "active" if active else "inactive",
+                "description": issue.get("message", ""),
+                "zendesk_url": issue.get("zendesk_url", "#"),
+            }
+        )
+
+    return {
+        "has_status_values": has_status_values,
+        "critical_issues": critical_issues,
+        "warning_issues": warning_issues,
+        "categories": categories,
+        "hidden_issues_count": hidden_issues_count,
+        "hidden_categories": hidden_categories,
+        "issues": rows,
+    }
 
 
 def format_response_data(
@@ -14,33 +88,39 @@ def format_response_data(
     - Has active subscription
     - Report is unlocked via one-off payment
     """
-    issues = response_data.get("issues", [])
+    formatted_data = format_report_payload(
+        response_data,
+        subscription_active=subscription_active,
+        report_id=report_id,
+        last_check=last_check,
+        is_unlocked=is_unlocked,
+    )
+    formatted_data.update(format_report_overlay(last_check))
+    return formatted_data
+
+
+def format_report_payload(
+    response_data,
+    subscription_active=False,
+    report_id=None,
+    last_check=None,
+    is_unlocked=False,
+):
+    """
+    The part of the formatted report that never changes for a given report and
+    access level, so it can be cached for the report's lifetime.
+    """
     counts = response_data.get("counts", {})
     total_counts = response_data.get("sum_totals", {})
-    has_status_values = any("active" in issue for issue in issues)
-
-    # Calculate hidden issues for users without access
-    hidden_issues_count = 0
-    hidden_categories = {}
 
     # Filter issues if user has no access (neither subscription nor one-off unlock)
-    if not subscription_active and not is_unlocked and report_id:
-        # Count issues by category before filtering
-        for issue in issues:
-            item_type = issue.get("item_type")
-            if item_type not in ["TicketForms", "TicketFields"]:
-                hidden_categories[item_type] = hidden_categories.get(item_type, 0) + 1
-                hidden_issues_count += 1
-
-        # Show only Ticket Forms and Fields issues for users without access
-        issues = [
-            issue
-            for issue in issues
-            if issue.get("item_type") in ["TicketForms", "TicketFields"]
-        ]
+    aggregate = aggregate_issues(
+        response_data.get("issues", []),
+        restricted=not subscription_active and not is_unlocked and bool(report_id),
+    )
 
     return {
-        "has_status_values": has_status_values,
+        "has_status_values": aggregate["has_status_values"],
         "instance": {
             "name": response_data.get("name", "Unknown"),
             "url": response_data.get("instance_url", "Unknown"),
@@ -51,10 +131,9 @@ def format_response_data(
         if last_check
         else None,  # Add report creation date
         "last_check": last_check.strftime("%Y-%m-%d %H:%M:%S") if last_check else None,
-        "time_since_check": timesince(last_check) if last_check else "Never",
-        "total_issues": len(issues),
-        "critical_issues": sum(1 for issue in issues if issue.get("type") == "error"),
-        "warning_issues": sum(1 for issue in issues if issue.get("type") == "warning"),
+        "total_issues": len(aggregate["issues"]),
+        "critical_issues": aggregate["critical_issues"],
+        "warning_issues": aggregate["warning_issues"],
         "counts": {
             "ticket_fields": counts.get("ticket_fields", {}),
             "user_fields": counts.get("user_fields", {}),
@@ -73,28 +152,27 @@ def format_response_data(
             "deletion": total_counts.get("sum_deletion", 0),
             "total_changes": total_counts.get("sum_total_changes", 0),
         },
-        "categories": sorted(
-            set(issue.get("item_type", "Unknown") for issue in issues)
-        ),
-        "hidden_issues_count": hidden_issues_count,
-        "hidden_categories": hidden_categories,
+        "categories": sorted(aggregate["categories"]),
+        "hidden_issues_count": aggregate["hidden_issues_count"],
+        "hidden_categories": aggregate["hidden_categories"],
         "is_unlocked": True
         if subscription_active
         else is_unlocked,  # This is the key change
         "report_id": report_id,
-        "issues": [
-            {
-                "category": issue.get("item_type", "Unknown"),
-                "severity": issue.get("type", "warning"),
-                "active": issue.get("active", False),
-                "description": issue.get("message", ""),
-                "zendesk_url": issue.get("zendesk_url", "#"),
-            }
-            for issue in issues
-        ],
+        "issues": aggregate["issues"],
     }
 
 
+def format_report_overlay(last_check):
+    """The time-relative part of a formatted report, computed per response"""
+    return {"time_since_check": timesince(last_check) if last_check else "Never"}
+
+
+def get_access_level(subscription_active, is_unlocked):
+    """Access level a formatted report is cached under"""
+    return "full" if subscription_active or is_unlocked else "limited"
+
+
 def format_historical_reports(reports):
     """Helper function to format historical reports for display"""
     return [
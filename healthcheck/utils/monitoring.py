@@ -11,6 +11,8 @@ def get_monitoring_context(installation_id, subscription_active, latest_report=N
             monitoring_data = {
                 "is_active": False,  # Force inactive if no subscription
                 "frequency": monitoring.frequency,
+                "preferred_window": monitoring.preferred_window,
+                "notification_mode": monitoring.notification_mode,
                 "notification_emails": monitoring.notification_emails or [],
                 "instance_guid": monitoring.instance_guid,
                 "subdomain": monitoring.subdomain,
@@ -19,6 +21,8 @@ def get_monitoring_context(installation_id, subscription_active, latest_report=N
             monitoring_data = {
                 "is_active": monitoring.is_active,  # Only use monitoring setting if subscription is active
                 "frequency": monitoring.frequency,
+                "preferred_window": monitoring.preferred_window,
+                "notification_mode": monitoring.notification_mode,
                 "notification_emails": monitoring.notification_emails or [],
                 "instance_guid": monitoring.instance_guid,
                 "subdomain": monitoring.subdomain,
@@ -28,6 +32,8 @@ def get_monitoring_context(installation_id, subscription_active, latest_report=N
         monitoring_data = {
             "is_active": False,
             "frequency": "weekly",
+            "preferred_window": "",
+            "notification_mode": "always",
             "notification_emails": [],
             "instance_guid": latest_report.instance_guid if latest_report else "",
             "subdomain": latest_report.subdomain if latest_report else "",
@@ -1,8 +1,12 @@
 from django.template.loader import render_to_string
+from .formatting import format_report_overlay
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Rendered in place of the time since the report so cached HTML stays valid
+TIME_SINCE_PLACEHOLDER = "__healthcheck_time_since_check__"
+
 
 def render_report_components(formatted_data):
     """Helper function to render report template"""
@@ -22,3 +26,10 @@ def render_report_components(formatted_data):
         return render_to_string(
             "healthcheck/results.html", {"error": "Error rendering report template"}
         )
+
+
+def apply_report_overlay(results_html, last_check):
+    """Fill the time-relative parts into report HTML rendered from a payload"""
+    return results_html.replace(
+        TIME_SINCE_PLACEHOLDER, format_report_overlay(last_check)["time_since_check"]
+    )
@@ -1,5 +1,5 @@
 from zendeskapp import settings
-from djstripe.models import WebhookEndpoint
+from djstripe.models import Subscription, WebhookEndpoint
 
 
 def get_default_subscription_status():
@@ -13,6 +13,99 @@ def get_default_subscription_status():
     }
 
 
+def get_subscription_details(subdomain):
+    """
+    Build the billing page subscription details for a subdomain.
+    Everything the page shows is fetched in a single joined query.
+    """
+    subscription = (
+        Subscription.objects.filter(
+            metadata__subdomain=subdomain, status__in=["active", "trialing"]
+        )
+        .select_related(
+            "plan__product",
+            "latest_invoice",
+            "customer__default_payment_method",
+            "customer__coupon",
+        )
+        .first()
+    )
+    if not subscription:
+        return None
+
+    plan = subscription.plan
+    customer = subscription.customer
+    latest_invoice = subscription.latest_invoice
+    payment_method = customer.default_payment_method
+    card = (payment_method.card or {}) if payment_method else {}
+    coupon = customer.coupon
+
+    return {
+        # Basic subscription info
+        "status": subscription.status,
+        "current_period_start": subscription.current_period_start,
+        "current_period_end": subscription.current_period_end,
+        "start_date": subscription.start_date,
+        "cancel_at_period_end": subscription.cancel_at_period_end,
+        "ended_at": subscription.ended_at,
+        "cancel_at": subscription.cancel_at,
+        "canceled_at": subscription.canceled_at,
+        "trial_start": subscription.trial_start,
+        "trial_end": subscription.trial_end,
+        # Plan details
+        "plan": {
+            "id": plan.id,
+            "nickname": plan.nickname,
+            "amount": plan.amount,
+            "interval": plan.interval,
+            "product_name": plan.product.name if plan.product else None,
+            "currency": plan.currency,
+        }
+        if plan
+        else None,
+        # Customer details
+        "customer": {
+            "name": customer.name,
+            "email": customer.email,
+            "address": customer.address,
+            "currency": customer.currency,
+            "balance": customer.balance,
+            "delinquent": customer.delinquent,
+            "default_payment_method": {
+                "type": payment_method.type,
+                "card_brand": card.get("brand"),
+                "card_last4": card.get("last4"),
+            }
+            if payment_method
+            else None,
+        },
+        # Invoice details
+        "latest_invoice": {
+            "number": latest_invoice.number,
+            "amount_due": latest_invoice.amount_due,
+            "amount_paid": latest_invoice.amount_paid,
+            "hosted_invoice_url": latest_invoice.hosted_invoice_url,
+            "pdf_url": latest_invoice.invoice_pdf,
+            "status": latest_invoice.status,
+        }
+        if latest_invoice
+        else None,
+        # Discount information
+        "discount": {
+            "coupon": {
+                "amount_off": coupon.amount_off,
+                "percent_off": coupon.percent_off,
+                "duration": coupon.duration,
+                "duration_in_months": coupon.duration_in_months,
+            },
+            "start": customer.coupon_start,
+            "end": customer.coupon_end,
+        }
+        if coupon
+        else None,
+    }
+
+
 def create_webhook_endpoint(request):
     """Create or get a webhook endpoint"""
     webhook_url = request.build_absolute_uri("/stripe/webhook/")
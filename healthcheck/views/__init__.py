@@ -24,7 +24,7 @@ from .healthcheck import (
 )
 
 # API views
-from .api import get_chat_widget
+from .api import get_chat_widget, throttle_status, upstream_status
 
 __all__ = [
     # App
@@ -48,4 +48,6 @@ __all__ = [
     "test_timeout",
     # API
     "get_chat_widget",
+    "upstream_status",
+    "throttle_status",
 ]
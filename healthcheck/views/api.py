@@ -1,9 +1,21 @@
-from django.http import JsonResponse
+from ..fastjson import FastJsonResponse
 from ..models import SiteConfiguration
+from .. import throttle
+from .. import upstream
 
 def get_chat_widget(request):
     config = SiteConfiguration.objects.first()
-    return JsonResponse({
+    return FastJsonResponse({
         'is_enabled': bool(config and config.is_chat_enabled),
         'script': config.chat_widget_script if config and config.is_chat_enabled else ''
-    }) 
\ No newline at end of file
+    }) 
+
+
+def upstream_status(request):
+    """Upstream API circuit breaker state and counters, for the UI and metrics"""
+    return FastJsonResponse(upstream.get_state())
+
+
+def throttle_status(request):
+    """Counts of health check scans let through and throttled, by bucket"""
+    return FastJsonResponse(throttle.get_stats())
@@ -1,14 +1,17 @@
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-import json
+from .. import fastjson
+from ..fastjson import FastJsonResponse
 from zendeskapp import settings
-from ..models import ZendeskUser, SiteConfiguration
+from ..models import ZendeskUser
 from ..utils.formatting import format_historical_reports
 from ..utils.stripe import get_default_subscription_status
-import segment.analytics as analytics  # Add this import
+from .. import analytics
 from ..cache_utils import HealthCheckCache
+from ..async_utils import gather_sync, run_in_thread
+import asyncio
 import jwt
 from functools import wraps
 
@@ -16,23 +19,23 @@ from functools import wraps
 # Add this new decorator to validate JWT tokens
 def validate_jwt_token(f):
     @wraps(f)
-    def decorated_function(request, *args, **kwargs):
+    async def decorated_function(request, *args, **kwargs):
         # Only validate JWT for initial page loads (POST requests)
         if request.method == "POST" and not request.headers.get("X-Subsequent-Request"):
             try:
                 # Get token based on content type
                 if request.content_type == "application/json":
                     try:
-                        data = json.loads(request.body)
+                        data = fastjson.loads(request.body)
                         token = data.get("token")
-                    except json.JSONDecodeError:
+                    except fastjson.JSONDecodeError:
                         token = None
                 else:
                     # Handle form data
                     token = request.POST.get("token")
 
                 if not token:
-                    return JsonResponse({"error": "No token provided"}, status=403)
+                    return FastJsonResponse({"error": "No token provided"}, status=403)
 
                 # Validate token
                 try:
@@ -44,22 +47,80 @@ def validate_jwt_token(f):
                         ".zendesk.com", ""
                     )
                 except Exception as e:
-                    return JsonResponse(
+                    return FastJsonResponse(
                         {"error": f"Invalid token format: {str(e)}"}, status=403
                     )
 
             except Exception as e:
-                return JsonResponse({"error": str(e)}, status=403)
+                return FastJsonResponse({"error": str(e)}, status=403)
 
-        return f(request, *args, **kwargs)
+        return await f(request, *args, **kwargs)
 
     return decorated_function
 
 
+def record_app_load(
+    user, user_id, installation_id, origin, subscription_status, latest_report
+):
+    """Send the identify/group/track calls for an app load"""
+    # Identify user with Segment, only when their traits changed
+    analytics.identify_if_changed(
+        user_id,
+        {
+            "name": user.name,
+            "email": user.email,
+            "role": user.role,
+            "locale": user.locale,
+            "timezone": user.time_zone,
+            "avatar": user.avatar_url,
+            "subdomain": user.subdomain,
+            "subscription_status": subscription_status["status"],
+            "subscription_plan": subscription_status["plan"],
+            "subscription_active": subscription_status["active"],
+            "installation_id": installation_id,
+            "last_healthcheck": latest_report.created_at if latest_report else None,
+            "last_healthcheck_unlocked": latest_report.is_unlocked
+            if latest_report
+            else False,
+        },
+    )
+
+    # Group analytics
+    analytics.group_if_changed(
+        user_id,
+        user.subdomain,
+        {
+            "name": user.subdomain,
+            "organization": user.subdomain,
+            "subscription_status": subscription_status["status"],
+        },
+    )
+
+    # Track app load
+    analytics.track(
+        user_id,
+        "App Loaded",
+        {
+            "subscription_status": subscription_status["status"],
+            "subscription_active": subscription_status["active"],
+            "subdomain": origin,
+            "installation_id": installation_id,
+        },
+    )
+
+
+async def get_formatted_report(latest_report, subscription_active):
+    if latest_report is None:
+        return None
+    return await run_in_thread(HealthCheckCache.get_formatted_report)(
+        latest_report, subscription_active
+    )
+
+
 # Update the app view to remove monitoring context
 @csrf_exempt
 @validate_jwt_token
-def app(request):
+async def app(request):
     initial_data = {}
     installation_id = request.GET.get("installation_id")
     app_guid = request.GET.get("app_guid")
@@ -68,76 +129,46 @@ def app(request):
 
     if not all([installation_id, user_id]):
         initial_data["loading"] = "Loading your workspace..."
-        return render(request, "healthcheck/app.html", initial_data)
+        return await sync_to_async(render)(
+            request, "healthcheck/app.html", initial_data
+        )
 
     try:
-        # Get all cached data in parallel
         # Initialize subscription_status with default values
         subscription_status = get_default_subscription_status()
 
-        # url_params = HealthCheckCache.get_url_params(installation_id, app_guid, origin, user_id)
-        user = HealthCheckCache.get_user_info(user_id)
+        # Get all cached data concurrently
+        (
+            user,
+            latest_report,
+            historical_reports,
+            monitoring_settings,
+        ) = await gather_sync(
+            (HealthCheckCache.get_user_info, user_id),
+            (HealthCheckCache.get_latest_report, installation_id),
+            (HealthCheckCache.get_historical_reports, installation_id),
+            (HealthCheckCache.get_monitoring_settings, installation_id),
+        )
         if user:
             # Only try to get subscription status if we have a user
-            subscription_status = HealthCheckCache.get_subscription_status(
-                user.subdomain
-            )
-
-        latest_report = HealthCheckCache.get_latest_report(installation_id)
-        historical_reports = HealthCheckCache.get_historical_reports(installation_id)
-        monitoring_settings = HealthCheckCache.get_monitoring_settings(installation_id)
-
-        # Identify user with Segment
-        analytics.identify(
-            user_id,
-            {
-                "name": user.name,
-                "email": user.email,
-                "role": user.role,
-                "locale": user.locale,
-                "timezone": user.time_zone,
-                "avatar": user.avatar_url,
-                "subdomain": user.subdomain,
-                "subscription_status": subscription_status["status"],
-                "subscription_plan": subscription_status["plan"],
-                "subscription_active": subscription_status["active"],
-                "installation_id": installation_id,
-                "last_healthcheck": latest_report.created_at if latest_report else None,
-                "last_healthcheck_unlocked": latest_report.is_unlocked
-                if latest_report
-                else False,
-            },
-        )
-
-        # Group analytics
-        analytics.group(
-            user_id,
-            user.subdomain,
-            {
-                "name": user.subdomain,
-                "organization": user.subdomain,
-                "subscription_status": subscription_status["status"],
-            },
-        )
+            subscription_status = await run_in_thread(
+                HealthCheckCache.get_subscription_status
+            )(user.subdomain)
 
-        # Track app load
-        analytics.track(
-            user_id,
-            "App Loaded",
-            {
-                "subscription_status": subscription_status["status"],
-                "subscription_active": subscription_status["active"],
-                "subdomain": origin,
-                "installation_id": installation_id,
-            },
+        # Analytics and report formatting only depend on what's loaded above
+        _, report_data = await asyncio.gather(
+            run_in_thread(record_app_load)(
+                user,
+                user_id,
+                installation_id,
+                origin,
+                subscription_status,
+                latest_report,
+            ),
+            get_formatted_report(latest_report, subscription_status["active"]),
         )
 
         if latest_report:
-            # Use cached formatted report data
-            report_data = HealthCheckCache.get_formatted_report(
-                latest_report, subscription_status["active"]
-            )
-
             initial_data.update(
                 {
                     "historical_reports": format_historical_reports(historical_reports),
@@ -177,7 +208,7 @@ def app(request):
         }
     )
 
-    return render(request, "healthcheck/app.html", initial_data)
+    return await sync_to_async(render)(request, "healthcheck/app.html", initial_data)
 
 
 @csrf_exempt
@@ -191,10 +222,10 @@ def create_or_update_user(request):
 
         # Parse and validate data
         try:
-            data = json.loads(request.body)
-        except json.JSONDecodeError as e:
+            data = fastjson.loads(request.body)
+        except fastjson.JSONDecodeError as e:
             print("JSON Decode Error:", str(e))
-            return JsonResponse(
+            return FastJsonResponse(
                 {"status": "error", "message": "Invalid JSON data"}, status=400
             )
 
@@ -203,7 +234,7 @@ def create_or_update_user(request):
             user_id = int(data.get("user_id"))
         except (TypeError, ValueError) as e:
             print("Error converting user_id:", str(e))
-            return JsonResponse(
+            return FastJsonResponse(
                 {"status": "error", "message": "Invalid user_id format"}, status=400
             )
 
@@ -214,7 +245,9 @@ def create_or_update_user(request):
         if missing_fields:
             error_msg = f"Missing required fields: {', '.join(missing_fields)}"
             print("Validation Error:", error_msg)
-            return JsonResponse({"status": "error", "message": error_msg}, status=400)
+            return FastJsonResponse(
+                {"status": "error", "message": error_msg}, status=400
+            )
 
         # Create or update user with exact model field mapping
         try:
@@ -232,16 +265,16 @@ def create_or_update_user(request):
                 },
             )
 
-            return JsonResponse(
+            return FastJsonResponse(
                 {"status": "success", "user_id": user.user_id, "created": created}
             )
 
         except Exception as e:
             print("Database Error:", str(e))
-            return JsonResponse(
+            return FastJsonResponse(
                 {"status": "error", "message": f"Database error: {str(e)}"}, status=400
             )
 
     except Exception as e:
         print("Unexpected Error:", str(e))
-        return JsonResponse({"status": "error", "message": str(e)}, status=500)
+        return FastJsonResponse({"status": "error", "message": str(e)}, status=500)
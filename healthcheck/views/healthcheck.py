@@ -1,17 +1,28 @@
-from django.http import JsonResponse, HttpResponse
+from django.conf import settings
+from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
-import json
-from ..models import HealthCheckReport
-from ..utils.formatting import format_response_data
+from .. import fastjson
+from ..fastjson import FastJsonResponse
+from ..models import HealthCheckReport, HealthCheckSectionResult
 from ..utils.reports import render_report_components
 from ..utils.stripe import get_default_subscription_status
-import segment.analytics as analytics  # Add this import
-
-from ..tasks import run_health_check
+from .. import analytics
+from .. import throttle
+from .. import upstream
+
+from ..tasks import (
+    get_result_error,
+    queue_health_check,
+    queue_section_checks,
+    run_health_check,
+)
 from ..cache_utils import HealthCheckCache
+from ..async_utils import gather_sync, run_in_thread
+from ..db_router import read_your_writes, use_primary
+import asyncio
 import logging
 import csv
-from time import sleep
+import math
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +31,52 @@ logger = logging.getLogger(__name__)
 def health_check(request):
     if request.method == "POST":
         try:
-            data = json.loads(request.body) if request.body else {}
+            data = fastjson.loads(request.body) if request.body else {}
+
+            # Turn new scans away while the upstream API is unavailable,
+            # rather than queueing work that can only wait or fail
+            retry_after = upstream.get_state()["retry_after"]
+            if retry_after:
+                upstream.count("shed")
+                response = FastJsonResponse(
+                    {
+                        "error": True,
+                        "status": "unavailable",
+                        "message": (
+                            "The health check service is temporarily unavailable. "
+                            f"Please try again in {math.ceil(retry_after / 60)} minute(s)."
+                        ),
+                        "retry_after": retry_after,
+                    },
+                    status=503,
+                )
+                response["Retry-After"] = str(retry_after)
+                return response
+
+            # Hold each installation, subdomain and the app as a whole to
+            # their scan rates before anything is queued
+            try:
+                throttle.take_scan_token(
+                    data.get("installation_id"), data.get("subdomain")
+                )
+            except throttle.ScanThrottled as e:
+                wait = f"{math.ceil(e.retry_after / 60)} minute(s)"
+                response = FastJsonResponse(
+                    {
+                        "error": True,
+                        "status": "throttled",
+                        "message": (
+                            f"Too many health checks are running right now. Please try again in {wait}."
+                            if e.scope == "global"
+                            else f"A health check was run for this account recently. Please wait {wait} before running another."
+                        ),
+                        "retry_after": e.retry_after,
+                    },
+                    status=429,
+                )
+                response["Retry-After"] = str(e.retry_after)
+                return response
+
             # Track health check started
             analytics.track(
                 data.get("user_id"),
@@ -29,8 +85,14 @@ def health_check(request):
                     "subdomain": data.get("subdomain"),
                 },
             )
-            # Start async task
-            task = run_health_check.delay(
+            # Start async task, with timeouts and a queue sized for the
+            # instance, or one task per section when fanning checks out
+            queue = (
+                queue_section_checks
+                if settings.HEALTH_CHECK_SECTION_FAN_OUT
+                else queue_health_check
+            )
+            task, time_limit = queue(
                 url=data.get("url"),
                 email=data.get("email"),
                 api_token=data.get("api_token"),
@@ -43,12 +105,20 @@ def health_check(request):
                 version=data.get("version", "1.0.0"),
             )
 
-            # Only return the task ID, don't send results_html
-            return JsonResponse({"task_id": task.id, "status": "pending"})
+            # Only return the task ID, don't send results_html, and how long
+            # the app should poll before giving up: the check's own time limit,
+            # which is longer for large instances, plus time to be picked up
+            return FastJsonResponse(
+                {
+                    "task_id": task.id,
+                    "status": "pending",
+                    "poll_seconds": time_limit + settings.HEALTH_CHECK_POLL_GRACE,
+                }
+            )
 
         except Exception as e:
             logger.error(f"Error starting health check: {str(e)}")
-            return JsonResponse(
+            return FastJsonResponse(
                 {"error": True, "message": f"Error processing request: {str(e)}"}
             )
 
@@ -56,47 +126,79 @@ def health_check(request):
 
 
 @csrf_exempt
-def test_timeout(request):
+async def test_timeout(request):
     """
     Test endpoint that sleeps for 35 seconds to verify timeout settings
     """
     print("Starting sleep test...")
-    sleep(35)  # Sleep for 35 seconds
+    await asyncio.sleep(35)  # Sleep for 35 seconds without holding a worker thread
     print("Sleep test completed")
     return HttpResponse("If you see this, the timeout is working correctly!")
 
 
 @csrf_exempt
-def check_task_status(request, task_id):
+async def check_task_status(request, task_id):
     """Check the status of a health check task"""
     task = run_health_check.AsyncResult(task_id)
 
-    if task.ready():
-        result = task.get()
-        if result.get("error"):
-            return JsonResponse({
+    # The result backend is the database, so poll it off the event loop
+    if await run_in_thread(task.ready)():
+        # A failed task's exception is returned instead of raised, and
+        # shown as a failed check
+        result = await run_in_thread(task.get)(propagate=False)
+        error = get_result_error(result)
+        if error:
+            return FastJsonResponse({
                 "status": "error",
-                "error": result["message"],
-                "results_html": render_report_components({"error": result["message"]}),
+                "error": error,
+                "results_html": await run_in_thread(render_report_components)(
+                    {"error": error}
+                ),
             })
         try:
-            report = HealthCheckReport.objects.get(id=result["report_id"])
             subscription_status = get_default_subscription_status()
 
-            return JsonResponse({
+            # The existence check and the (usually cached) render don't depend
+            # on each other, so run them together. The report was only just
+            # created, so don't look for it on the replica.
+            with use_primary():
+                _, results_html = await gather_sync(
+                    (
+                        HealthCheckReport.objects.only("id")
+                        .filter(id=result["report_id"])
+                        .get,
+                    ),
+                    (
+                        HealthCheckCache.get_report_results,
+                        result["report_id"],
+                        subscription_status["active"],
+                    ),
+                )
+
+            return FastJsonResponse({
                 "status": "complete",
-                "results_html": HealthCheckCache.get_report_results(
-                    report.id, 
-                    subscription_active=subscription_status["active"]
-                ),
+                "results_html": results_html,
             })
         
         except Exception as e:
             logger.error(f"Error rendering report: {str(e)}")
-            return JsonResponse({"status": "error", "error": str(e)})
-
-    # For pending tasks, only return status
-    return JsonResponse({"status": "pending"})
+            return FastJsonResponse({"status": "error", "error": str(e)})
+
+    # For pending tasks, only return status, and any sections of a fanned
+    # out check that have finished
+    if settings.HEALTH_CHECK_SECTION_FAN_OUT:
+        with use_primary():
+            sections = await run_in_thread(HealthCheckSectionResult.get_progress)(
+                task_id
+            )
+        return FastJsonResponse(
+            {
+                "status": "pending",
+                "sections": sections,
+                "total_sections": len(HealthCheckSectionResult.SECTION_CHOICES),
+            }
+        )
+    return FastJsonResponse({"status": "pending"})
 
 
 # @csrf_exempt
@@ -257,6 +359,15 @@ def check_task_status(request, task_id):
 #     return HttpResponse("Method not allowed", status=405)
 
 
+def get_report(report_id):
+    """Fetch a report, from the primary if it hasn't reached the replica yet"""
+    try:
+        return HealthCheckReport.objects.get(id=report_id)
+    except HealthCheckReport.DoesNotExist:
+        with use_primary():
+            return HealthCheckReport.objects.get(id=report_id)
+
+
 @csrf_exempt
 def download_report_csv(request, report_id):
     """Download health check report as CSV"""
@@ -265,7 +376,7 @@ def download_report_csv(request, report_id):
         csv_data = HealthCheckCache.get_report_csv_data(report_id)
         if not csv_data:
             # If not in cache, get from database
-            report = HealthCheckReport.objects.get(id=report_id)
+            report = get_report(report_id)
             csv_data = []
             for issue in report.raw_response.get("issues", []):
                 csv_data.append(
@@ -298,24 +409,28 @@ def download_report_csv(request, report_id):
         return response
 
     except HealthCheckReport.DoesNotExist:
-        return JsonResponse({"error": "Report not found"}, status=404)
+        return FastJsonResponse({"error": "Report not found"}, status=404)
     except Exception as e:
         logger.error(f"Error generating CSV for report {report_id}: {str(e)}")
-        return JsonResponse({"error": "Error generating CSV"}, status=500)
+        return FastJsonResponse({"error": "Error generating CSV"}, status=500)
 
 
 @csrf_exempt
-def check_unlock_status(request):
+async def check_unlock_status(request):
     report_id = request.GET.get("report_id")
     if not report_id:
-        return JsonResponse({"error": "No report ID provided"}, status=400)
+        return FastJsonResponse({"error": "No report ID provided"}, status=400)
 
-    # Get cached unlock status
-    is_unlocked = HealthCheckCache.get_report_unlock_status(report_id)
+    # Get cached unlock status. This is polled right after a payment unlocks
+    # the report, so read it from the primary.
+    with use_primary():
+        is_unlocked = await run_in_thread(HealthCheckCache.get_report_unlock_status)(
+            report_id
+        )
     if is_unlocked is None:
-        return JsonResponse({"error": "Report not found"}, status=404)
+        return FastJsonResponse({"error": "Report not found"}, status=404)
 
-    return JsonResponse({"is_unlocked": is_unlocked, "report_id": report_id})
+    return FastJsonResponse({"is_unlocked": is_unlocked, "report_id": report_id})
 
 
 @csrf_exempt
@@ -323,36 +438,23 @@ def get_historical_report(request, report_id):
     """Fetch a historical report by ID"""
     try:
         subscription_status = get_default_subscription_status()
-        report = HealthCheckReport.objects.get(id=report_id)
-
-        # Get subscription status for the report's subdomain
-        if report:
-            subscription_status = HealthCheckCache.get_subscription_status(
-                report.subdomain
-            )
+        report = get_report(report_id)
 
-        # Format the report data
-        report_data = format_response_data(
-            report.raw_response,
-            subscription_active=subscription_status["active"],
-            report_id=report.id,
-            last_check=report.created_at,
-            is_unlocked=report.is_unlocked,
-        )
+        with read_your_writes(report.installation_id, report.subdomain):
+            # Get subscription status for the report's subdomain
+            if report:
+                subscription_status = HealthCheckCache.get_subscription_status(
+                    report.subdomain
+                )
 
-        try:
-            # Use render_report_components utility
-            results_html = render_report_components(report_data)
-            return JsonResponse({"results_html": results_html})
-        except Exception as template_error:
-            logger.error(f"Template rendering error: {str(template_error)}")
-            return JsonResponse(
-                {"error": "Error rendering report template"}, status=500
+            results_html = HealthCheckCache.get_report_results(
+                report.id, subscription_active=subscription_status["active"]
             )
+        return FastJsonResponse({"results_html": results_html})
 
     except HealthCheckReport.DoesNotExist:
         logger.error(f"Report {report_id} not found")
-        return JsonResponse({"error": "Report not found"}, status=404)
+        return FastJsonResponse({"error": "Report not found"}, status=404)
     except Exception as e:
         logger.error(f"Error fetching historical report: {str(e)}")
-        return JsonResponse({"error": str(e)}, status=500)
+        return FastJsonResponse({"error": str(e)}, status=500)
@@ -1,10 +1,12 @@
-from django.http import JsonResponse, HttpResponseRedirect
+from django.http import HttpResponseRedirect
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
-import json
+from .. import fastjson
+from ..fastjson import FastJsonResponse
 from zendeskapp import settings
 from ..models import HealthCheckMonitoring, ZendeskUser
+from ..scheduling import PREFERRED_WINDOWS
 from ..utils.monitoring import get_monitoring_context
 from ..utils.stripe import get_default_subscription_status
 
@@ -62,12 +64,16 @@ def monitoring(request):
                 "is_active": False,
                 "frequency": "weekly",
                 "notification_emails": [],
+                "preferred_window": "",
+                "notification_mode": "always",
             },
         }
 
     # Add URL parameters and environment to context
     context.update(
         {
+            "preferred_window_choices": HealthCheckMonitoring.PREFERRED_WINDOW_CHOICES,
+            "notification_mode_choices": HealthCheckMonitoring.NOTIFICATION_MODE_CHOICES,
             "url_params": HealthCheckCache.get_url_params(
                 installation_id,
                 request.GET.get("app_guid"),
@@ -85,30 +91,38 @@ def monitoring(request):
 def monitoring_settings(request):
     """Handle monitoring settings updates"""
     if request.method != "POST":
-        return JsonResponse({"error": "Method not allowed"}, status=405)
+        return FastJsonResponse({"error": "Method not allowed"}, status=405)
 
     try:
-        data = json.loads(request.body)
+        data = fastjson.loads(request.body)
         installation_id = data.get("installation_id")
         user_id = data.get("user_id")
         is_active = data.get("is_active", False)
         frequency = data.get("frequency", "weekly")
         notification_emails = data.get("notification_emails", [])
+        preferred_window = data.get("preferred_window") or ""
+        notification_mode = data.get("notification_mode") or "always"
 
         logger.info(f"Received monitoring settings update: {data}")
 
         # Validate required fields
         if not installation_id:
-            return JsonResponse({"error": "Installation ID required"}, status=400)
+            return FastJsonResponse({"error": "Installation ID required"}, status=400)
         if not user_id:
-            return JsonResponse({"error": "User ID required"}, status=400)
+            return FastJsonResponse({"error": "User ID required"}, status=400)
+        if preferred_window and preferred_window not in PREFERRED_WINDOWS:
+            return FastJsonResponse({"error": "Invalid preferred window"}, status=400)
+        if notification_mode not in dict(
+            HealthCheckMonitoring.NOTIFICATION_MODE_CHOICES
+        ):
+            return FastJsonResponse({"error": "Invalid notification mode"}, status=400)
 
         # Get user info for subdomain
         try:
             user = ZendeskUser.objects.get(user_id=user_id)
             subdomain = user.subdomain
         except ZendeskUser.DoesNotExist:
-            return JsonResponse({"error": "User not found"}, status=400)
+            return FastJsonResponse({"error": "User not found"}, status=400)
 
         # Get or create monitoring settings
         monitoring, created = HealthCheckMonitoring.objects.update_or_create(
@@ -117,6 +131,9 @@ def monitoring_settings(request):
                 "is_active": is_active,
                 "frequency": frequency,
                 "notification_emails": notification_emails or [],
+                "preferred_window": preferred_window,
+                "notification_mode": notification_mode,
+                "time_zone": user.time_zone,
                 "subdomain": subdomain,  # Add subdomain
                 "instance_guid": data.get(
                     "instance_guid", ""
@@ -124,6 +141,13 @@ def monitoring_settings(request):
             },
         )
 
+        # Move an existing schedule to the slot for the (possibly new)
+        # frequency, window and time zone
+        if monitoring.is_active and monitoring.last_check:
+            with monitoring.schedule_lock():
+                monitoring.schedule_next_check()
+                monitoring.save(update_fields=["next_check", "updated_at"])
+
         # Invalidate cache
         HealthCheckCache.invalidate_monitoring_settings(installation_id)
 
@@ -131,7 +155,7 @@ def monitoring_settings(request):
             f"Successfully updated monitoring settings for installation {installation_id}"
         )
 
-        return JsonResponse(
+        return FastJsonResponse(
             {
                 "status": "success",
                 "message": "Settings saved successfully",
@@ -139,13 +163,15 @@ def monitoring_settings(request):
                     "is_active": monitoring.is_active,
                     "frequency": monitoring.frequency,
                     "notification_emails": monitoring.notification_emails or [],
+                    "preferred_window": monitoring.preferred_window,
+                    "notification_mode": monitoring.notification_mode,
                 },
             }
         )
 
     except Exception as e:
         logger.error(f"Error saving monitoring settings: {str(e)}", exc_info=True)
-        return JsonResponse(
+        return FastJsonResponse(
             {"error": "Failed to save monitoring settings", "details": str(e)},
             status=500,
         )
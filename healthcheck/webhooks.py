@@ -0,0 +1,167 @@
+"""
+Stripe webhook processing.
+
+The dj-stripe receivers in ``views/billing.py`` only record the event and
+enqueue ``process_stripe_event``; the functions here do the actual work on
+the ``stripe`` Celery queue.
+"""
+
+from django.db import transaction
+from . import analytics
+import logging
+
+from .models import HealthCheckReport, HealthCheckMonitoring, ZendeskUser
+from .cache_utils import HealthCheckCache, invalidate_app_cache
+from .db_router import pin_to_primary
+
+logger = logging.getLogger(__name__)
+
+
+def process_checkout_completed(event):
+    """Unlock the purchased report for a completed checkout session"""
+    checkout_session = event.data.get("object", {})
+
+    if not checkout_session:
+        logger.error(f"No checkout session found in event {event.id}")
+        return
+
+    metadata = checkout_session.get("metadata", {})
+    logger.debug(f"Checkout session {checkout_session.get('id')} metadata: {metadata}")
+
+    report_id = metadata.get("report_id")
+    subdomain = metadata.get("subdomain")
+    user_id = metadata.get("user_id")
+    installation_id = metadata.get("installation_id")
+    invalidate_app_cache(installation_id)
+
+    # Verify payment status
+    payment_status = checkout_session.get("payment_status")
+    if payment_status != "paid":
+        logger.error(f"Unexpected payment status: {payment_status}")
+        return
+
+    if not all([report_id, subdomain]):
+        logger.error("Missing required metadata in checkout session")
+        return
+
+    with transaction.atomic():
+        try:
+            report = HealthCheckReport.objects.get(id=report_id, subdomain=subdomain)
+        except HealthCheckReport.DoesNotExist:
+            logger.error(f"Report {report_id} not found for subdomain {subdomain}")
+            return
+
+        report.is_unlocked = True
+        report.stripe_payment_id = checkout_session.get("id")
+        report.save()
+        logger.info(f"Successfully updated report {report_id} unlock status to True")
+
+        # Track the successful payment
+        def track_payment():
+            analytics.track(
+                user_id,
+                "Report Unlocked",
+                {
+                    "report_id": report_id,
+                    "payment_id": checkout_session.get("id"),
+                    "amount": checkout_session.get("amount_subtotal", 0) / 100,
+                    "subdomain": subdomain,
+                    "discount_amount": checkout_session.get("total_details", {}).get(
+                        "amount_discount", 0
+                    )
+                    / 100,
+                    "final_amount": checkout_session.get("amount_total", 0) / 100,
+                },
+            )
+
+        transaction.on_commit(track_payment)
+
+
+def process_subscription_update(event):
+    """Apply a subscription created/updated/deleted event"""
+    subscription = event.data["object"]
+    metadata = subscription.get("metadata", {})
+
+    # Extract metadata
+    user_id = metadata.get("user_id")
+    subdomain = metadata.get("subdomain")
+    installation_id = metadata.get("installation_id")
+    invalidate_app_cache(installation_id)
+
+    # Invalidate subscription cache
+    HealthCheckCache.invalidate_subscription_data(user_id, subdomain)
+    # dj-stripe has just written the subscription and reports may be unlocked
+    # below, so keep this subdomain's reads off the replica for a while
+    pin_to_primary(installation_id=installation_id, subdomain=subdomain)
+
+    if not all([user_id, subdomain]):
+        logger.error(
+            f"Missing required metadata. user_id: {user_id}, subdomain: {subdomain}"
+        )
+        return
+
+    # Get subscription status
+    status = subscription.get("status")
+    is_active = status in ["active", "trialing"]
+    plan_id = subscription.get("plan", {}).get("id")
+
+    logger.info(
+        f"Subscription status for {subdomain}: {status}, is_active: {is_active}"
+    )
+
+    # Verify subdomain exists
+    if not ZendeskUser.objects.filter(subdomain=subdomain).exists():
+        logger.error(f"User not found for subdomain: {subdomain}")
+        return
+
+    # Only touch reports that are still locked; retried deliveries
+    # of the same event find nothing left to update.
+    unlocked_reports = []
+    if is_active:
+        unlocked_reports = HealthCheckReport.unlock_for_subdomain(subdomain)
+        HealthCheckCache.invalidate_unlocked_reports(unlocked_reports)
+    affected_reports = len(unlocked_reports)
+
+    logger.info(
+        f"Unlocked {affected_reports} subscription-based reports for {subdomain}"
+    )
+
+    # Update monitoring settings if subscription is inactive
+    if not is_active and installation_id:
+        try:
+            monitoring = HealthCheckMonitoring.objects.get(
+                installation_id=installation_id
+            )
+            monitoring.is_active = False
+            monitoring.save()
+            HealthCheckCache.invalidate_monitoring_settings(installation_id)
+            logger.info(f"Updated monitoring status for installation {installation_id}")
+        except HealthCheckMonitoring.DoesNotExist:
+            logger.info(
+                f"No monitoring settings found for installation {installation_id}"
+            )
+
+    # Track the event with additional info about affected reports
+    analytics.track(
+        user_id,
+        "Subscription Status Updated",
+        {
+            "event_type": event.type,
+            "subscription_status": status,
+            "subscription_active": is_active,
+            "plan": plan_id,
+            "subdomain": subdomain,
+            "installation_id": installation_id,
+            "affected_reports_count": affected_reports,
+            "individually_unlocked_reports_preserved": True,
+        },
+    )
+
+
+# Stripe event type -> processor run by the process_stripe_event task
+EVENT_PROCESSORS = {
+    "checkout.session.completed": process_checkout_completed,
+    "customer.subscription.created": process_subscription_update,
+    "customer.subscription.updated": process_subscription_update,
+    "customer.subscription.deleted": process_subscription_update,
+}
@@ -0,0 +1,107 @@
+"""
+Peak memory of the health check tasks, measured in the worker process that
+ran them.
+
+Linux keeps a process's peak RSS (VmHWM in /proc/self/status), and writing
+5 to /proc/self/clear_refs resets it to the current RSS. Resetting it as a
+measured task starts and reading it as the task ends gives that task's own
+peak, where ru_maxrss alone only gives the peak of the process's lifetime.
+Where the reset isn't available the lifetime peak is logged instead, and
+nothing is recorded.
+
+The reset also lowers ru_maxrss, which is what Celery compares with
+CELERY_WORKER_MAX_MEMORY_PER_CHILD after each task (without psutil). A
+worker child is therefore replaced once the last measured task peaked
+above the limit, or once its RSS between tasks has crept above it.
+"""
+
+from celery.signals import task_postrun, task_prerun
+from .models import InstallationCheckStats
+import logging
+import resource
+
+logger = logging.getLogger(__name__)
+
+MEASURED_TASKS = {
+    "healthcheck.tasks.run_health_check",
+    "healthcheck.tasks.run_section_check",
+    "healthcheck.tasks.run_monitoring_check",
+}
+
+# task_id -> (RSS in KiB as the task started, whether the peak was reset)
+_started = {}
+
+
+def read_status_kib(field):
+    """A "kB" field of /proc/self/status, or None where there isn't one"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def current_rss_kib():
+    return read_status_kib("VmRSS")
+
+
+def peak_rss_kib():
+    """Peak RSS since the last reset_peak_rss, or of the process's lifetime"""
+    peak = read_status_kib("VmHWM")
+    if peak is None:
+        # KiB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak
+
+
+def reset_peak_rss():
+    """Reset the peak RSS to the current RSS, returning whether it could"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def get_installation_id(task_kwargs):
+    task_kwargs = task_kwargs or {}
+    if task_kwargs.get("installation_id"):
+        return task_kwargs["installation_id"]
+    return (task_kwargs.get("check") or {}).get("installation_id")
+
+
+@task_prerun.connect
+def measure_task_start(task_id=None, task=None, **kwargs):
+    if task is None or task.name not in MEASURED_TASKS:
+        return
+    _started[task_id] = (current_rss_kib(), reset_peak_rss())
+
+
+@task_postrun.connect
+def record_task_memory(task_id=None, task=None, kwargs=None, **extra):
+    started = _started.pop(task_id, None)
+    if started is None:
+        return
+    start_rss, per_task = started
+    peak = peak_rss_kib()
+    rss = current_rss_kib()
+
+    if not per_task or start_rss is None:
+        logger.info(
+            f"{task.name}[{task_id}] finished, process peak RSS {peak / 1024:.0f} MiB"
+        )
+        return
+
+    growth = max(0, peak - start_rss)
+    logger.info(
+        f"{task.name}[{task_id}] peak RSS {peak / 1024:.0f} MiB "
+        f"(+{growth / 1024:.0f} MiB), {rss / 1024:.0f} MiB after "
+        f"({(rss - start_rss) / 1024:+.0f} MiB)"
+    )
+    installation_id = get_installation_id(kwargs)
+    if installation_id:
+        InstallationCheckStats.record_memory(installation_id, growth)
@@ -1,8 +1,13 @@
 #!/bin/bash
 # Start Celery workers
-celery -A zendeskapp worker --loglevel=info --concurrency=8 &
+PROCESS_TYPE=worker celery -A zendeskapp worker --loglevel=info --concurrency=8 &
+PROCESS_TYPE=worker celery -A zendeskapp worker --loglevel=info --concurrency=2 -Q stripe -n stripe@%h &
+PROCESS_TYPE=worker celery -A zendeskapp worker --loglevel=info --concurrency=2 -Q large_checks -n large@%h &
+PROCESS_TYPE=worker celery -A zendeskapp worker --loglevel=info --concurrency=1 -Q email -n email@%h &
+PROCESS_TYPE=worker celery -A zendeskapp beat --loglevel=info --schedule /tmp/celerybeat-schedule &
 
 # Start Django
 python manage.py migrate
+python manage.py manage_report_partitions
 python manage.py collectstatic --noinput
-gunicorn zendeskapp.wsgi:application --workers 2 --threads 2 --timeout 120 --max-requests-jitter 50 --worker-class gthread
\ No newline at end of file
+PROCESS_TYPE=web gunicorn zendeskapp.asgi:application --workers 2 --timeout 120 --max-requests-jitter 50 --worker-class uvicorn_worker.UvicornWorker
\ No newline at end of file
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+from datetime import timedelta
 from pathlib import Path
 import sentry_sdk
 
@@ -62,6 +63,12 @@ LOGGING = {
 BASE_DIR = Path(__file__).resolve().parent.parent
 HEALTHCHECK_TOKEN = os.environ.get("HEALTHCHECK_TOKEN", "")
 SEGMENT_WRITE_KEY = os.environ.get("SEGMENT_WRITE_KEY", "")
+# Analytics events are buffered in-process and sent in batches off the
+# request path. Set ANALYTICS_SINK=file to write them to a local file instead.
+ANALYTICS_SINK = os.environ.get("ANALYTICS_SINK", "segment")
+ANALYTICS_FILE_PATH = os.environ.get("ANALYTICS_FILE_PATH", "analytics_events.jsonl")
+ANALYTICS_BUFFER_SIZE = int(os.environ.get("ANALYTICS_BUFFER_SIZE", 1000))
+ANALYTICS_BATCH_SIZE = int(os.environ.get("ANALYTICS_BATCH_SIZE", 50))
 APP_URL = "https://gravity.cx"
 BASE_URL = os.environ.get("gcx-healthcheck-zd-production.up.railway.app", "")
 SENDGRID_API_KEY = os.environ.get("SENDGRID_API_KEY", "")
@@ -72,6 +79,25 @@ EMAIL_HOST_PASSWORD = SENDGRID_API_KEY
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 DEFAULT_FROM_EMAIL = "Hugo Richard <hugo@gravity.cx>"
+EMAIL_TIMEOUT = 30
+# Backend monitoring emails are sent with (EMAIL_BACKEND if unset), e.g.
+# "healthcheck.email_backends.SendGridAPIBackend" to use SendGrid's HTTP API
+MONITORING_EMAIL_BACKEND = os.environ.get("MONITORING_EMAIL_BACKEND") or None
+MONITORING_EMAIL_BATCH_SIZE = int(os.environ.get("MONITORING_EMAIL_BATCH_SIZE", 50))
+# A notification that fails to send is retried after RETRY_SECONDS, then
+# twice as long after each failure up to MAX_RETRY_SECONDS, and given up on
+# after MAX_ATTEMPTS (about 8 hours with the defaults). A sender claims the
+# notifications it works on for CLAIM_SECONDS.
+MONITORING_EMAIL_MAX_ATTEMPTS = int(os.environ.get("MONITORING_EMAIL_MAX_ATTEMPTS", 10))
+MONITORING_EMAIL_RETRY_SECONDS = int(
+    os.environ.get("MONITORING_EMAIL_RETRY_SECONDS", 60)
+)
+MONITORING_EMAIL_MAX_RETRY_SECONDS = int(
+    os.environ.get("MONITORING_EMAIL_MAX_RETRY_SECONDS", 4 * 3600)
+)
+MONITORING_EMAIL_CLAIM_SECONDS = int(
+    os.environ.get("MONITORING_EMAIL_CLAIM_SECONDS", 600)
+)
 
 SERVER_EMAIL = "Hugo Richard <hugo@gravity.cx>"  # Used for error emails
 ENVIRONMENT = os.environ.get("RAILWAY_ENVIRONMENT_NAME", "development")
@@ -136,6 +162,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "healthcheck.middleware.AllowIframeMiddleware",  # Add this line
+    "healthcheck.middleware.ReplicaRoutingMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
@@ -163,16 +190,91 @@ WSGI_APPLICATION = "zendeskapp.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Connection handling depends on the process type (set in start.sh):
+# - "pool": a psycopg3 pool per process, connections go back to it after
+#   each request. The default for web processes.
+# - "persistent": one connection per process reused for DB_CONN_MAX_AGE
+#   seconds. The default for Celery workers and beat, whose prefork children
+#   can't share a pool created before the fork.
+# - "pgbouncer": persistent connections to a pgbouncer in transaction
+#   pooling mode, with server-side cursors disabled.
+# - "none": a new connection per request/task (Django's default).
+PROCESS_TYPE = os.environ.get("PROCESS_TYPE", "web")
+DB_CONNECTION_MODE = os.environ.get(
+    "DB_CONNECTION_MODE", "pool" if PROCESS_TYPE == "web" else "persistent"
+)
+# Opt-in server-side prepared statements: queries are bound server-side and
+# prepared once they've run DB_PREPARE_THRESHOLD times on a connection.
+# Needs pgbouncer >= 1.21 with max_prepared_statements set in pgbouncer mode.
+DB_PREPARED_STATEMENTS = os.environ.get("DB_PREPARED_STATEMENTS", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        "ENGINE": "django.db.backends.postgresql",
         "NAME": os.environ.get("PGDATABASE", ""),
         "USER": os.environ.get("PGUSER", ""),
         "PASSWORD": os.environ.get("PGPASSWORD", ""),
         "HOST": os.environ.get("PGHOST", ""),
         "PORT": os.environ.get("PGPORT", ""),
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
     }
 }
+if DB_CONNECTION_MODE == "pool":
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+        "timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+    }
+elif DB_CONNECTION_MODE in ("persistent", "pgbouncer"):
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get("DB_CONN_MAX_AGE", 600))
+if DB_CONNECTION_MODE == "pgbouncer":
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+if DB_PREPARED_STATEMENTS:
+    DATABASES["default"]["OPTIONS"].update(
+        {
+            "server_side_binding": True,
+            "prepare_threshold": int(os.environ.get("DB_PREPARE_THRESHOLD", 5)),
+        }
+    )
+
+# Optional read replica for report, history and billing reads, see
+# healthcheck/db_router.py. Pointing REPLICA_PGDATABASE at a second local
+# database is enough to exercise the routing in development.
+REPLICA_DATABASE = None
+if os.environ.get("REPLICA_PGHOST") or os.environ.get("REPLICA_PGDATABASE"):
+    REPLICA_DATABASE = "replica"
+    DATABASES[REPLICA_DATABASE] = {
+        **DATABASES["default"],
+        "NAME": os.environ.get("REPLICA_PGDATABASE", DATABASES["default"]["NAME"]),
+        "USER": os.environ.get("REPLICA_PGUSER", DATABASES["default"]["USER"]),
+        "PASSWORD": os.environ.get(
+            "REPLICA_PGPASSWORD", DATABASES["default"]["PASSWORD"]
+        ),
+        "HOST": os.environ.get("REPLICA_PGHOST", DATABASES["default"]["HOST"]),
+        "PORT": os.environ.get("REPLICA_PGPORT", DATABASES["default"]["PORT"]),
+        "OPTIONS": {**DATABASES["default"]["OPTIONS"]},
+        # Tests read the replica through the primary's connection
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["healthcheck.db_router.ReplicaRouter"]
+# How long reads for an installation/subdomain stay on the primary after
+# a write to it; should cover the replica's worst expected lag
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 30))
+
+# Health check reports are partitioned by month (see healthcheck/partitions.py).
+# manage_report_partitions keeps this many months ahead created, and detaches
+# months older than the retention period into the archive schema (0 keeps all)
+REPORT_PARTITIONS_AHEAD = int(os.environ.get("REPORT_PARTITIONS_AHEAD", 3))
+REPORT_RETENTION_MONTHS = int(os.environ.get("REPORT_RETENTION_MONTHS", 24))
+# archive_reports moves the raw_response of reports older than this to the
+# report_archive storage, keeping only a summary of issue counts in the database
+REPORT_ARCHIVE_AFTER_MONTHS = int(os.environ.get("REPORT_ARCHIVE_AFTER_MONTHS", 12))
 
 CACHES = {
     "default": {
@@ -186,8 +288,138 @@ CELERY_BROKER_URL = os.environ.get("REDIS_URL", "")
 CELERY_RESULT_BACKEND = "django-db"
 CELERY_CACHE_BACKEND = "django-cache"
 CELERY_TIMEZONE = "Australia/Tasmania"
-CELERY_TASK_TRACK_STARTED = True
+# The app only polls for finished results, so don't write a STARTED row too
+CELERY_TASK_TRACK_STARTED = False
+# Results are only read while the app polls for them; the
+# cleanup-task-results beat entry deletes them once they are this old
+CELERY_RESULT_EXPIRES = timedelta(
+    hours=int(os.environ.get("CELERY_RESULT_EXPIRES_HOURS", 24))
+)
 CELERY_TASK_TIME_LIMIT = 120
+# Worker children are replaced after this many tasks, or after a task once
+# their RSS (KiB) is over the memory limit, so memory left behind by large
+# payloads can't build up in a long-running worker
+CELERY_WORKER_MAX_TASKS_PER_CHILD = int(
+    os.environ.get("CELERY_WORKER_MAX_TASKS_PER_CHILD", 200)
+)
+CELERY_WORKER_MAX_MEMORY_PER_CHILD = int(
+    os.environ.get("CELERY_WORKER_MAX_MEMORY_PER_CHILD", 512_000)
+)
+# Stripe webhooks are acked immediately and processed on their own queue so
+# bursts (e.g. renewals) never compete with health checks for workers.
+CELERY_TASK_ROUTES = {
+    "healthcheck.tasks.process_stripe_event": {"queue": "stripe"},
+    # Monitoring emails are sent in batches off the health check workers
+    "healthcheck.tasks.send_monitoring_notifications": {"queue": "email"},
+}
+# Scheduled health checks: beat queues due checks every minute. Each check is
+# leased (MONITORING_LEASE_SECONDS) to the scheduler that claimed it, so extra
+# beat processes or overlapping runs never check an installation twice, and a
+# check whose worker died is picked up again once its lease expires.
+CELERY_BEAT_SCHEDULE = {
+    "schedule-due-checks": {
+        "task": "healthcheck.tasks.schedule_due_checks",
+        "schedule": 60.0,
+    },
+    # Retries monitoring emails that failed to send
+    "send-monitoring-notifications": {
+        "task": "healthcheck.tasks.send_monitoring_notifications",
+        "schedule": 60.0,
+    },
+    # Deletes task results older than CELERY_RESULT_EXPIRES. Celery only
+    # schedules this daily by itself; hourly keeps each delete small.
+    "cleanup-task-results": {
+        "task": "celery.backend_cleanup",
+        "schedule": 3600.0,
+    },
+    # Queues Stripe events again that stalled (a worker died with them) or
+    # failed, which Stripe won't redeliver once the webhook has accepted them
+    "recover-stripe-events": {
+        "task": "healthcheck.tasks.recover_stripe_events",
+        "schedule": 300.0,
+    },
+    # Deletes section results of fanned out checks that never merged
+    "delete-stale-section-results": {
+        "task": "healthcheck.tasks.delete_stale_section_results",
+        "schedule": 900.0,
+    },
+}
+STRIPE_RECOVERY_BATCH_SIZE = int(os.environ.get("STRIPE_RECOVERY_BATCH_SIZE", 100))
+MONITORING_CLAIM_BATCH_SIZE = int(os.environ.get("MONITORING_CLAIM_BATCH_SIZE", 50))
+MONITORING_LEASE_SECONDS = int(os.environ.get("MONITORING_LEASE_SECONDS", 900))
+# Checks run at a fixed per-installation time inside this window of local
+# hours (overridden by a customer's preferred window), and no more than
+# MONITORING_MAX_CHECKS_PER_MINUTE are scheduled or queued in any minute
+MONITORING_WINDOW_START_HOUR = int(os.environ.get("MONITORING_WINDOW_START_HOUR", 0))
+MONITORING_WINDOW_END_HOUR = int(os.environ.get("MONITORING_WINDOW_END_HOUR", 24))
+MONITORING_DEFAULT_TIME_ZONE = os.environ.get("MONITORING_DEFAULT_TIME_ZONE", "UTC")
+MONITORING_MAX_CHECKS_PER_MINUTE = int(
+    os.environ.get("MONITORING_MAX_CHECKS_PER_MINUTE", 20)
+)
+# Health check budgets. A check's HTTP read timeout is HEALTH_CHECK_TIMEOUT_FACTOR
+# times the slowest of the installation's recent checks, clamped to the min and
+# max (and the default with no history yet); its Celery time limits add
+# HEALTH_CHECK_TIME_LIMIT_GRACE on top. Installations whose checks take
+# HEALTH_CHECK_LARGE_SECONDS or more run on HEALTH_CHECK_LARGE_QUEUE, which has
+# its own workers, so they never tie up the pool small checks use. Keep the
+# max plus grace under MONITORING_LEASE_SECONDS.
+HEALTH_CHECK_DEFAULT_TIMEOUT = int(os.environ.get("HEALTH_CHECK_DEFAULT_TIMEOUT", 300))
+HEALTH_CHECK_MIN_TIMEOUT = int(os.environ.get("HEALTH_CHECK_MIN_TIMEOUT", 60))
+HEALTH_CHECK_MAX_TIMEOUT = int(os.environ.get("HEALTH_CHECK_MAX_TIMEOUT", 780))
+HEALTH_CHECK_TIMEOUT_FACTOR = float(os.environ.get("HEALTH_CHECK_TIMEOUT_FACTOR", 2.0))
+HEALTH_CHECK_TIME_LIMIT_GRACE = int(os.environ.get("HEALTH_CHECK_TIME_LIMIT_GRACE", 30))
+HEALTH_CHECK_LARGE_SECONDS = int(os.environ.get("HEALTH_CHECK_LARGE_SECONDS", 60))
+HEALTH_CHECK_LARGE_QUEUE = "large_checks"
+# How long past a check's time limit the app keeps polling for its result,
+# for the time it waits in its queue before a worker picks it up
+HEALTH_CHECK_POLL_GRACE = int(os.environ.get("HEALTH_CHECK_POLL_GRACE", 120))
+# Upstream health check API protection, shared by all workers through the cache
+# (see healthcheck/upstream.py). New scans are turned away with a 503 while the
+# breaker is open or the API has asked us to back off; queued checks retry once
+# it reopens if that is within UPSTREAM_MAX_RETRY_WAIT seconds.
+UPSTREAM_BREAKER_THRESHOLD = int(os.environ.get("UPSTREAM_BREAKER_THRESHOLD", 5))
+UPSTREAM_BREAKER_WINDOW = int(os.environ.get("UPSTREAM_BREAKER_WINDOW", 60))
+UPSTREAM_BREAKER_COOLDOWN = int(os.environ.get("UPSTREAM_BREAKER_COOLDOWN", 120))
+UPSTREAM_DEFAULT_BACKOFF = int(os.environ.get("UPSTREAM_DEFAULT_BACKOFF", 60))
+UPSTREAM_MAX_BACKOFF = int(os.environ.get("UPSTREAM_MAX_BACKOFF", 900))
+UPSTREAM_MAX_RETRY_WAIT = int(os.environ.get("UPSTREAM_MAX_RETRY_WAIT", 300))
+UPSTREAM_MAX_REQUESTS_PER_MINUTE = int(
+    os.environ.get("UPSTREAM_MAX_REQUESTS_PER_MINUTE", 60)
+)
+# Token buckets for new health check scans (see healthcheck/throttle.py): each
+# installation and subdomain can start a burst of scans, then get more at the
+# hourly rate; all scans together are held to the global per-minute rate.
+# Setting a rate or burst to 0 turns that bucket off.
+SCAN_THROTTLE_BURST = int(os.environ.get("SCAN_THROTTLE_BURST", 3))
+SCAN_THROTTLE_PER_HOUR = int(os.environ.get("SCAN_THROTTLE_PER_HOUR", 12))
+SCAN_THROTTLE_SUBDOMAIN_BURST = int(os.environ.get("SCAN_THROTTLE_SUBDOMAIN_BURST", 5))
+SCAN_THROTTLE_SUBDOMAIN_PER_HOUR = int(
+    os.environ.get("SCAN_THROTTLE_SUBDOMAIN_PER_HOUR", 30)
+)
+SCAN_THROTTLE_GLOBAL_BURST = int(os.environ.get("SCAN_THROTTLE_GLOBAL_BURST", 30))
+SCAN_THROTTLE_GLOBAL_PER_MINUTE = int(
+    os.environ.get("SCAN_THROTTLE_GLOBAL_PER_MINUTE", 30)
+)
+# Overrides the upstream health check API URL, e.g. to point development at
+# a local `manage.py serve_upstream_stub`
+UPSTREAM_API_URL = os.environ.get("UPSTREAM_API_URL", "")
+# Opt-in: split each health check into one upstream request per section
+# (triggers, macros, fields, ...), run in parallel as a Celery chord and
+# merged into one report, with sections shown in the app as they finish.
+# Needs the upstream API to accept a "sections" list.
+HEALTH_CHECK_SECTION_FAN_OUT = os.environ.get(
+    "HEALTH_CHECK_SECTION_FAN_OUT", ""
+).lower() in ("1", "true", "yes")
+# Section results still there after this many seconds belong to a check whose
+# chord failed before merging (longer than a check can run, with its retries)
+HEALTH_CHECK_SECTION_RESULT_MAX_AGE = int(
+    os.environ.get("HEALTH_CHECK_SECTION_RESULT_MAX_AGE", 3600)
+)
+# Upstream responses are streamed to a temporary file on their way into the
+# database (see healthcheck/ingest.py), held in memory up to this many bytes
+INGEST_SPOOL_MAX_MEMORY = int(
+    os.environ.get("INGEST_SPOOL_MAX_MEMORY", 8 * 1024 * 1024)
+)
 # Timeout settings
 TIMEOUT_SETTINGS = {"GUNICORN_TIMEOUT": 120, "REQUEST_TIMEOUT": 120}
 # Password validation
@@ -230,6 +462,21 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    # Compressed raw_response payloads of archived reports (see
+    # healthcheck/report_archive.py); point this at an object store in production
+    "report_archive": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": os.environ.get(
+                "REPORT_ARCHIVE_PATH", os.path.join(BASE_DIR, "report_archive")
+            )
+        },
+    },
+}
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 